@@ -0,0 +1,331 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+#
+#	The SKB-1 container
+#
+# SKB-1 is a binary companion of the SK-1 format used by the skbsaver
+# and skbloader plugins. It holds the same function calls as an SK-1
+# file, so every SKB-1 file can be converted to SK-1 and back without
+# loss, but the bulky parts are stored in binary form:
+#
+# The file starts with the line MAGIC, which carries the version of
+# the SK-1 dialect like the header of SK-1 files, followed by a
+# sequence of records. A record is a one character tag, the length of
+# the data as an unsigned 32 bit int and the data. All numbers are
+# little endian.
+#
+# 's'	Strings. SK-1 function calls (without the newline) that are
+#	appended to the string table, each as a 32 bit length followed
+#	by the text.
+#
+# 'c'	Calls. An array of 32 bit indices into the string table. The
+#	function calls are executed in that order. Since properties
+#	like fill and line patterns are the same for many objects this
+#	stores every distinct call only once and the loader only has
+#	to parse it once.
+#
+# 'p'	Path. The segments of one path of the current bezier object,
+#	replacing the bs, bc, bn and bC calls of SK-1: the number of
+#	nodes N (32 bit) and the closed flag (8 bit), then N bytes with the
+#	segment types (3 for lines and 7 for curves, the length of the
+#	tuples returned by the path's get_save method), N bytes with
+#	the continuity of the nodes and the coordinates as an array of
+#	doubles (2 per line, 6 per curve segment).
+#
+# 'r'	Raw image data in PPM format for the following bm call that
+#	has no filename. SK-1 stores the data base64 encoded after the
+#	bm call instead.
+#
+# 'L'	Layer. The data is a sequence of records holding everything
+#	from the layer call up to the next layer. Strings defined in a
+#	layer are only valid inside it, so a layer can be read without
+#	reading the preceding layers.
+#
+# 'i'	Layer info. The last record of a layer with objects: the number
+#	of objects (32 bit), flags (8 bit) and the coord rect and the
+#	bounding rect of the layer as 4 doubles each (left, bottom,
+#	right, top). The flags are HIDDEN if the layer is not visible
+#	and SELF_CONTAINED if no image used elsewhere is defined in the
+#	layer. The objects of layers with both flags set need not be
+#	read until they're needed.
+#
+
+import sys
+from struct import pack, unpack, calcsize
+from array import array
+
+from Sketch import CreatePath, Point, Rect
+
+MAGIC = '##Sketch-binary 1 2\n'
+
+STRINGS = 's'
+CALLS = 'c'
+PATH = 'p'
+RAW = 'r'
+LAYER = 'L'
+INFO = 'i'
+
+# flags of INFO records
+HIDDEN = 1
+SELF_CONTAINED = 2
+
+header_format = '<cI'
+header_size = calcsize(header_format)
+
+swap = sys.byteorder == 'big'
+
+def int_array(data = None):
+    # array of unsigned 32 bit ints
+    for code in ('I', 'L'):
+	if array(code).itemsize == 4:
+	    break
+    result = array(code)
+    if data is not None:
+	result.fromstring(data)
+	if swap:
+	    result.byteswap()
+    return result
+
+def array_data(values):
+    if swap:
+	values = array(values.typecode, values)
+	values.byteswap()
+    return values.tostring()
+
+
+def encode_path(path):
+    # Return the data of a PATH record for PATH
+    items = path.get_save()
+    kinds = array('B', map(len, items))
+    conts = array('B')
+    coords = array('d')
+    for item in items:
+	conts.append(item[-1])
+	coords.extend(item[:-1])
+    return (pack('<IB', len(items), path.closed) + kinds.tostring()
+	    + conts.tostring() + array_data(coords))
+
+def decode_path(data):
+    # Return a new path object for the data of a PATH record
+    count, closed = unpack('<IB', data[:5])
+    pos = 5 + count
+    kinds = data[5:pos]
+    conts = array('B', data[pos:pos + count])
+    coords = array('d', data[pos + count:])
+    if swap:
+	coords.byteswap()
+    path = CreatePath()
+    append_line = path.AppendLine
+    append_bezier = path.AppendBezier
+    idx = 0
+    for i in range(count):
+	if kinds[i] == '\003':
+	    append_line(Point(coords[idx], coords[idx + 1]), conts[i])
+	    idx = idx + 2
+	else:
+	    x1, y1, x2, y2, x, y = coords[idx:idx + 6]
+	    append_bezier(Point(x1, y1), Point(x2, y2), Point(x, y),
+			  conts[i])
+	    idx = idx + 6
+    if closed:
+	path.load_close()
+    return path
+
+def path_text(data):
+    # Return the SK-1 text for the data of a PATH record, i.e. the bs,
+    # bc and bC calls, without creating a path object
+    count, closed = unpack('<IB', data[:5])
+    pos = 5 + count
+    kinds = data[5:pos]
+    conts = array('B', data[pos:pos + count])
+    coords = array('d', data[pos + count:])
+    if swap:
+	coords.byteswap()
+    lines = []
+    idx = 0
+    for i in range(count):
+	if kinds[i] == '\003':
+	    lines.append('bs(%g,%g,%d)\n'
+			 % (coords[idx], coords[idx + 1], conts[i]))
+	    idx = idx + 2
+	else:
+	    lines.append('bc(%g,%g,%g,%g,%g,%g,%d)\n'
+			 % (tuple(coords[idx:idx + 6]) + (conts[i],)))
+	    idx = idx + 6
+    if closed:
+	lines.append('bC()\n')
+    return ''.join(lines)
+
+info_format = '<IB8d'
+
+def encode_info(num_objects, flags, coord_rect, bounding_rect):
+    return pack(info_format, num_objects, flags,
+		coord_rect.left, coord_rect.bottom,
+		coord_rect.right, coord_rect.top,
+		bounding_rect.left, bounding_rect.bottom,
+		bounding_rect.right, bounding_rect.top)
+
+def decode_info(data):
+    # Return the tuple (num_objects, flags, coord_rect, bounding_rect)
+    # for the data of an INFO record
+    values = unpack(info_format, data)
+    return values[:2] + (apply(Rect, values[2:6]), apply(Rect, values[6:]))
+
+
+class RecordWriter:
+
+    # Write SK-1 text as an SKB-1 record stream. The text passed to
+    # write is split into lines and every line becomes a call. The
+    # calls are buffered and written as STRINGS and CALLS records when
+    # another record is written, a layer starts or ends or when Flush
+    # is called.
+
+    def __init__(self, file):
+	self.file = file
+	self.out = file
+	self.blocks = []
+	self.strings = {}
+	self.string_list = []
+	self.new_strings = []
+	self.calls = int_array()
+	self.text = ''
+
+    def write(self, text):
+	text = self.text + text
+	lines = text.split('\n')
+	self.text = lines[-1]
+	for line in lines[:-1]:
+	    self.call(line)
+
+    def call(self, line):
+	index = self.strings.get(line)
+	if index is None:
+	    index = self.strings[line] = len(self.string_list)
+	    self.string_list.append(line)
+	    self.new_strings.append(line)
+	self.calls.append(index)
+
+    def Flush(self):
+	if self.text:
+	    self.call(self.text)
+	    self.text = ''
+	if self.new_strings:
+	    data = []
+	    for line in self.new_strings:
+		data.append(pack('<I', len(line)))
+		data.append(line)
+	    self.new_strings = []
+	    self.write_record(STRINGS, ''.join(data))
+	if self.calls:
+	    data = array_data(self.calls)
+	    self.calls = int_array()
+	    self.write_record(CALLS, data)
+
+    def write_record(self, tag, data):
+	self.out.write(pack(header_format, tag, len(data)))
+	self.out.write(data)
+
+    def Record(self, tag, data):
+	self.Flush()
+	self.write_record(tag, data)
+
+    def BeginBlock(self):
+	from cStringIO import StringIO
+	self.Flush()
+	self.blocks.append((self.out, len(self.string_list)))
+	self.out = StringIO()
+
+    def EndBlock(self, tag = LAYER):
+	self.Flush()
+	data = self.out.getvalue()
+	self.out, count = self.blocks.pop()
+	# forget the strings defined in the block
+	for line in self.string_list[count:]:
+	    del self.strings[line]
+	del self.string_list[count:]
+	self.write_record(tag, data)
+
+    def InBlock(self):
+	return len(self.blocks) > 0
+
+
+def read_records(data, start = 0, end = None):
+    # Return a list of (tag, start, end) tuples for the records in
+    # DATA[START:END] (not descending into layers).
+    if end is None:
+	end = len(data)
+    result = []
+    pos = start
+    while pos < end:
+	if pos + header_size > end:
+	    raise ValueError('truncated record header at %d' % pos)
+	tag, length = unpack(header_format, data[pos:pos + header_size])
+	pos = pos + header_size
+	if pos + length > end:
+	    raise ValueError('truncated record %r at %d' % (tag, pos))
+	result.append((tag, pos, pos + length))
+	pos = pos + length
+    return result
+
+def records_text(data, start = 0, end = None, table = ()):
+    # Return the SK-1 text for the records in DATA[START:END] without
+    # creating objects. TABLE is the string table at START as a list of
+    # lines with newlines. The records must not define images, i.e.
+    # they have to be those of a SELF_CONTAINED layer.
+    table = list(table)
+    records = read_records(data, start, end)
+    records.reverse()
+    blocks = []		# (end of layer, length of table)
+    result = []
+    first_path = 1
+    while records:
+	tag, start, end = records.pop()
+	while blocks and start >= blocks[-1][0]:
+	    del table[blocks.pop()[1]:]
+	if tag == CALLS:
+	    for index in int_array(data[start:end]):
+		result.append(table[index])
+	    first_path = 1
+	elif tag == STRINGS:
+	    for line in read_strings(data[start:end]):
+		table.append(line + '\n')
+	elif tag == PATH:
+	    # the first path of a bezier object is created by b()
+	    if not first_path:
+		result.append('bn()\n')
+	    first_path = 0
+	    result.append(path_text(data[start:end]))
+	elif tag == LAYER:
+	    block = read_records(data, start, end)
+	    blocks.append((end, len(table)))
+	    block.reverse()
+	    records.extend(block)
+	elif tag != INFO:
+	    raise ValueError('record type %r at %d' % (tag, start))
+    return ''.join(result)
+
+def read_strings(data):
+    # Return the list of strings in the data of a STRINGS record
+    result = []
+    pos = 0
+    end = len(data)
+    while pos < end:
+	length = unpack('<I', data[pos:pos + 4])[0]
+	pos = pos + 4
+	result.append(data[pos:pos + length])
+	pos = pos + length
+    return result
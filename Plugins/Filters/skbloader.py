@@ -0,0 +1,302 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+###Sketch Config
+#type = Import
+#class_name = 'SKBLoader'
+#rx_magic = '^##Sketch-binary 1 *(?P<minor>[0-9]+)'
+#tk_file_type = ('Skencil Binary Document', '.skb')
+format_name = 'SKB-1'
+#standard_messages = 1
+###End
+
+(''"Skencil Binary Document")
+
+#
+#	Load a document in SKB-1 format, the binary companion of SK-1.
+#
+# The container is described in Lib/skbfile.py. The function calls are
+# dispatched to the methods of the SK-1 loader. Every distinct call is
+# parsed only once, when it's read from the string table.
+#
+# With the lazy_layers preference the file is mapped into memory and
+# the objects of hidden layers are not read. The layers get a
+# LayerSource instead, which reads them from the mapped file when
+# they're needed (see Layer.load_SetSource).
+#
+
+import sys, os
+from cStringIO import StringIO
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+from Sketch.warn import warn_tb, INTERNAL
+from Sketch import load, plugins, config, SketchLoadError
+from Sketch.Graphics import image
+
+from Lib import skbfile
+
+def sk_loader_module():
+    for info in plugins.import_plugins:
+	if info.format_name == plugins.NativeFormat:
+	    return info.load_module()
+    raise SketchLoadError(_("SKB-1 needs the SK-1 import filter"))
+
+skloader = sk_loader_module()
+
+
+class SKBLoader(skloader.SKLoader):
+
+    format_name = format_name
+
+    def __init__(self, file, filename, match):
+	skloader.SKLoader.__init__(self, file, filename, match)
+	self.raw_data = None
+
+    def LoadSteps(self, step = None):
+	# Like SKLoader.LoadSteps. Progress is reported after every STEP
+	# calls and paths.
+	if step is None:
+	    step = config.preferences.load_step_lines
+	start = 0
+	data = None
+	if config.preferences.lazy_layers and mmap is not None:
+	    try:
+		start = self.file.tell()
+		data = mmap.mmap(self.file.fileno(), 0,
+				 access = mmap.ACCESS_READ)
+	    except (AttributeError, EnvironmentError, ValueError):
+		# not a plain file
+		start = 0
+		data = None
+	if data is None:
+	    data = self.file.read()
+	from Sketch import skread
+	self.parse = skread.parse_sk_line2
+	self.func_dict = self.get_func_dict()
+	self.offset = start
+	try:
+	    for progress in self.load_records(data, step, start):
+		yield progress
+	except GeneratorExit:
+	    raise
+	except (SketchLoadError, SyntaxError, ValueError), value:
+	    warn_tb(INTERNAL, 'error at offset %d', self.offset)
+	    if load._dont_handle_exceptions:
+		raise
+	    raise SketchLoadError('%d:%s' % (self.offset, value))
+	except:
+	    warn_tb(INTERNAL, 'error at offset %d', self.offset)
+	    if load._dont_handle_exceptions:
+		raise
+	    raise SketchLoadError(_("error %s:%s at offset %d")
+				  % (sys.exc_info()[:2] + (self.offset,)))
+	self.end_load()
+	# saving goes through the file dialog, SK-1 is the default there
+	self.object.meta.native_format = 0
+
+    def load_records(self, data, step, start = 0, end = None, table = None):
+	# Generator reading the records of DATA[START:END]. Layers are
+	# entered directly, the string table is cut back when a layer
+	# ends. TABLE is the string table to start with.
+	records = skbfile.read_records(data, start, end)
+	records.reverse()
+	if table is None:
+	    table = []
+	blocks = []		# (end of layer, length of table)
+	total = float(len(data))
+	done = 0
+	next = step
+	while records:
+	    tag, start, end = records.pop()
+	    self.offset = start
+	    while blocks and start >= blocks[-1][0]:
+		del table[blocks.pop()[1]:]
+	    if tag == skbfile.CALLS:
+		indices = skbfile.int_array(data[start:end])
+		done = done + self.do_calls(table, indices)
+	    elif tag == skbfile.STRINGS:
+		for line in skbfile.read_strings(data[start:end]):
+		    table.append(self.parse_entry(line))
+	    elif tag == skbfile.PATH:
+		self.append_path(skbfile.decode_path(data[start:end]))
+		done = done + 1
+	    elif tag == skbfile.RAW:
+		self.raw_data = data[start:end]
+	    elif tag == skbfile.LAYER:
+		block = skbfile.read_records(data, start, end)
+		if not self.lazy_layer(data, block, table):
+		    blocks.append((end, len(table)))
+		    block.reverse()
+		    records.extend(block)
+	    elif tag == skbfile.INFO:
+		pass
+	    else:
+		self.add_message(_("Unknown record type %s") % `tag`)
+	    if step and done >= next:
+		yield end / total
+		next = done + step
+
+    def lazy_layer(self, data, block, table):
+	# If the records in BLOCK are those of a hidden layer that can
+	# be read on its own, read only the layer call and leave the
+	# objects to a LayerSource. Return true if that was done.
+	if not config.preferences.lazy_layers or len(block) < 3:
+	    return 0
+	tag, start, end = block[-1]
+	if tag != skbfile.INFO:
+	    return 0
+	num_objects, flags, coord_rect, bounding_rect \
+		     = skbfile.decode_info(data[start:end])
+	if flags != skbfile.HIDDEN | skbfile.SELF_CONTAINED:
+	    return 0
+	(strings, start, end), (calls, calls_start, calls_end) = block[:2]
+	if strings != skbfile.STRINGS or calls != skbfile.CALLS:
+	    return 0
+	length = len(table)
+	for line in skbfile.read_strings(data[start:end]):
+	    table.append(self.parse_entry(line))
+	indices = skbfile.int_array(data[calls_start:calls_end])
+	if len(indices) != 1 or not length <= indices[0] < len(table) \
+	   or self.parse(table[indices[0]][0])[0] != 'layer':
+	    del table[length:]
+	    return 0
+	self.do_calls(table, indices)
+	source = LayerSource(self, data, calls_end,
+			     block[-1][1] - skbfile.header_size, table[:])
+	del table[length:]
+	self.end_composite()
+	self.object.load_SetSource(source, num_objects, coord_rect,
+				   bounding_rect)
+	return 1
+
+    def load_objects(self, data, start, end, table):
+	# Read the objects of a layer from the records in
+	# DATA[START:END] and return them as a list. TABLE is the string
+	# table at the beginning of the records.
+	from Sketch import skread
+	self.parse = skread.parse_sk_line2
+	self.func_dict = self.get_func_dict()
+	self.offset = start
+	for progress in self.load_records(data, 0, start, end, table):
+	    pass
+	self.end_all()
+	return filter(self.check_object, self.composite_items)
+
+    def parse_entry(self, line):
+	# Return the string table entry for LINE: the line and the
+	# parsed call. Calls with lists as arguments are parsed every
+	# time they're executed, because the functions may keep or
+	# modify the lists.
+	line = line + '\n'
+	if '[' in line:
+	    return (line, None)
+	return (line, self.parse(line))
+
+    def do_calls(self, table, indices):
+	get = self.func_dict.get
+	parse = self.parse
+	for index in indices:
+	    line, parsed = table[index]
+	    if parsed is None:
+		parsed = parse(line)
+	    funcname, args, kwargs = parsed
+	    if funcname is None:
+		continue
+	    function = get(funcname)
+	    if function is not None:
+		try:
+		    apply(function, args, kwargs)
+		except TypeError:
+		    self.call_failed(function, args, kwargs.copy())
+	    else:
+		self.add_message(_("Unknown function %s") % funcname)
+	return len(indices)
+
+    def append_path(self, path):
+	# The first path replaces the empty path created by b()
+	bezier = self.object
+	if bezier.paths[-1].len == 0:
+	    bezier.paths = bezier.paths[:-1] + (path,)
+	else:
+	    bezier.paths = bezier.paths + (path,)
+
+    def bm(self, id, filename = None):
+	if filename is None:
+	    if self.raw_data is None:
+		raise SketchLoadError(_("No data for image %d") % id)
+	    self.id_dict[id] = image.load_image(StringIO(self.raw_data))
+	    self.raw_data = None
+	else:
+	    skloader.SKLoader.bm(self, id, filename)
+
+
+class LayerSource:
+
+    # The objects of a hidden layer that are still in the file. Calling
+    # the source reads and returns them. The styles and images are
+    # shared with the loader that created the source.
+
+    text = None
+
+    def __init__(self, loader, data, start, end, table):
+	self.filename = loader.filename
+	self.match = loader.match
+	self.style_dict = loader.style_dict
+	self.id_dict = loader.id_dict
+	self.data = data
+	self.start = start
+	self.end = end
+	self.table = table
+
+    def __call__(self):
+	loader = SKBLoader(None, self.filename, self.match)
+	loader.style_dict = self.style_dict
+	loader.id_dict = self.id_dict
+	try:
+	    return loader.load_objects(self.data, self.start, self.end,
+				       self.table[:])
+	except SketchLoadError:
+	    raise
+	except:
+	    warn_tb(INTERNAL, 'error at offset %d', loader.offset)
+	    raise SketchLoadError(_("error %s:%s at offset %d")
+				  % (sys.exc_info()[:2] + (loader.offset,)))
+
+    def Text(self, document, directory):
+	# Return the objects as SK-1 text for a file in DIRECTORY without
+	# reading them (see SKSaver.SaveLayerSource) or None if the text
+	# would be wrong there. The text refers to images by the ids
+	# they had in the file and to the dynamic styles of DOCUMENT by
+	# name.
+	if self.id_dict:
+	    return None
+	for name, style in self.style_dict.items():
+	    if document.GetDynamicStyle(name) is not style:
+		# renamed or removed
+		return None
+	if self.text is None:
+	    lines = map(lambda entry: entry[0], self.table)
+	    self.text = skbfile.records_text(self.data, self.start, self.end,
+					     lines)
+	if os.path.abspath(directory) \
+	   != os.path.dirname(os.path.abspath(self.filename)) \
+	   and '\neps(' in '\n' + self.text:
+	    # relative filenames
+	    return None
+	return self.text
@@ -0,0 +1,138 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+###Sketch Config
+#type = Export
+#tk_file_type = (_("Skencil Binary Document"), '.skb')
+#extensions = '.skb'
+format_name = 'SKB-1'
+#standard_messages = 1
+###End
+
+
+#
+#	Save a document in SKB-1 format, the binary companion of SK-1.
+#
+# The container is described in Lib/skbfile.py. The saver is the SK-1
+# saver writing into a RecordWriter instead of a file, except for the
+# path data and inline images, which are written as binary records,
+# and layers, which become blocks. The saver doesn't get the layer
+# objects, so it takes them from the document's layer list in the order
+# the document saves them, to write the info record of each layer.
+#
+
+from cStringIO import StringIO
+
+from Sketch import plugins
+
+from Lib import skbfile
+
+# the SK-1 saver plugin
+sksaver = plugins.find_export_plugin(plugins.NativeFormat).load_module()
+
+
+class SKBSaver(sksaver.SKSaver):
+
+    # paths and images are written as records, not as text
+    cache_objects = 0
+
+    def __init__(self, file, filename, kw, layers = ()):
+	self.output = file
+	self.layers = list(layers)
+	self.layer = None
+	self.defines_images = 0
+	sksaver.SKSaver.__init__(self, skbfile.RecordWriter(file), filename,
+				 kw)
+
+    def Close(self):
+	sksaver.SKSaver.Close(self)
+	self.file.Flush()
+
+    def write_header(self):
+	self.output.write(skbfile.MAGIC)
+
+    def begin_block(self):
+	self.end_block()
+	self.file.BeginBlock()
+	if self.layers:
+	    self.layer = self.layers.pop(0)
+	else:
+	    self.layer = None
+	self.defines_images = 0
+
+    def end_block(self):
+	if not self.file.InBlock():
+	    return
+	layer = self.layer
+	if layer is not None and not layer.is_SpecialLayer and layer.objects:
+	    flags = 0
+	    if not layer.Visible():
+		flags = flags | skbfile.HIDDEN
+	    if not self.defines_images:
+		flags = flags | skbfile.SELF_CONTAINED
+	    self.file.Record(skbfile.INFO,
+			     skbfile.encode_info(len(layer.objects), flags,
+						 layer.coord_rect,
+						 layer.bounding_rect))
+	self.file.EndBlock()
+	self.layer = None
+
+    def begin_layer(self, method, args):
+	# Start the block of a layer. The layer call gets its own CALLS
+	# record so that the loader can read it without the objects.
+	self.begin_block()
+	apply(method, (self,) + args)
+	self.file.Flush()
+
+    def SaveLayerSource(self, source, document):
+	# the layer info needs the objects
+	return 0
+
+    def BeginLayer(self, *args):
+	self.begin_layer(sksaver.SKSaver.BeginLayer, args)
+
+    def BeginGuideLayer(self, *args):
+	self.begin_layer(sksaver.SKSaver.BeginGuideLayer, args)
+
+    def BeginGridLayer(self, *args):
+	self.begin_layer(sksaver.SKSaver.BeginGridLayer, args)
+
+    def EndLayer(self):
+	self.end_block()
+    EndGuideLayer = EndGridLayer = EndLayer
+
+    def PolyBezier(self, paths):
+	self.file.write('b()\n')
+	for path in paths:
+	    self.file.Record(skbfile.PATH, skbfile.encode_path(path))
+
+    def write_image(self, image, relative_filename = 1):
+	if not self.saved_ids.has_key(id(image)):
+	    self.defines_images = 1
+	if not self.saved_ids.has_key(id(image)) and not image.Filename():
+	    data = StringIO()
+	    image.image.save(data, 'PPM')
+	    self.file.Record(skbfile.RAW, data.getvalue())
+	    self.file.write('bm(%d)\n' % id(image))
+	    self.saved_ids[id(image)] = image
+	else:
+	    sksaver.SKSaver.write_image(self, image, relative_filename)
+
+
+def save(document, file, filename, options = {}):
+    saver = SKBSaver(file, filename, options, document.layers)
+    document.SaveToFile(saver)
+    saver.Close()
@@ -32,7 +32,8 @@ from string import atoi
 
 from Sketch.warn import warn, INTERNAL, pdebug, warn_tb
 
-from Sketch import load, const, plugins, SketchLoadError, SketchError
+from Sketch import load, const, plugins, config, SketchLoadError, \
+     SketchError
 from Sketch import CreateRGBColor, SolidPattern, HatchingPattern,EmptyPattern,\
      LinearGradient, ConicalGradient, RadialGradient, ImageTilePattern, \
      Style, MultiGradient, Trafo, Translation, Point, \
@@ -100,6 +101,7 @@ class SKLoader(GenericLoader):
 	self.font = None
 	self.font_size = 1.0
 	self.color_cache = {}
+	self.clone_trees = []
 
     def __del__(self):
 	pass
@@ -320,6 +322,35 @@ class SKLoader(GenericLoader):
 		break
 	return line
 
+    def bezier_load_lines(self, lines, idx):
+	# Like bezier_load, but for the bulk loader. Read the bezier data
+	# starting at LINES[IDX] and return the index of the first line
+	# after it. The paths are collected in a list and assigned once.
+	bezier = self.object
+	paths = list(bezier.paths)
+	path = paths[-1]
+	append = path.append_from_string
+	count = len(lines)
+	while idx < count:
+	    line = lines[idx]
+	    tag = line[:2]
+	    if tag == 'bs' or tag == 'bc':
+		try:
+		    append(line)
+		except:
+		    warn(INTERNAL, _("Error reading line %s"), `line`)
+	    elif tag == 'bC':
+		path.load_close()
+	    elif tag == 'bn':
+		path = CreatePath()
+		append = path.append_from_string
+		paths.append(path)
+	    else:
+		break
+	    idx = idx + 1
+	bezier.paths = tuple(paths)
+	return idx
+
     functions.append('txt')
     def txt(self, thetext, trafo, halign = text.ALIGN_LEFT,
 	    valign = text.ALIGN_BASE):
@@ -440,65 +471,53 @@ class SKLoader(GenericLoader):
     def PC_(self):
 	self.end_composite()
 
+    functions.append(('clone_tree', 'clones'))
+    def clone_tree(self, which, objects, parents):
+	# The objects are numbered in file order, so the tree can only be
+	# rebuilt once the whole document has been read.
+	self.clone_trees.append((which, objects, parents))
+
     #
     #	The loader driver
     #
 
     def Load(self):
+	for progress in self.LoadSteps(0):
+	    pass
+	return self.object
+
+    def LoadSteps(self, step = None):
+	# Generator doing the work of Load for IncrementalLoad. In bulk
+	# mode, the fraction of the file read so far is yielded after
+	# every STEP lines (default: the load_step_lines preference),
+	# not at all if STEP is 0. When it's exhausted self.object is
+	# the document.
+	if step is None:
+	    step = config.preferences.load_step_lines
 	file = self.file
 	if type(file) == StringType:
 	    file = open(file, 'r')
 	dict = self.get_func_dict()
 	from Sketch import skread
 	parse = skread.parse_sk_line2
-	readline = file.readline
-	bezier_load = self.bezier_load
-	num = 1
-	line = '#'
+	self.line_number = 1
+	self.line = '#'
 	if __debug__:
 	    import time
 	    start_time = time.clock()
 	try:
-	    line = readline()
-	    while line:
-		num = num + 1
-		if line[0] == 'b' and line[1] in 'sc':
-		    line = bezier_load(line)
-		    continue
-		#parse(line, dict)
-                funcname, args, kwargs = parse(line)
-                if funcname is not None:
-                    function = dict.get(funcname)
-                    if function is not None:
-                        try:
-                            apply(function, args, kwargs)
-                        except TypeError:
-                            tb = sys.exc_info()[2]
-                            try:
-                                if tb.tb_next is None:
-                                    # the exception was raised by apply
-                                    # and not within the function. Try to
-                                    # invoke the function with fewer
-                                    # arguments
-                                    if call_function(function, args, kwargs):
-                                        message = _("Omitted some arguments "
-                                                    "for function %s")
-                                    else:
-                                        message = _("Cannot call function %s")
-                                    self.add_message(message
-                                                     % function.__name__)
-
-                                else:
-                                    raise
-                            finally:
-                                del tb
-                    else:
-                        self.add_message(_("Unknown function %s") % funcname)
-                    
-		line = readline()
-
+	    if config.preferences.sk_bulk_load:
+		for progress in self.load_lines(file.readlines(), dict, parse,
+						step):
+		    yield progress
+	    else:
+		self.load_file(file, dict, parse)
+	except GeneratorExit:
+	    # the load was cancelled
+	    raise
 	except (SketchLoadError, SyntaxError), value:
 	    # a loader specific error occurred
+	    num = self.line_number
             warn_tb(INTERNAL, 'error in line %d', num)
 	    if load._dont_handle_exceptions:
 		raise
@@ -507,6 +526,8 @@ class SKLoader(GenericLoader):
 	except:
 	    # An exception was not converted to a SketchLoadError.
 	    # This should be considered a bug.
+	    num = self.line_number
+	    line = self.line
             warn_tb(INTERNAL, 'error in line %d:\n%s', num, `line`)
 	    if load._dont_handle_exceptions:
 		raise
@@ -514,18 +535,142 @@ class SKLoader(GenericLoader):
 		raise SketchLoadError(_("error %s:%s in line %d:\n%s")
 				      % (sys.exc_info()[:2] +(num, `line`)))
 
+	self.end_load()
+	self.object.meta.native_format = 1
+
+	if __debug__:
+	    pdebug('timing', 'time:', time.clock() - start_time)
+
+    def end_load(self):
+	# Finish the document after everything has been read
 	self.end_all()
 	if self.page_layout:
 	    self.object.load_SetLayout(self.page_layout)
 	for style in self.style_dict.values():
 	    self.object.load_AddStyle(style)
+	if self.clone_trees:
+	    # the clone trees number the objects of all layers
+	    self.object.MaterializeLayers()
 	self.object.load_Completed()
+	for which, objects, parents in self.clone_trees:
+	    try:
+		self.object.load_SetCloneTree(which, objects, parents)
+	    except ValueError, value:
+		self.add_message(_("Clone relationships dropped: %s") % value)
 
-	self.object.meta.native_format = 1
-
-	if __debug__:
-	    pdebug('timing', 'time:', time.clock() - start_time)
-	return self.object
+    def load_file(self, file, dict, parse):
+	# Read the file line by line. If an exception occurs the line and
+	# its number are stored in self.line and self.line_number.
+	readline = file.readline
+	bezier_load = self.bezier_load
+	num = 1
+	line = '#'
+	try:
+	    line = readline()
+	    while line:
+		num = num + 1
+		if line[0] == 'b' and line[1] in 'sc':
+		    line = bezier_load(line)
+		    continue
+		#parse(line, dict)
+                funcname, args, kwargs = parse(line)
+                if funcname is not None:
+                    function = dict.get(funcname)
+                    if function is not None:
+                        try:
+                            apply(function, args, kwargs)
+                        except TypeError:
+			    self.call_failed(function, args, kwargs)
+                    else:
+                        self.add_message(_("Unknown function %s") % funcname)
+                    
+		line = readline()
+	except:
+	    self.line_number = num
+	    self.line = line
+	    raise
+
+    def load_lines(self, lines, dict, parse, step = 0):
+	# The bulk loader. LINES is the whole file (minus the header line
+	# read by the load module) as returned by readlines, so there's
+	# no file access per line and bezier data is appended to the
+	# paths straight from the list. This is a generator that yields
+	# the fraction of the lines read after every STEP lines.
+	get = dict.get
+	bezier_load = self.bezier_load_lines
+	count = len(lines)
+	idx = 0
+	line = '#'
+	if step:
+	    next = step
+	else:
+	    next = count + 1
+	try:
+	    while idx < count:
+		if idx >= next:
+		    yield float(idx) / count
+		    next = idx + step
+		line = lines[idx]
+		if line[0] == 'b' and line[1] in 'sc':
+		    idx = bezier_load(lines, idx)
+		    continue
+		idx = idx + 1
+		funcname, args, kwargs = parse(line)
+		if funcname is not None:
+		    function = get(funcname)
+		    if function is not None:
+			if funcname == 'bm' and len(args) == 1 and not kwargs:
+			    # the image data follows in the next lines
+			    idx = self.inline_image(lines, idx, args[0])
+			    continue
+			try:
+			    apply(function, args, kwargs)
+			except TypeError:
+			    self.call_failed(function, args, kwargs)
+		    else:
+			self.add_message(_("Unknown function %s") % funcname)
+	except:
+	    # the first line in the list is the file's second line
+	    self.line_number = idx + 1
+	    self.line = line
+	    raise
+
+    def inline_image(self, lines, idx, id):
+	# bm for the bulk loader when the image data is inline. The
+	# base64 encoded data starts at LINES[IDX] and is terminated by
+	# '-'. Return the index of the line after the data.
+	from cStringIO import StringIO
+	from base64 import decodestring
+	data = []
+	count = len(lines)
+	while idx < count:
+	    line = lines[idx]
+	    idx = idx + 1
+	    pos = line.find('-')
+	    if pos >= 0:
+		data.append(line[:pos])
+		break
+	    data.append(line)
+	data = decodestring(''.join(data))
+	self.id_dict[id] = image.load_image(StringIO(data))
+	return idx
+
+    def call_failed(self, function, args, kwargs):
+	# Called from the except clause when calling FUNCTION raised a
+	# TypeError. If the exception was raised by apply and not within
+	# the function, try to invoke the function with fewer arguments,
+	# otherwise reraise it.
+	tb = sys.exc_info()[2]
+	try:
+	    if tb.tb_next is not None:
+		raise
+	    if call_function(function, args, kwargs):
+		message = _("Omitted some arguments for function %s")
+	    else:
+		message = _("Cannot call function %s")
+	    self.add_message(message % function.__name__)
+	finally:
+	    del tb
 
 
 def call_function(function, args, kwargs):
@@ -212,6 +212,20 @@ format_name = 'SK-1'
 #	sufficient to describe the entire compound and to reconstruct
 #	the objects in between PC and PC_. These contained objects are
 #	meant for installations where the plugin is not available.
+#
+#
+# Clones:
+#
+# clones(TREE, OBJECTS, PARENTS)
+#
+#	The clone relationships of the document, written after the last
+#	layer. TREE is 0 for the clones created by dragging and 1 for
+#	tiled clones. OBJECTS and PARENTS are lists of the same length
+#	describing the holders and branches of the clone tree in
+#	preorder: OBJECTS holds the number of the object (counting the
+#	top-level objects of all layers from 0 in file order) or -1 for
+#	a branch, PARENTS holds the position of the enclosing branch or
+#	-1 for the clone series themselves.
 
 
 #
@@ -238,11 +252,13 @@ format_name = 'SK-1'
 #
 #
 
-import os
+import os, tempfile
+from string import join
 
 from Sketch.Lib.util import relpath, Empty
+from Sketch.warn import warn, INTERNAL
 from Sketch import IdentityMatrix, EmptyPattern, SolidPattern, Style, \
-     StandardColors, SketchError, const
+     StandardColors, SketchError, const, config
 from Sketch.Graphics import properties
 from Sketch.Lib.units import m_to_pt, in_to_pt
 
@@ -285,6 +301,12 @@ default_options = {'full_blend' : 0}
 
 class SKSaver:
 
+    # Whether the text of objects may be kept for incremental saves
+    cache_objects = 1
+    cache_key = None
+    capture = None
+    used_ids = defined_ids = None
+
     def __init__(self, file, filename, kw):
 	self.file = file
 	self.filename = filename
@@ -298,15 +320,109 @@ class SKSaver:
 	options.update(kw)
 	self.options = apply(Empty, (), options)
 	self.saved_ids = {}
+	if self.cache_objects and config.preferences.incremental_save:
+	    # the saved text depends on the directory through relative
+	    # filenames and on the options
+	    options = options.items()
+	    options.sort()
+	    self.cache_key = (self.directory, options)
 
     def __del__(self):
 	self.Close()
 
     def Close(self):
-        pass
+	if self.capture is not None:
+	    self.capture.close()
+	    self.capture = None
 	#if not self.file.closed:
 	#    self.file.close()
 
+    #
+    #	Incremental saves
+    #
+    # With the incremental_save preference the text written for the
+    # top-level objects of the layers is kept in the objects, as the
+    # tuple (cache_key, text, used_ids, defined_ids) in their saved_text
+    # attribute, which is reset when an object changes. The next save
+    # writes that text instead of saving the object again, so saving
+    # costs time proportional to the objects that changed since.
+    #
+    # Images are saved with the first object that uses them, the other
+    # objects only refer to their ids. The text of an object can only
+    # be reused if the same images have been saved before it.
+
+    def SaveObject(self, object):
+	if self.cache_key is None:
+	    object.SaveToFile(self)
+	    return
+	saved = object.saved_text
+	if saved is not None and saved[0] == self.cache_key \
+	   and self.can_reuse(saved[2], saved[3]) \
+	   and self.check_saved_text(object, saved[1]):
+	    self.file.write(saved[1])
+	    self.saved_ids.update(saved[3])
+	    return
+	text, used_ids, defined_ids = self.capture_object(object)
+	self.file.write(text)
+	object.saved_text = (self.cache_key, text, used_ids, defined_ids)
+
+    def check_saved_text(self, object, text):
+	# With the incremental_save_check preference, save OBJECT again
+	# and return false if the result differs from the kept TEXT, i.e.
+	# if the kept text wasn't dropped when OBJECT changed.
+	if not config.preferences.incremental_save_check:
+	    return 1
+	saved_ids = self.saved_ids.copy()
+	new_text = self.capture_object(object)[0]
+	self.saved_ids = saved_ids
+	if new_text != text:
+	    warn(INTERNAL, 'incremental save: stale text for %s', object)
+	    return 0
+	return 1
+
+    def SaveLayerSource(self, source, document):
+	# Write the objects of a layer that are still in the file the
+	# layer was read from (see Layer.load_SetSource) without reading
+	# them, if SOURCE can provide them as text. Return true if that
+	# was done.
+	if not hasattr(source, 'Text'):
+	    return 0
+	text = source.Text(document, self.directory)
+	if text is None:
+	    return 0
+	self.file.write(text)
+	return 1
+
+    def can_reuse(self, used_ids, defined_ids):
+	saved_ids = self.saved_ids
+	for key in used_ids.keys():
+	    if saved_ids.has_key(key) == defined_ids.has_key(key):
+		return 0
+	return 1
+
+    def capture_object(self, object):
+	# Save OBJECT to a temporary file and return the tuple (text,
+	# used_ids, defined_ids). The temporary file is a real file so
+	# that the path objects can write to it directly.
+	if self.capture is None:
+	    self.capture = tempfile.TemporaryFile()
+	capture = self.capture
+	capture.seek(0)
+	capture.truncate()
+	file = self.file
+	self.file = capture
+	self.used_ids = {}
+	self.defined_ids = {}
+	try:
+	    object.SaveToFile(self)
+	    used_ids = self.used_ids
+	    defined_ids = self.defined_ids
+	finally:
+	    self.file = file
+	    self.used_ids = self.defined_ids = None
+	capture.seek(0)
+	return capture.read(), used_ids, defined_ids
+
     def write_header(self):
 	self.file.write('##Sketch 1 2\n')
 
@@ -512,6 +628,8 @@ class SKSaver:
 
     def write_image(self, image, relative_filename = 1):
         write = self.file.write
+        if self.used_ids is not None:
+            self.used_ids[id(image)] = image
         if not self.saved_ids.has_key(id(image)):
             imagefile = image.Filename()
             if not imagefile:
@@ -526,6 +644,8 @@ class SKSaver:
                     imagefile = relpath(self.directory, imagefile)
                 write('bm(%d,%s)\n' % (id(image), `imagefile`))
             self.saved_ids[id(image)] = image
+            if self.defined_ids is not None:
+                self.defined_ids[id(image)] = image
 
     def Image(self, image, trafo, relative_filename = 1):
         self.write_image(image, relative_filename)
@@ -608,6 +728,11 @@ class SKSaver:
     def EndPluginCompound(self):
 	self.file.write('PC_()\n')
 
+    def CloneTree(self, which, objects, parents):
+	self.file.write('clones(%d,[%s],[%s])\n'
+			% (which, join(map(str, objects), ','),
+			   join(map(str, parents), ',')))
+
 
 def save(document, file, filename, options = {}):
     saver = SKSaver(file, filename, options)
@@ -19,8 +19,10 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
-# Export Sketch drawings as raster images using ghostscript to render
-# them
+# Export Sketch drawings as raster images. The drawing is rendered in
+# process by Sketch's RasterDevice. Drawings with features it doesn't
+# support yet are rendered with ghostscript if it's installed (see
+# render_document).
 #
 # This script adds the following to the Script menu:
 #
@@ -35,13 +37,10 @@
 # some other format that can handle an alpha channel.
 #
 
-import sys
-import os, tempfile
-
-import PIL.Image, PIL.ImageChops
+import os
 
 import Sketch.Scripting
-from Sketch import _, PostScriptDevice
+from Sketch import _, render_document
 
 # for parameter dialogs
 from Sketch.UI.sketchdlg import SKModal
@@ -97,106 +96,22 @@ def export_raster_more_interactive(context, alpha = 0, use_bbox = 0,
         return export_raster_interactive(context,alpha,use_bbox,render_ppi)
 
 
-def make_ps(document):
-    file = tempfile.mktemp('.ps')
-    device = PostScriptDevice(file, as_eps = 0, document = document)
-    document.Draw(device)
-    device.Close()
-    return file
-
-
-def render_ps(filename, resolution, width, height, orig_x = 0, orig_y = 0,
-              prolog = '', antialias = '', gsdevice = 'ppmraw'):
-    if prolog:
-        prolog = '-c ' + '"' + prolog + '"'
-
-    if antialias:
-        antialias = ("-dTextAlphaBits=%d -dGraphicsAlphaBits=%d"
-                     % (antialias, antialias))
-    else:
-        antialias = ""
-
-    orig_x = -orig_x
-    orig_y = -orig_y
-
-    temp = tempfile.mktemp()
-
-    try:
-        gs_cmd = ('gs -dNOPAUSE -g%(width)dx%(height)d -r%(resolution)d '
-                  '-sOutputFile=%(temp)s %(antialias)s '
-                  '-sDEVICE=%(gsdevice)s -q %(prolog)s '
-                  '-c %(orig_x)f %(orig_y)f translate '
-                  '-f%(filename)s -c quit')
-        gs_cmd = gs_cmd % locals()
-        retval = os.system(gs_cmd)
-        if retval:
-            sys.stderr.write("skencil:export_raster: executing %s failed"
-                             " with exit code %x\n" % (repr(gs_cmd), retval))
-            raise IOError("Error running ghostscript."
-                          "  Perhaps it's not installed.")
-        image = PIL.Image.open(temp)
-        image.load()
-        return image
-    finally:
-       try:
-           os.unlink(temp)
-       except:
-           pass
-
-
 def export_raster(context, filename, resolution, use_bbox, format = None,
                   antialias = None):
-    # instead of the page size one could also use the bounding box
-    # (returned by the BoundingRect method).
-    if use_bbox:
-        left, bottom, right, top = context.document.BoundingRect()
-        width = right - left
-        height = top - bottom
-        x = left; y = bottom
-    else:
-        width, height = context.document.PageSize()
-        x = y = 0
-    width = round(width * resolution / 72.0)
-    height = round(height * resolution / 72.0)
-
-    temp = make_ps(context.document)
-    try:
-        image = render_ps(temp, resolution, width, height,
-                          orig_x = x, orig_y = y, antialias = antialias)
-    finally:
-        os.unlink(temp)
+    # Render the document in process and save it as FILENAME. Instead
+    # of the page size one can also use the bounding box of the
+    # drawing. ANTIALIAS is the supersampling factor (1, 2 or 4).
+    image = render_document(context.document, resolution, use_bbox,
+                            antialias = antialias)
     image.save(filename, format = format)
 
 
-alpha_prolog = "/setrgbcolor {pop pop pop 0 0 0 setrgbcolor} bind def \
-/setgray { pop 0 setgray} bind def \
-/setcmykcolor { pop pop pop pop 0 0 0 1.0 setcmykcolor} bind def "
-
 def export_alpha(context, filename, resolution, use_bbox = 0):
-    if use_bbox:
-        left, bottom, right, top = context.document.BoundingRect()
-        width = right - left
-        height = top - bottom
-        x = left; y = bottom
-    else:
-        width, height = context.document.PageSize()
-        x = y = 0
-
-    ps = make_ps(context.document)
-
-    width = round(width * resolution / 72.0)
-    height = round(height * resolution / 72.0)
-    rgb = render_ps(ps, resolution, width, height,
-                    orig_x = x, orig_y = y, antialias = 2)
-    alpha = render_ps(ps, resolution, width, height,
-                      orig_x = x, orig_y = y, antialias = 2,
-                      prolog = alpha_prolog, gsdevice = 'pgmraw')
-
-    alpha = PIL.ImageChops.invert(alpha)
-
-    rgb = rgb.convert('RGBA')
-    rgb.putalpha(alpha)
-    rgb.save(filename)
+    # Like export_raster but with a transparent background. The alpha
+    # channel is the coverage of the drawing.
+    image = render_document(context.document, resolution, use_bbox,
+                            antialias = 2, mode = 'RGBA')
+    image.save(filename)
 
 
 
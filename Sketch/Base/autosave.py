@@ -0,0 +1,236 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+#
+#	Autosave
+#
+# An AutoSaver saves an edited document to a recovery file from time to
+# time. Saving is split in two parts:
+#
+# The snapshot is taken in the main thread, between transactions, by
+# saving the document with the SK-1 saver into a Snapshot, which only
+# collects the strings written. With the incremental_save preference
+# the saver reuses the text of the objects that haven't changed since
+# the last save (see SKSaver.SaveObject) and the snapshot shares these
+# strings, so taking it costs time proportional to the changes.
+# Without incremental_save the whole document is saved in the main
+# thread every time, which blocks the UI for as long as a normal save.
+# Hidden layers of SKB-1 files that haven't been read yet are saved as
+# the text of their records without reading them (see
+# SKSaver.SaveLayerSource).
+#
+# The snapshot is then written in a worker thread, to a temporary file
+# in the directory of the recovery file which is renamed to the
+# recovery file when it is complete.
+#
+# The interval between two autosaves is the autosave_interval
+# preference, but at least autosave_seconds_per_mb seconds per MB of the
+# last snapshot, so that large documents are saved less often.
+#
+
+import sys, os, time, tempfile, shutil
+
+try:
+    import threading
+except ImportError:
+    threading = None
+
+from Sketch import _, config, plugins
+from Sketch.const import UNDO
+
+
+def recovery_filename(document):
+    # Return the name of the recovery file for DOCUMENT: '#NAME#' in the
+    # directory of the document's file, or a file in the user's config
+    # directory if the document hasn't been saved yet.
+    fullpathname = getattr(document.meta, 'fullpathname', None)
+    if fullpathname:
+	directory, name = os.path.split(fullpathname)
+	return os.path.join(directory, '#%s#' % name)
+    return os.path.join(config.user_config_dir,
+			'#untitled-%d#' % os.getpid())
+
+
+class Snapshot:
+
+    # The text of a document as written by the saver. The strings are
+    # kept as they are, so the text of unchanged objects is shared with
+    # the saver's cache.
+
+    def __init__(self):
+	self.parts = []
+	self.size = 0
+
+    def write(self, text):
+	self.parts.append(text)
+	self.size = self.size + len(text)
+
+    def Size(self):
+	return self.size
+
+    def WriteTo(self, file):
+	for part in self.parts:
+	    file.write(part)
+
+
+class FileSnapshot:
+
+    # A snapshot in a temporary file, used without incremental_save,
+    # where the saver needs a real file for paths and images.
+
+    def __init__(self):
+	self.file = tempfile.TemporaryFile()
+	self.write = self.file.write
+
+    def Size(self):
+	return self.file.tell()
+
+    def WriteTo(self, file):
+	self.file.seek(0)
+	shutil.copyfileobj(self.file, file)
+	self.file.close()
+
+
+def take_snapshot(document, filename):
+    # Save DOCUMENT as if it were saved to FILENAME and return the
+    # snapshot.
+    sksaver = plugins.find_export_plugin(plugins.NativeFormat).load_module()
+    if config.preferences.incremental_save:
+	snapshot = Snapshot()
+    else:
+	snapshot = FileSnapshot()
+    saver = sksaver.SKSaver(snapshot, filename, {})
+    document.SaveToFile(saver)
+    saver.Close()
+    return snapshot
+
+def write_snapshot(snapshot, filename):
+    # Write SNAPSHOT to FILENAME. FILENAME is replaced only when the new
+    # file is complete.
+    directory = os.path.dirname(filename) or os.curdir
+    if not os.path.isdir(directory):
+	os.makedirs(directory)
+    fd, tempname = tempfile.mkstemp(prefix = '.#', dir = directory)
+    try:
+	file = os.fdopen(fd, 'wb')
+	try:
+	    snapshot.WriteTo(file)
+	    file.flush()
+	    os.fsync(file.fileno())
+	finally:
+	    file.close()
+	if os.name != 'posix' and os.path.exists(filename):
+	    # rename doesn't replace existing files there
+	    os.remove(filename)
+	os.rename(tempname, filename)
+    except:
+	try:
+	    os.remove(tempname)
+	except OSError:
+	    pass
+	raise
+
+
+class AutoSaver:
+
+    def __init__(self, document):
+	self.document = document
+	self.changed = 0
+	self.last_save = time.time()
+	self.interval = config.preferences.autosave_interval
+	self.filename = None	# the recovery file written last
+	self.worker = None
+	self.error = None
+	document.Subscribe(UNDO, self.document_changed)
+
+    def Destroy(self):
+	self.wait()
+	self.document.Unsubscribe(UNDO, self.document_changed)
+	self.document = None
+
+    def document_changed(self, *args):
+	self.changed = 1
+
+    def wait(self):
+	if self.worker is not None:
+	    self.worker.join()
+	    self.worker = None
+
+    def Due(self):
+	# Return true if the document should be saved now
+	if not config.preferences.autosave or not self.changed:
+	    return 0
+	if self.worker is not None and self.worker.isAlive():
+	    return 0
+	if self.document.transaction:
+	    return 0
+	return time.time() >= self.last_save + self.interval
+
+    def Save(self):
+	# Take a snapshot of the document and write it to the recovery
+	# file in the background.
+	self.wait()
+	self.changed = 0
+	if not self.document.WasEdited():
+	    # saved in the meantime
+	    self.Discard()
+	    return
+	filename = recovery_filename(self.document)
+	snapshot = take_snapshot(self.document, filename)
+	self.last_save = time.time()
+	self.interval = max(config.preferences.autosave_interval,
+			    config.preferences.autosave_seconds_per_mb
+			    * snapshot.Size() / 1048576.0)
+	if self.filename is not None and self.filename != filename:
+	    # the document was saved under another name
+	    self.remove_file()
+	self.filename = filename
+	if threading is not None:
+	    self.worker = threading.Thread(target = self.write,
+					   args = (snapshot, filename))
+	    self.worker.setDaemon(1)
+	    self.worker.start()
+	else:
+	    self.write(snapshot, filename)
+
+    def write(self, snapshot, filename):
+	# Called in the worker thread. Errors are reported by Error.
+	try:
+	    write_snapshot(snapshot, filename)
+	except:
+	    self.error = _("Cannot write recovery file %(filename)s:\n"
+			   "%(message)s") % {'filename': filename,
+					     'message': sys.exc_info()[1]}
+
+    def Error(self):
+	# Return the message of an error that occurred in the worker
+	# thread since the last call, or None.
+	error = self.error
+	self.error = None
+	return error
+
+    def remove_file(self):
+	try:
+	    os.remove(self.filename)
+	except OSError:
+	    pass
+	self.filename = None
+
+    def Discard(self):
+	# Remove the recovery file, e.g. after the document was saved
+	self.wait()
+	if self.filename is not None:
+	    self.remove_file()
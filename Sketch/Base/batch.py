@@ -0,0 +1,226 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+#
+#	Batch Conversion
+#
+# Convert many drawings in one go with a pool of worker processes. The
+# library is initialized once in the calling process before the pool
+# is created, so with fork() the workers inherit the imported modules
+# and the plugin configuration. Where the workers can't be forked they
+# initialize the library themselves, once per worker.
+#
+# A job is a tuple (infile, outfile). The converters correspond to the
+# command line scripts:
+#
+#	CONVERT         like skconvert, the export filter is chosen by
+#			the extension of the output file
+#	POSTSCRIPT      like sk2ps
+#	RASTER          like sk2ppm
+#
+# The results are reported as they come in by calling a function with
+# the arguments (infile, outfile, seconds, error) where error is None
+# on success and the error message otherwise.
+#
+
+import sys, os, time, traceback
+from string import split, strip, join
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+
+CONVERT = 'convert'
+POSTSCRIPT = 'ps'
+RASTER = 'ppm'
+
+default_extensions = {CONVERT: None, POSTSCRIPT: '.eps', RASTER: '.ppm'}
+
+
+#
+#	Collecting the jobs
+#
+
+def find_drawings(directory, extensions = ('.sk',)):
+    # Return the names of all files below DIRECTORY whose extension is
+    # in EXTENSIONS, sorted.
+    result = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+	for name in filenames:
+	    if os.path.splitext(name)[1] in extensions:
+		result.append(os.path.join(dirpath, name))
+    result.sort()
+    return result
+
+def read_manifest(filename):
+    # Read a manifest file. Every non-empty line that doesn't start
+    # with '#' names an input file, optionally followed by the name of
+    # the output file separated by whitespace. Return a list of
+    # (infile, outfile) tuples, outfile may be None.
+    result = []
+    for line in open(filename).readlines():
+	line = strip(line)
+	if not line or line[0] == '#':
+	    continue
+	fields = split(line, None, 1)
+	if len(fields) == 1:
+	    result.append((fields[0], None))
+	else:
+	    result.append((fields[0], strip(fields[1])))
+    return result
+
+def output_name(infile, extension, outdir = None, root = None):
+    # Return the name of the output file for INFILE. If OUTDIR is given
+    # the file is put there, in a subdirectory corresponding to the
+    # location of INFILE relative to ROOT.
+    name = os.path.splitext(infile)[0] + extension
+    if outdir:
+	if root:
+	    name = name[len(os.path.join(root, '')):]
+	else:
+	    name = os.path.basename(name)
+	name = os.path.join(outdir, name)
+    return name
+
+def make_jobs(sources, extension, outdir = None, input_extensions = ('.sk',)):
+    # Return the list of (infile, outfile) jobs for SOURCES. Each
+    # source is a directory, which is searched recursively for files
+    # with one of INPUT_EXTENSIONS, a manifest file when the name
+    # starts with '@', or an input file.
+    jobs = []
+    for source in sources:
+	if source[:1] == '@':
+	    for infile, outfile in read_manifest(source[1:]):
+		if outfile is None:
+		    outfile = output_name(infile, extension, outdir)
+		jobs.append((infile, outfile))
+	elif os.path.isdir(source):
+	    for infile in find_drawings(source, input_extensions):
+		jobs.append((infile, output_name(infile, extension, outdir,
+						 source)))
+	else:
+	    jobs.append((source, output_name(source, extension, outdir)))
+    return jobs
+
+
+#
+#	Converting
+#
+
+initialized = 0
+converter = CONVERT
+options = {}
+
+def init_lib():
+    global initialized
+    if not initialized:
+	import Sketch
+	Sketch.init_lib()
+	initialized = 1
+
+def init_worker(converter_name, converter_options):
+    # Initializer of the worker processes
+    global converter, options
+    converter = converter_name
+    options = converter_options
+    init_lib()
+
+def convert_drawing(infile, outfile):
+    from Sketch import load, plugins, PostScriptDevice, render_document, \
+	 SketchError, _
+    doc = load.load_drawing(infile)
+    if converter == POSTSCRIPT:
+	psargs = options.copy()
+	if not psargs.get('Title'):
+	    psargs['Title'] = os.path.basename(infile)
+	bbox = doc.BoundingRect(visible = psargs.get('visible', 0),
+				printable = psargs.get('printable', 1))
+	psargs['bounding_box'] = tuple(bbox)
+	psargs['document'] = doc
+	ps = apply(PostScriptDevice, (outfile,), psargs)
+	doc.Draw(ps)
+	ps.Close()
+    elif converter == RASTER:
+	image = render_document(doc, options.get('resolution', 72.0),
+				options.get('use_bbox', 0),
+				antialias = options.get('antialias'))
+	image.save(outfile, format = options.get('format'))
+    else:
+	extension = os.path.splitext(outfile)[1]
+	fileformat = plugins.guess_export_plugin(extension)
+	if not fileformat:
+	    raise SketchError(_("unrecognized extension %s") % extension)
+	saver = plugins.find_export_plugin(fileformat)
+	saver(doc, outfile)
+
+def run_job(job):
+    # Convert one file. Return the tuple (infile, outfile, seconds,
+    # error). Exceptions are not propagated so that one bad drawing
+    # doesn't stop the whole batch.
+    infile, outfile = job
+    start = time.time()
+    error = None
+    try:
+	directory = os.path.dirname(outfile)
+	if directory and not os.path.isdir(directory):
+	    try:
+		os.makedirs(directory)
+	    except OSError:
+		# another worker may have created it in the meantime
+		if not os.path.isdir(directory):
+		    raise
+	convert_drawing(infile, outfile)
+    except (KeyboardInterrupt, SystemExit):
+	raise
+    except:
+	type, value = sys.exc_info()[:2]
+	error = strip(join(traceback.format_exception_only(type, value), ''))
+    return (infile, outfile, time.time() - start, error)
+
+def convert_files(jobs, report, converter_name = CONVERT,
+		  converter_options = None, processes = None):
+    # Run JOBS and call REPORT for every result as described above.
+    # PROCESSES is the number of worker processes, None means one per
+    # CPU. Without the multiprocessing module or with PROCESSES == 1 the
+    # jobs are run in this process. Return the number of failed jobs.
+    if converter_options is None:
+	converter_options = {}
+    init_lib()
+    failed = 0
+    if multiprocessing is None or processes == 1 or len(jobs) < 2:
+	init_worker(converter_name, converter_options)
+	for job in jobs:
+	    result = run_job(job)
+	    if result[3] is not None:
+		failed = failed + 1
+	    apply(report, result)
+	return failed
+
+    pool = multiprocessing.Pool(processes, init_worker,
+				(converter_name, converter_options))
+    try:
+	for result in pool.imap_unordered(run_job, jobs):
+	    if result[3] is not None:
+		failed = failed + 1
+	    apply(report, result)
+	pool.close()
+    except:
+	pool.terminate()
+	raise
+    pool.join()
+    return failed
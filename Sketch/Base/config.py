@@ -120,6 +120,11 @@ class ProgramDefaults(connector.Publisher):
     #	how many undo steps sketch remembers. None means unlimited.
     undo_limit = None
 
+    #	The approximate amount of memory in MB the undo steps of a
+    #	document may use. When it's exceeded the oldest steps are
+    #	forgotten. None means unlimited.
+    undo_memory_limit = 64
+
     #
     #	Gridding
     #
@@ -175,11 +180,50 @@ class ProgramDefaults(connector.Publisher):
     gradient_steps_editor = 30
     gradient_steps_print = 50
 
+    #
+    #	Raster Export
+    #
+    #	Drawings are rendered in process (see rasterdevice.py). If
+    #	true, drawings with features the in process renderer doesn't
+    #	support (dashes, caps and joins of wide lines, EPS files) are
+    #	rendered by ghostscript instead if it's installed.
+    raster_ghostscript_fallback = 1
+
+    #
+    #	Redraw
+    #
+    #	The areas changed by an operation are merged when it ends. If
+    #	more than damage_max_rects rectangles remain, the bounding box
+    #	of all of them is redrawn instead.
+    damage_max_rects = 16
+
+    #	If the merged areas cover more than this fraction of the
+    #	visible part of the document the whole window is redrawn.
+    damage_redraw_all_fraction = 0.5
+
+    #	The canvas keeps the rendered drawing in off-screen tiles of
+    #	tile_cache_size x tile_cache_size pixels so that scrolling and
+    #	expose events only have to copy pixmaps. At most
+    #	tile_cache_max_tiles tiles are kept. Set use_tile_cache to 0 to
+    #	always render directly into the window.
+    use_tile_cache = 1
+    tile_cache_size = 256
+    tile_cache_max_tiles = 96
+
+    #	Level of detail. Objects smaller than lod_object_size pixels are
+    #	drawn as small rectangles in their fill or line color. The
+    #	curves of paths whose nodes are on average closer than
+    #	lod_path_tolerance pixels are replaced by straight lines through
+    #	the nodes that are at least that far apart. Set lod_object_size
+    #	to 0 to always draw everything in full detail.
+    lod_object_size = 3
+    lod_path_tolerance = 1.0
+
     #
     #	Text
     #
     #	If the text on the screen becomes smaller than greek_threshold,
-    #	don't render a font, but draw little lines instead.
+    #	don't render a font, but draw a bar for every word instead.
     # XXX see comments in graphics.py
     greek_threshold = 5
 
@@ -427,6 +471,65 @@ class ProgramDefaults(connector.Publisher):
     #	affected.
     unload_import_filters = 1
 
+    #	If true, the configuration of the plugins is cached in
+    #	~/.sketch/plugins.cache so that the plugin files only have to
+    #	be read again when they have been changed.
+    plugin_cache = 1
+
+    #	If true, the SK import filter reads the whole file at once and
+    #	works on the list of lines. This is much faster for large
+    #	files but needs memory for the entire file.
+    sk_bulk_load = 1
+
+    #	If true, drawings are opened progressively: the objects read
+    #	so far are shown in the canvas while loading and loading can
+    #	be cancelled with Escape. Drawings are read in steps of
+    #	load_step_lines lines (for the SK format in bulk mode) and the
+    #	canvas is updated every progressive_load_interval seconds.
+    progressive_load = 1
+    load_step_lines = 2000
+    progressive_load_interval = 0.5
+
+    #	If true, the objects of hidden layers in SKB-1 files are left
+    #	in the file, which is mapped into memory, and only read when
+    #	they are needed, e.g. when the layer is made visible.
+    lazy_layers = 1
+
+    #	If true, the text written for each object when saving in SK-1
+    #	format is kept in memory and written again by the next save if
+    #	the object hasn't changed. This makes saving large drawings
+    #	much faster after small edits but roughly needs memory for the
+    #	size of the file.
+    incremental_save = 1
+
+    #	If true, incremental saves check the kept text: every object is
+    #	saved again and its text compared with the kept one. A
+    #	difference is reported as an internal warning and the new text
+    #	is written. This is as slow as a full save and only meant for
+    #	debugging.
+    incremental_save_check = 0
+
+    #	If true, edited documents are saved to a recovery file in the
+    #	background every autosave_interval seconds, or less often for
+    #	large documents: the interval is at least
+    #	autosave_seconds_per_mb seconds per MB of the saved document.
+    #	The recovery file of the document foo.sk is #foo.sk# in the
+    #	same directory. It's removed when the document is saved or
+    #	closed.
+    autosave = 1
+    autosave_interval = 60
+    autosave_seconds_per_mb = 2.0
+
+    #	If true, drawings of at least document_cache_min_size bytes are
+    #	kept in SKB-1 format in the directory cache in the user's
+    #	config directory after they have been read, and opening an
+    #	unchanged file again reads that copy instead of parsing the
+    #	file. The least recently used drawings are removed when the
+    #	cache is larger than document_cache_size MB.
+    document_cache = 1
+    document_cache_size = 256
+    document_cache_min_size = 100000
+
 
     #
     #   Misc
@@ -451,6 +554,7 @@ preferences = ProgramDefaults()
 
 # where these settings are saved in ~/.sketch/:
 user_settings_file = 'preferences.py'
+plugin_cache_file = 'plugins.cache'
 
 
 
@@ -28,10 +28,105 @@ from warn import warn_tb, INTERNAL
 class ConnectorError(SketchInternalError):
     pass
 
+def receiver_key(function, args):
+    # Return the key of the receiver (FUNCTION, ARGS) in the index of a
+    # Receivers instance or None if it isn't hashable. Bound methods are
+    # identified by the id of their object, because many objects that
+    # subscribe to channels are compared by identity but can't be
+    # hashed.
+    if type(function) == MethodType:
+	function = (id(function.im_self), function.im_func)
+    key = (function, args)
+    try:
+	hash(key)
+    except TypeError:
+	return None
+    return key
+
+
+class Receivers:
+
+    # The receivers of one channel of one object in the order in which
+    # they were connected. The list holds the receivers as (function,
+    # args) tuples and None for removed receivers, so that removing a
+    # receiver while the channel is issued doesn't affect the loop in
+    # Connector.Issue. The list is only compacted when the channel isn't
+    # being issued. The index maps the keys of the receivers to their
+    # positions in the list so that receivers can be found in constant
+    # time. Receivers whose key can't be hashed are searched in the list.
+
+    def __init__(self):
+	self.list = []
+	self.index = {}
+	self.count = 0
+	self.issuing = 0
+
+    def __len__(self):
+	return self.count
+
+    def Add(self, info):
+	key = receiver_key(info[0], info[1])
+	# a receiver connected again is moved to the end
+	self.remove(info, key)
+	if key is not None:
+	    self.index[key] = len(self.list)
+	self.list.append(info)
+	self.count = self.count + 1
+
+    def Remove(self, info):
+	# Remove the receiver INFO. Return true if it was connected.
+	return self.remove(info, receiver_key(info[0], info[1]))
+
+    def remove(self, info, key):
+	if key is not None:
+	    pos = self.index.get(key)
+	    if pos is None:
+		return 0
+	    del self.index[key]
+	else:
+	    try:
+		pos = self.list.index(info)
+	    except ValueError:
+		return 0
+	self.list[pos] = None
+	self.count = self.count - 1
+	if not self.issuing and len(self.list) > 16 \
+	   and self.count < len(self.list) / 2:
+	    self.compact()
+	return 1
+
+    def compact(self):
+	# Remove the None entries
+	list = []
+	index = {}
+	for info in self.list:
+	    if info is not None:
+		key = receiver_key(info[0], info[1])
+		if key is not None:
+		    index[key] = len(list)
+		list.append(info)
+	self.list = list
+	self.index = index
+
+    def Infos(self):
+	return filter(None, self.list)
+
+
 class Connector:
 
     def __init__(self):
 	self.connections = {}
+	# channel -> [receivers, connects, disconnects, issues]
+	self.counters = {}
+
+    def count(self, channel, receivers, connects, disconnects, issues):
+	counters = self.counters.get(channel)
+	if counters is None:
+	    counters = self.counters[channel] = [0, 0, 0, 0]
+	counters[0] = counters[0] + receivers
+	counters[1] = counters[1] + connects
+	counters[2] = counters[2] + disconnects
+	counters[3] = counters[3] + issues
 
     def Connect(self, object, channel, function, args):
 	idx = id(object)
@@ -43,14 +138,17 @@ class Connector:
 	if channels.has_key(channel):
 	    receivers = channels[channel]
 	else:
-	    receivers = channels[channel] = []
+	    receivers = channels[channel] = Receivers()
 
-	info = (function, args)
-	try:
-	    receivers.remove(info)
-	except ValueError:
-	    pass
-	receivers.append(info)
+	length = len(receivers)
+	receivers.Add((function, args))
+	self.count(channel, len(receivers) - length, 1, 0, 0)
+
+    def ConnectMany(self, connections):
+	# Connect all receivers in CONNECTIONS, a sequence of (object,
+	# channel, function, args) tuples
+	for object, channel, function, args in connections:
+	    self.Connect(object, channel, function, args)
 
     def Disconnect(self, object, channel, function, args):
 	try:
@@ -58,12 +156,11 @@ class Connector:
 	except KeyError:
 	    raise ConnectorError, \
 		  'no receivers for channel %s of %s' % (channel, object)
-	try:
-	    receivers.remove((function, args))
-	except ValueError:
+	if not receivers.Remove((function, args)):
 	    raise ConnectorError,\
 	    'receiver %s%s is not connected to channel %s of %s' \
 	    % (function, args, channel, object)
+	self.count(channel, -1, 0, 1, 0)
 
 	if not receivers:
 	    # the list of receivers is empty now, remove the channel
@@ -73,21 +170,43 @@ class Connector:
 		# the object has no more channels
 		del self.connections[id(object)]
 
+    def DisconnectMany(self, connections):
+	# Disconnect all receivers in CONNECTIONS, a sequence of (object,
+	# channel, function, args) tuples. Receivers that are not
+	# connected are ignored.
+	for object, channel, function, args in connections:
+	    try:
+		self.Disconnect(object, channel, function, args)
+	    except ConnectorError:
+		pass
+
     def Issue(self, object, channel, *args):
 	#print object, channel, args
 	try:
 	    receivers = self.connections[id(object)][channel]
 	except KeyError:
 	    return
-	for func, fargs in receivers:
-	    try:
-		apply(func, args + fargs)
-	    except:
-		warn_tb(INTERNAL, "%s.%s: %s%s", object, channel, func, fargs)
+	self.counters[channel][3] = self.counters[channel][3] + 1
+	receivers.issuing = receivers.issuing + 1
+	try:
+	    for info in receivers.list:
+		if info is None:
+		    continue
+		func, fargs = info
+		try:
+		    apply(func, args + fargs)
+		except:
+		    warn_tb(INTERNAL, "%s.%s: %s%s", object, channel, func,
+			    fargs)
+	finally:
+	    receivers.issuing = receivers.issuing - 1
 
     def RemovePublisher(self, object):
 	i = id(object)
 	if self.connections.has_key(i):
+	    for channel, receivers in self.connections[i].items():
+		self.counters[channel][0] = self.counters[channel][0] \
+					    - len(receivers)
 	    del self.connections[i]
 	# don't use try: del ... ; except KeyError here. That would create a
 	# new reference of object in a traceback object and this method should
@@ -97,18 +216,36 @@ class Connector:
     def HasSubscribers(self, object):
 	return self.connections.has_key(id(object))
 
+    def Counters(self):
+	# Return a dictionary mapping the channels to tuples (receivers,
+	# connects, disconnects, issues): the number of receivers
+	# connected now and the number of calls of Connect, Disconnect
+	# and Issue (with receivers) so far.
+	result = {}
+	for channel, counters in self.counters.items():
+	    result[channel] = tuple(counters)
+	return result
+
     def print_connections(self):
 	# for debugging
 	for id, channels in self.connections.items():
 	    for name, subscribers in channels.items():
 		print id, name
-		for func, args in subscribers:
+		for func, args in subscribers.Infos():
 		    if type(func) == MethodType:
 			print '\tmethod %s of %s' % (func.im_func.func_name,
 						     func.im_self)
 		    else:
 			print '\t', func
 
+    def print_counters(self):
+	# for debugging
+	items = self.counters.items()
+	items.sort()
+	for channel, (receivers, connects, disconnects, issues) in items:
+	    print '%s: %d receivers, %d connects, %d disconnects, %d issues' \
+		  % (channel, receivers, connects, disconnects, issues)
+
 
 
 _the_connector = Connector()
@@ -117,6 +254,8 @@ Connect = _the_connector.Connect
 Issue = _the_connector.Issue
 RemovePublisher = _the_connector.RemovePublisher
 Disconnect = _the_connector.Disconnect
+ConnectMany = _the_connector.ConnectMany
+DisconnectMany = _the_connector.DisconnectMany
 def Subscribe(channel, function, *args):
     return Connect(None, channel, function, args)
 
@@ -145,20 +284,57 @@ class Publisher:
 	RemovePublisher(self)
 
 
+def message_key(channel, args):
+    # Return a hashable key for the message (CHANNEL, ARGS). Arguments
+    # that can't be hashed, like graphics objects, are identified by
+    # their id.
+    key = [channel]
+    for arg in args:
+	try:
+	    hash(arg)
+	except TypeError:
+	    arg = ('id', id(arg))
+	key.append(arg)
+    return tuple(key)
+
+
 class QueueingPublisher(Publisher):
 
+    # Messages on the channels in latest_only replace the message queued
+    # before on the same channel, whatever its arguments are. Derived
+    # classes set this for channels whose receivers only need to know
+    # the latest state.
+    latest_only = ()
+
     def __init__(self):
 	self.clear_message_queue()
+	# channel -> [queued, suppressed]
+	self.queue_counters = {}
 
     def queue_message(self, channel, *args):
-	# Put message in the queue. If it is already queued put it at
-	# the end. This is done to make certain that no channel gets
-	# called twice between two calls to flush_message_queue. If the
-	# order of channel invocation is important two or more queues
-	# should be used.
-	message = (channel, args)
-	if message not in self.message_queue:
-	    self.message_queue.append(message)
+	# Put message in the queue. If it is already queued it stays
+	# where it is. This is done to make certain that no channel gets
+	# called twice with the same arguments between two calls to
+	# flush_message_queue. If the order of channel invocation is
+	# important two or more queues should be used.
+	latest = channel in self.latest_only
+	if latest:
+	    key = channel
+	else:
+	    key = message_key(channel, args)
+	counters = self.queue_counters.get(channel)
+	if counters is None:
+	    counters = self.queue_counters[channel] = [0, 0]
+	counters[0] = counters[0] + 1
+	pos = self.message_index.get(key)
+	if pos is not None:
+	    counters[1] = counters[1] + 1
+	    if not latest:
+		return
+	    # the latest message goes to the end
+	    self.message_queue[pos] = None
+	self.message_index[key] = len(self.message_queue)
+	self.message_queue.append((channel, args))
 
     def flush_message_queue(self):
 	# Issue all queued messages and make the queue empty
@@ -168,10 +344,22 @@ class QueueingPublisher(Publisher):
 	# that we don't get infinite loops here...
 	while self.message_queue:
 	    queue = self.message_queue
-	    self.message_queue = []
-	    for channel, args in queue:
-		apply(Issue, (self, channel) + args)
+	    self.clear_message_queue()
+	    for message in queue:
+		if message is not None:
+		    channel, args = message
+		    apply(Issue, (self, channel) + args)
 
     def clear_message_queue(self):
 	self.message_queue = []
-
+	self.message_index = {}
+
+    def QueueCounters(self):
+	# Return a dictionary mapping the channels to tuples (queued,
+	# suppressed): the number of messages queued on the channel and
+	# how many of them were dropped because an equal message or,
+	# for the latest_only channels, any message was already queued.
+	result = {}
+	for channel, counters in self.queue_counters.items():
+	    result[channel] = tuple(counters)
+	return result
@@ -0,0 +1,288 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+#
+#	Document Cache
+#
+# Drawings that have been read once are kept in a cache directory in
+# SKB-1 format, which is much faster to read than SK-1 and the foreign
+# formats, so opening an unchanged file again doesn't parse it. See
+# load.load_drawing and load.IncrementalLoad.
+#
+# The entries are named after the SHA-1 digest of the content of the
+# original file. The index file in the cache directory maps the names
+# of the original files to their mtime, size and digest, so that the
+# digest has to be computed only for new or modified files, and the
+# digests to the meta information of the documents (the format of the
+# original file etc.).
+#
+# An entry's mtime is updated whenever it's used. When the entries
+# together are larger than the document_cache_size preference the
+# least recently used ones are removed.
+#
+
+import os, tempfile
+from types import StringType, IntType, FloatType, NoneType
+import cPickle
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from Sketch import config, plugins
+from Sketch.warn import warn_tb, INTERNAL
+
+
+cache_format = 'SKB-1'
+cache_extension = '.skb'
+index_name = 'index'
+
+# meta information determined by the filename, not stored in the cache
+path_meta = ('fullpathname', 'filename', 'directory')
+
+
+def cache_directory():
+    return os.path.join(config.user_config_dir, 'cache')
+
+def file_digest(filename):
+    digest = sha1()
+    file = open(filename, 'rb')
+    try:
+	while 1:
+	    data = file.read(65536)
+	    if not data:
+		break
+	    digest.update(data)
+    finally:
+	file.close()
+    return digest.hexdigest()
+
+def write_atomically(filename, data):
+    # Write the string DATA to FILENAME through a temporary file
+    fd, tempname = tempfile.mkstemp(dir = os.path.dirname(filename))
+    try:
+	file = os.fdopen(fd, 'wb')
+	try:
+	    file.write(data)
+	finally:
+	    file.close()
+	if os.name != 'posix' and os.path.exists(filename):
+	    os.remove(filename)
+	os.rename(tempname, filename)
+    except:
+	try:
+	    os.remove(tempname)
+	except OSError:
+	    pass
+	raise
+
+
+class DocumentCache:
+
+    def __init__(self, directory, max_size):
+	self.directory = directory
+	self.max_size = max_size
+
+    def entry_filename(self, digest):
+	return os.path.join(self.directory, digest + cache_extension)
+
+    def read_index(self):
+	# Return the index as a tuple of dictionaries (paths, metas).
+	# A missing or corrupt index is treated like an empty one.
+	try:
+	    file = open(os.path.join(self.directory, index_name), 'rb')
+	    try:
+		paths, metas = cPickle.load(file)
+	    finally:
+		file.close()
+	except:
+	    return {}, {}
+	return paths, metas
+
+    def write_index(self, paths, metas):
+	write_atomically(os.path.join(self.directory, index_name),
+			 cPickle.dumps((paths, metas), 1))
+
+    def Lookup(self, filename):
+	# Return the CacheEntry for FILENAME or None if it can't be
+	# cached.
+	filename = os.path.abspath(filename)
+	try:
+	    stat = os.stat(filename)
+	except OSError:
+	    return None
+	if stat.st_size < config.preferences.document_cache_min_size:
+	    return None
+	key = (stat.st_mtime, stat.st_size)
+	paths, metas = self.read_index()
+	info = paths.get(filename)
+	if info is not None and info[:2] == key:
+	    digest = info[2]
+	else:
+	    digest = file_digest(filename)
+	entry = CacheEntry(self, filename, key, digest)
+	cachefile = self.entry_filename(digest)
+	if metas.has_key(digest) and os.path.exists(cachefile):
+	    entry.cachefile = cachefile
+	    entry.meta = metas[digest]
+	    try:
+		# it's the most recently used entry now
+		os.utime(cachefile, None)
+	    except OSError:
+		pass
+	return entry
+
+    def Store(self, entry, document):
+	if not os.path.isdir(self.directory):
+	    os.makedirs(self.directory)
+	cachefile = self.entry_filename(entry.digest)
+	fd, tempname = tempfile.mkstemp(dir = self.directory)
+	try:
+	    file = os.fdopen(fd, 'wb')
+	    try:
+		# relative filenames of images are relative to the
+		# original file
+		saver = plugins.find_export_plugin(cache_format)
+		saver(document, entry.filename, file = file)
+	    finally:
+		file.close()
+	    if os.name != 'posix' and os.path.exists(cachefile):
+		os.remove(cachefile)
+	    os.rename(tempname, cachefile)
+	except:
+	    try:
+		os.remove(tempname)
+	    except OSError:
+		pass
+	    raise
+	meta = {}
+	for key, value in document.meta.__dict__.items():
+	    if key not in path_meta \
+	       and type(value) in (StringType, IntType, FloatType, NoneType):
+		meta[key] = value
+	paths, metas = self.read_index()
+	paths[entry.filename] = entry.key + (entry.digest,)
+	metas[entry.digest] = meta
+	self.evict(paths, metas, cachefile)
+	self.write_index(paths, metas)
+
+    def Remove(self, entry):
+	paths, metas = self.read_index()
+	try:
+	    os.remove(self.entry_filename(entry.digest))
+	except OSError:
+	    pass
+	if metas.has_key(entry.digest):
+	    del metas[entry.digest]
+	    self.write_index(paths, metas)
+
+    def evict(self, paths, metas, keep):
+	# Remove the least recently used entries until the cache is
+	# small enough. The entry KEEP is never removed. The index
+	# dictionaries are updated.
+	entries = []
+	total = 0
+	for name in os.listdir(self.directory):
+	    if os.path.splitext(name)[1] != cache_extension:
+		continue
+	    filename = os.path.join(self.directory, name)
+	    try:
+		stat = os.stat(filename)
+	    except OSError:
+		continue
+	    total = total + stat.st_size
+	    entries.append((stat.st_mtime, filename, stat.st_size))
+	entries.sort()
+	for mtime, filename, size in entries:
+	    if total <= self.max_size:
+		break
+	    if filename == keep:
+		continue
+	    try:
+		os.remove(filename)
+	    except OSError:
+		continue
+	    total = total - size
+	    digest = os.path.splitext(os.path.basename(filename))[0]
+	    if metas.has_key(digest):
+		del metas[digest]
+	# forget the files whose entries are gone
+	for filename, info in paths.items():
+	    if not metas.has_key(info[2]):
+		del paths[filename]
+
+
+class CacheEntry:
+
+    # The cache entry for the file FILENAME. If the file is cached,
+    # cachefile is the name of the SKB-1 file and meta the dictionary
+    # with the meta information, otherwise both are None.
+
+    cachefile = None
+    meta = None
+
+    def __init__(self, cache, filename, key, digest):
+	self.cache = cache
+	self.filename = filename
+	self.key = key
+	self.digest = digest
+
+    def Cached(self):
+	return self.cachefile is not None
+
+    def Open(self):
+	return open(self.cachefile, 'rb')
+
+    def Restore(self, document):
+	# Set the meta information of DOCUMENT read from the cache to
+	# that of the original file
+	for key, value in self.meta.items():
+	    setattr(document.meta, key, value)
+
+    def Store(self, document):
+	# Store DOCUMENT read from the original file. Documents in the
+	# cache format are not cached, of course.
+	if document.meta.format_name == cache_format:
+	    return
+	try:
+	    self.cache.Store(self, document)
+	except:
+	    warn_tb(INTERNAL, 'cannot store %s in the document cache',
+		    self.filename)
+
+    def Discard(self):
+	# Remove the entry, e.g. when it couldn't be read
+	self.cachefile = self.meta = None
+	try:
+	    self.cache.Remove(self)
+	except:
+	    warn_tb(INTERNAL, 'cannot remove %s from the document cache',
+		    self.filename)
+
+
+def lookup(filename):
+    # Return the CacheEntry for FILENAME, or None if the cache is
+    # disabled or FILENAME can't be cached.
+    if type(filename) != StringType or not config.preferences.document_cache:
+	return None
+    cache = DocumentCache(cache_directory(),
+			  config.preferences.document_cache_size * 1048576)
+    try:
+	return cache.Lookup(filename)
+    except:
+	warn_tb(INTERNAL, 'document cache lookup for %s failed', filename)
+	return None
@@ -26,6 +26,10 @@
 #	Two classes that provide common functions for the format
 #	specific classes.
 #
+# IncrementalLoad
+#
+#	Loads a drawing in steps for progressive display.
+#
 # Functions
 #
 # load_drawing(filename)
@@ -40,7 +44,7 @@ import os, string
 import time
 
 import config, plugins
-from warn import warn, INTERNAL, pdebug
+from warn import warn, warn_tb, INTERNAL, pdebug
 from const import ArcPieSlice
 
 from Sketch.Graphics import document, layer, group, text
@@ -152,6 +156,37 @@ class LoaderWithComposites:
 	self.composite_items.append(object)
 	self.object = object
 
+    def PartialObjects(self):
+	# Return the objects read so far that can already be shown: the
+	# complete layers and the objects read for the current layer.
+	# Objects of unfinished groups are not included.
+	levels = [(self.composite_class, self.composite_items)]
+	stack = self.composite_stack
+	while stack:
+	    levels.append((stack[0], stack[2]))
+	    stack = stack[3]
+	levels.reverse()
+	objects = []
+	for idx in range(len(levels)):
+	    composite_class, items = levels[idx]
+	    if composite_class is None:
+		continue
+	    if issubclass(composite_class, layer.Layer):
+		layers = levels[idx - 1][1]
+		current = items
+	    elif issubclass(composite_class, doc_class) \
+		 and idx == len(levels) - 1:
+		layers = items
+		current = []
+	    else:
+		continue
+	    for object in layers:
+		if object.is_Layer and not object.is_SpecialLayer:
+		    objects.append(object)
+	    objects = objects + current
+	    break
+	return objects
+
     def pop_last(self):
         # remove the last object in self.composite_items and return it
         object = None
@@ -314,10 +349,10 @@ class SimplifiedLoader(GenericLoader):
 
 
 
-do_profile = 0
-def load_drawing_from_file(file, filename = '', doc_class = None):
-    # Note: the doc_class argument is only here for plugin interface
-    # compatibility with 0.7 (especiall e.g. gziploader)
+def find_loader(file, filename = ''):
+    # Determine the file type by reading the first line of FILE and
+    # return the tuple (info, loader) with the plugin info and the
+    # loader instance of the appropriate import filter.
     line = file.readline()
     # XXX ugly hack for riff-based files, e.g. Corel's CMX. The length
     # might contain newline characters.
@@ -327,32 +362,41 @@ def load_drawing_from_file(file, filename = '', doc_class = None):
     for info in plugins.import_plugins:
 	match = info.rx_magic.match(line)
 	if match:
-	    loader = info(file, filename, match)
-	    try:
-		if do_profile:
-		    import profile
-		    warn(INTERNAL, 'profiling...')
-		    prof = profile.Profile()
-		    prof.runctx('loader.Load()', globals(), locals())
-		    prof.dump_stats(os.path.join(info.dir,
-						 info.module_name + '.prof'))
-		    warn(INTERNAL, 'profiling... (done)')
-		    doc = loader.object
-		else:
-                    #t = time.clock()
-		    doc = loader.Load()
-                    #print 'load in', time.clock() - t, 'sec.'
-		messages = loader.Messages()
-		if messages:
-		    doc.meta.load_messages = messages
-		return doc
-	    finally:
-		info.UnloadPlugin()
+	    return info, info(file, filename, match)
     else:
 	raise SketchLoadError(_("unrecognised file type"))
 
 
-def load_drawing(filename):
+do_profile = 0
+def load_drawing_from_file(file, filename = '', doc_class = None):
+    # Note: the doc_class argument is only here for plugin interface
+    # compatibility with 0.7 (especiall e.g. gziploader)
+    info, loader = find_loader(file, filename)
+    try:
+	if do_profile:
+	    import profile
+	    warn(INTERNAL, 'profiling...')
+	    prof = profile.Profile()
+	    prof.runctx('loader.Load()', globals(), locals())
+	    prof.dump_stats(os.path.join(info.dir,
+					 info.module_name + '.prof'))
+	    warn(INTERNAL, 'profiling... (done)')
+	    doc = loader.object
+	else:
+            #t = time.clock()
+	    doc = loader.Load()
+            #print 'load in', time.clock() - t, 'sec.'
+	messages = loader.Messages()
+	if messages:
+	    doc.meta.load_messages = messages
+	return doc
+    finally:
+	info.UnloadPlugin()
+
+
+def open_drawing(filename):
+    # Return the file object and the filename for load_drawing and
+    # IncrementalLoad
     if type(filename) == StringType:
 	try:
 	    file = open(filename, 'r')
@@ -365,4 +409,142 @@ def load_drawing(filename):
 	# SKLoder requires the filename for external objects.
 	file = filename
 	filename = ''
-    return load_drawing_from_file(file, filename)
+    return file, filename
+
+
+def cache_entry(filename):
+    # Return the document cache entry for FILENAME or None, see
+    # doccache.py
+    if not config.preferences.document_cache:
+	return None
+    import doccache
+    return doccache.lookup(filename)
+
+
+def load_drawing(filename):
+    entry = cache_entry(filename)
+    if entry is not None and entry.Cached():
+	try:
+	    doc = load_drawing_from_file(entry.Open(), filename)
+	except (IOError, SketchLoadError):
+	    warn_tb(INTERNAL, 'cannot read %s from the document cache',
+		    filename)
+	    entry.Discard()
+	else:
+	    entry.Restore(doc)
+	    return doc
+    file, filename = open_drawing(filename)
+    doc = load_drawing_from_file(file, filename)
+    if entry is not None:
+	entry.Store(doc)
+    return doc
+
+
+class IncrementalLoad:
+
+    # Load a drawing in steps so that the caller can show the objects
+    # read so far and process events in between. Loaders that support
+    # this have a LoadSteps method, a generator which yields the
+    # fraction of the file read so far after every step. With other
+    # loaders the whole drawing is read in the first step.
+    #
+    # Typical use:
+    #
+    #   loader = IncrementalLoad(filename)
+    #   while loader.Step():
+    #       show(loader.PartialObjects())
+    #   doc = loader.Document()
+    #
+    # Exceptions are raised by Step as they would be by load_drawing.
+
+    def __init__(self, filename):
+	self.filename = filename
+	self.entry = cache_entry(filename)
+	if self.entry is not None and self.entry.Cached():
+	    try:
+		self.start(self.entry.Open(), filename)
+	    except (IOError, SketchLoadError):
+		self.entry.Discard()
+		self.start(*open_drawing(filename))
+	else:
+	    self.start(*open_drawing(filename))
+	self.progress = 0.0
+	self.document = None
+
+    def start(self, file, filename):
+	self.info, self.loader = find_loader(file, filename)
+	if hasattr(self.loader, 'LoadSteps'):
+	    self.steps = self.loader.LoadSteps()
+	else:
+	    self.steps = None
+
+    def Step(self):
+	# Do the next step. Return true if there's more to do.
+	if self.info is None:
+	    return 0
+	try:
+	    if self.steps is None:
+		self.finish(self.loader.Load())
+		return 0
+	    for progress in self.steps:
+		self.progress = progress
+		return 1
+	    self.finish(self.loader.object)
+	    return 0
+	except SketchLoadError:
+	    self.unload()
+	    if self.entry is None or not self.entry.Cached():
+		raise
+	    # the cached copy is broken. Start again with the file.
+	    warn_tb(INTERNAL, 'cannot read %s from the document cache',
+		    self.filename)
+	    self.entry.Discard()
+	    self.start(*open_drawing(self.filename))
+	    self.progress = 0.0
+	    return 1
+	except:
+	    self.unload()
+	    raise
+
+    def finish(self, doc):
+	messages = self.loader.Messages()
+	if messages:
+	    doc.meta.load_messages = messages
+	if self.entry is not None:
+	    if self.entry.Cached():
+		self.entry.Restore(doc)
+	    else:
+		self.entry.Store(doc)
+	self.document = doc
+	self.progress = 1.0
+	self.unload()
+
+    def unload(self):
+	if self.info is not None:
+	    self.info.UnloadPlugin()
+	    self.info = None
+	self.steps = None
+
+    def Progress(self):
+	# The fraction of the file read so far
+	return self.progress
+
+    def PartialObjects(self):
+	# The objects read so far that can be shown, see
+	# LoaderWithComposites.PartialObjects
+	if self.document is not None:
+	    return filter(lambda l: not l.is_SpecialLayer,
+			  self.document.layers)
+	if hasattr(self.loader, 'PartialObjects'):
+	    return self.loader.PartialObjects()
+	return []
+
+    def Cancel(self):
+	# Stop loading. The partially read drawing is discarded.
+	if self.steps is not None:
+	    self.steps.close()
+	self.unload()
+
+    def Document(self):
+	# The document once Step has returned false
+	return self.document
@@ -161,6 +161,8 @@ def main():
 
     from Sketch.UI.skapp import SketchApplication
     application = SketchApplication(filename, options.display, options.geometry, options.participant, options.f1, options.f2, options.f3,options.f4,run_script = options.run_script)
+    Sketch.startup_timing('main window')
     Sketch.Issue(None, Sketch.const.APP_INITIALIZED, application)
+    Sketch.report_startup_timing()
     application.Run()
     application.SavePreferences()
@@ -17,7 +17,7 @@
 
 import sys, os
 
-import re, imp
+import re, imp, cPickle
 from string import join, split
 
 from skexceptions import SketchError
@@ -186,6 +186,7 @@ class ExportInfo(ConfigInfo):
 	if type(extensions) != type(()):
 	    extensions = (extensions,)
 	self.extensions = extensions
+	self.translate()
 	export_formats[format_name] = self
 
     def translate(self):
@@ -202,6 +203,9 @@ class ExportInfo(ConfigInfo):
 	    warn_tb(INTERNAL, 'When importing plugin %s', self.module_name)
 	    raise SketchError(_("Cannot load filter %(name)s")
 			      % {'name':self.module_name})
+	# Lazy layers may still read from the file that is about to be
+	# overwritten. The others may be saved without reading them.
+	document.MaterializeLayers(filename)
 	if file is None:
 	    file = open(filename, 'w')
 	    close = 1
@@ -322,16 +326,160 @@ def extract_cfg(file):
 
 
 
-def _search_dir(dir, recurse, package = 'Sketch.Plugins'):
+def identity(text):
+    return text
+
+def read_cfg(filename):
+    # Return the configuration of the plugin FILENAME as a tuple
+    # (type, vars) where type is the key in config_types, or None if
+    # there isn't one, and vars the other variables defined. The
+    # strings marked with _() are left untranslated, so that the
+    # result doesn't depend on the locale and can be cached. The info
+    # objects translate them (see ConfigInfo.gettext).
+    vars = {'_':identity}
+    cfg = extract_cfg(filename)
+    exec cfg in config_types, vars
+    del vars['_']
+    infoclass = vars.get('type')
+    if infoclass is None:
+	return None, vars
+    del vars['type']
+    for key, value in config_types.items():
+	if value is infoclass:
+	    return key, vars
+    raise ValueError('unknown plugin type %s' % infoclass)
+
+
+#
+#	The plugin cache
+#
+# Reading the configuration of all plugins means opening and scanning
+# every .py file on the plugin path. With the plugin_cache preference
+# the result is stored in a file in the user's config directory and
+# reused at the next start. For every directory the cache holds its
+# mtime and the entries read: the subdirectories and the .py files with
+# their mtime and configuration. The entries are reused if the mtime of
+# the directory hasn't changed, so that a directory has to be listed
+# again only if files have been added, removed or renamed. Modified
+# files are found by their mtime and read again.
+#
+
+plugin_cache_version = 2
+
+class PluginCache:
+
+    def __init__(self, filename):
+	self.filename = filename
+	self.dirs = {}
+	self.modified = 0
+	try:
+	    file = open(filename, 'rb')
+	    try:
+		version, dirs = cPickle.load(file)
+	    finally:
+		file.close()
+	    if version == plugin_cache_version:
+		self.dirs = dirs
+	except:
+	    # missing, from another version or damaged
+	    self.modified = 1
+
+    def Entries(self, dir):
+	# Return a list of (kind, name, data) tuples for the entries of
+	# DIR. kind is 'dir' for directories, with data None, and 'py'
+	# for .py files, with data (mtime, cfg). cfg is the result of
+	# read_cfg for the file, or None if it couldn't be read. Raise
+	# os.error if the directory can't be listed.
+	mtime = os.stat(dir).st_mtime
+	cached = self.dirs.get(dir)
+	if cached is not None and cached[0] == mtime:
+	    entries = cached[1]
+	else:
+	    entries = []
+	    for file in os.listdir(dir):
+		filename = os.path.join(dir, file)
+		if os.path.isdir(filename):
+		    entries.append(('dir', file, None))
+		elif filename[-3:] == '.py':
+		    entries.append(('py', file, None))
+	result = []
+	for kind, file, data in entries:
+	    if kind == 'py':
+		filename = os.path.join(dir, file)
+		try:
+		    file_mtime = os.stat(filename).st_mtime
+		except os.error:
+		    continue
+		if data is None or data[0] != file_mtime or data[1] is None:
+		    data = (file_mtime, self.read(filename))
+	    result.append((kind, file, data))
+	if result != entries or cached is None or cached[0] != mtime:
+	    self.dirs[dir] = (mtime, result)
+	    self.modified = 1
+	return result
+
+    def read(self, filename):
+	try:
+	    cfg = read_cfg(filename)
+	    cPickle.dumps(cfg, 1)
+	    return cfg
+	except:
+	    warn_tb(INTERNAL, 'In config file %s', filename)
+	    warn(USER, _("can't read configuration information from "
+			 "%(filename)s"),
+		 filename =	 filename)
+	    return None
+
+    def Save(self):
+	if not self.modified:
+	    return
+	directory = os.path.dirname(self.filename)
+	tempname = self.filename + '.%d' % os.getpid()
+	try:
+	    if not os.path.isdir(directory):
+		os.makedirs(directory)
+	    file = open(tempname, 'wb')
+	    try:
+		cPickle.dump((plugin_cache_version, self.dirs), file, 1)
+	    finally:
+		file.close()
+	    if os.name != 'posix' and os.path.exists(self.filename):
+		os.remove(self.filename)
+	    os.rename(tempname, self.filename)
+	except (IOError, os.error):
+	    warn_tb(INTERNAL, 'Cannot write plugin cache %s', self.filename)
+	    try:
+		os.remove(tempname)
+	    except os.error:
+		pass
+	self.modified = 0
+
+class NoPluginCache(PluginCache):
+
+    # Read the configuration every time
+
+    def __init__(self):
+	self.dirs = {}
+	self.modified = 0
+
+    def Entries(self, dir):
+	self.dirs.clear()
+	return PluginCache.Entries(self, dir)
+
+    def Save(self):
+	pass
+
+
+def _search_dir(dir, recurse, package = 'Sketch.Plugins', cache = None):
     try:
-	files = os.listdir(dir)
+	entries = cache.Entries(dir)
     except os.error, value:
 	warn(USER, _("Cannot list directory %(filename)s\n%(message)s"),
 	     filename = dir, message = value[1])
 	return
-    for file in files:
+    for kind, file, data in entries:
 	filename = os.path.join(dir, file)
-        if os.path.isdir(filename):
+        if kind == 'dir':
             if file == "Lib":
                 # A Lib directory on the plugin path. It's assumed to
                 # hold library files for some plugin. Append it to the
@@ -343,21 +491,22 @@ def _search_dir(dir, recurse, package = 'Sketch.Plugins'):
             elif recurse:
                 # an ordinary directory and we should recurse into it to
                 # find more modules, so do that.
-                _search_dir(filename, recurse - 1, package + '.' + file)
-	elif filename[-3:] == '.py':
+                _search_dir(filename, recurse - 1, package + '.' + file,
+			    cache)
+	else:
+	    cfg = data[1]
+	    if cfg is None:
+		# the error has been reported when the file was read
+		continue
 	    try:
-		module_name = os.path.splitext(os.path.basename(filename))[0]
-		vars = {'_':_}	# hack
-		cfg = extract_cfg(filename)
-		exec cfg in config_types, vars
-		infoclass = vars.get('type')
-		if infoclass is None:
+		module_name = os.path.splitext(file)[0]
+		type, vars = cfg
+		if type is None:
 		    warn(USER, _("No plugin-type information in %(filename)s"),
 			 filename = filename)
 		else:
-		    del vars['type']
-		    del vars['_']
-		    info = apply(infoclass, (module_name, dir), vars)
+		    info = apply(config_types[type], (module_name, dir),
+				 vars.copy())
 		    info.package = package
 	    except:
 		warn_tb(INTERNAL, 'In config file %s', filename)
@@ -369,6 +518,11 @@ def load_plugin_configuration(): #path):
     if __debug__:
 	import time
 	start = time.clock()
+    if config.preferences.plugin_cache:
+	cache = PluginCache(os.path.join(config.user_config_dir,
+					 config.plugin_cache_file))
+    else:
+	cache = NoPluginCache()
     path = config.plugin_path
     for dir in path:
 	# XXX unix specific
@@ -379,7 +533,8 @@ def load_plugin_configuration(): #path):
 		recurse = 1
 	else:
 	    recurse = 0
-	_search_dir(dir, recurse)
+	_search_dir(dir, recurse, cache = cache)
+    cache.Save()
     if __debug__:
 	pdebug('timing', 'time to scan cfg files: %g', time.clock()-start)
     # rearrange import plugins to ensure that native format is first
@@ -24,9 +24,11 @@
 #
 
 
-from types import StringType, TupleType
+from types import StringType, TupleType, ListType, DictType, \
+     InstanceType, IntType, FloatType, NoneType
 from config import preferences
 from sys import maxint
+from struct import calcsize
 
 from warn import warn, INTERNAL, warn_tb
 
@@ -122,6 +124,48 @@ def check_info_silently(info):
     except UndoTypeError:
 	return 0
 
+
+# The approximate sizes used by undo_size
+pointer_size = calcsize('P')
+header_size = 4 * pointer_size
+object_size = 16 * pointer_size
+
+def undo_size(info):
+    # Return the approximate number of bytes held by the undo info
+    # INFO. Tuples, lists, dictionaries and strings are counted with
+    # their contents, a container referenced several times only once.
+    # Instances that have an UndoSize method (e.g. the clone tree
+    # snapshots) report their own size, other instances and functions
+    # are counted at a fixed size without looking at what they
+    # reference, since that's mostly shared with the document.
+    size = 0
+    seen = {}
+    stack = [info]
+    while stack:
+	item = stack.pop()
+	t = type(item)
+	if t in (IntType, FloatType, NoneType):
+	    size = size + pointer_size
+	    continue
+	if seen.has_key(id(item)):
+	    size = size + pointer_size
+	    continue
+	seen[id(item)] = item
+	if t == StringType:
+	    size = size + header_size + len(item)
+	elif t == TupleType or t == ListType:
+	    size = size + header_size + pointer_size * len(item)
+	    stack.extend(item)
+	elif t == DictType:
+	    size = size + header_size + 3 * pointer_size * len(item)
+	    stack.extend(item.keys())
+	    stack.extend(item.values())
+	elif t == InstanceType and hasattr(item, 'UndoSize'):
+	    size = size + item.UndoSize()
+	else:
+	    size = size + object_size
+    return size
+
 class UndoRedo:
 
     # A Class that manages lists of of undo and redo information
@@ -132,13 +176,23 @@ class UndoRedo:
     # by Redo, and is decreased by undoing something. The undo count can
     # be used to determine whether the document was changed since the
     # last save or not.
+    #
+    # The length of the undo list is limited by the undo_limit
+    # preference, its approximate size in memory (see undo_size) by the
+    # undo_memory_limit preference. When either limit is exceeded the
+    # oldest undo info is discarded, but the most recent is always
+    # kept. undo_sizes holds the sizes of the items of the undo list
+    # and undo_memory their sum.
 
     undo_count = 0
     
     def __init__(self):
 	self.undoinfo = []
 	self.redoinfo = []
+	self.undo_sizes = []
+	self.undo_memory = 0
 	self.SetUndoLimit(preferences.undo_limit)
+	self.SetUndoMemoryLimit(preferences.undo_memory_limit)
 	if not self.undo_count:
 	    self.undo_count = 0
 
@@ -150,6 +204,30 @@ class UndoRedo:
 	    self.max_undo = undo_limit
 	else:
 	    self.max_undo = 1
+	self.discard_old_undo()
+
+    def SetUndoMemoryLimit(self, limit):
+	# Set the limit for the size of the undo list in MB. None means
+	# unlimited.
+	if limit is None:
+	    self.max_undo_memory = maxint
+	else:
+	    self.max_undo_memory = max(0, int(limit * 1048576))
+	self.discard_old_undo()
+
+    def discard_old_undo(self):
+	# Internal method: discard the oldest undo info until the undo
+	# list is within both limits.
+	sizes = self.undo_sizes
+	while len(sizes) > self.max_undo \
+	      or (len(sizes) > 1 and self.undo_memory > self.max_undo_memory):
+	    self.undo_memory = self.undo_memory - sizes[-1]
+	    del sizes[-1]
+	    del self.undoinfo[-1]
+
+    def UndoMemory(self):
+	# Return the approximate size of the undo list in bytes
+	return self.undo_memory
 
     def CanUndo(self):
 	# Return true, iff an undo operation can be performed.
@@ -165,12 +243,15 @@ class UndoRedo:
 	if len(self.undoinfo) > 0:
 	    self.add_redo(Undo(self.undoinfo[0]))
 	    del self.undoinfo[0]
+	    self.undo_memory = self.undo_memory - self.undo_sizes[0]
+	    del self.undo_sizes[0]
 	    self.undo_count = self.undo_count - 1
 
     def AddUndo(self, info, clear_redo = 1):
 	# Add the undo info INFO to the undo list. If the undo list is
-	# longer than self.max_undo, discard the excessive undo info.
-	# Also increment the undo count and discard all redo info.
+	# longer than self.max_undo or larger than self.max_undo_memory,
+	# discard the oldest undo info. Also increment the undo count
+	# and discard all redo info.
 	#
 	# The flag CLEAR_REDO is used for internal purposes and inhibits
 	# clearing the redo info if it is false. This flag is only used
@@ -178,10 +259,12 @@ class UndoRedo:
 	# this parameter.
 	check_info(info)
 	if info:
+	    size = undo_size(info)
 	    self.undoinfo.insert(0, info)
+	    self.undo_sizes.insert(0, size)
+	    self.undo_memory = self.undo_memory + size
 	    self.undo_count = self.undo_count + 1
-	    if len(self.undoinfo) > self.max_undo:
-		del self.undoinfo[self.max_undo:]
+	    self.discard_old_undo()
 	    if clear_redo:
 		self.redoinfo = []
 
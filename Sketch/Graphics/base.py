@@ -456,8 +456,22 @@ class HierarchyNode:
 	if self.document is not None:
 	    apply(self.document.connector.Issue, (self, channel,) + args)
 
+    # The text written for self by the last incremental save (see
+    # SKSaver.SaveObject). It's dropped when self or one of its
+    # descendants changes.
+    saved_text = None
+
+    def forget_saved_text(self):
+	# Drop the saved text of self and its ancestors
+	node = self
+	while node is not None:
+	    if node.saved_text is not None:
+		node.saved_text = None
+	    node = node.parent
+
     def issue_changed(self):
 	self.Issue(CHANGED, self)
+	self.forget_saved_text()
 	if self.parent is not None:
 	    self.parent.ChildChanged(self)
 
@@ -669,6 +683,11 @@ class Primitive(GraphicsObject):
     def Destroy(self):
 	GraphicsObject.Destroy(self)
 
+    def SetDocument(self, doc):
+	GraphicsObject.SetDocument(self, doc)
+	if doc is not None:
+	    doc.add_style_user(self)
+
     def UntieFromDocument(self):
 	info = self.properties.Untie()
 	if info:
@@ -692,18 +711,27 @@ class Primitive(GraphicsObject):
 	# Move all points by OFFSET. OFFSET is an SKPoint instance.
 	return NullUndo
 
-    def DrawShape(self, device):
+    def DrawShape(self, device, properties = None):
 	# Draw the object on device. Here we just set the properties.
-	device.SetProperties(self.properties, self.bounding_rect)
+	# PROPERTIES, if given, is used instead of the object's property
+	# stack (see Clone.DrawShape).
+	if properties is None:
+	    properties = self.properties
+	device.SetProperties(properties, self.bounding_rect)
 
     # The following functions manage the properties
 
     def set_property_stack(self, properties):
 	self.properties = properties
+	if self.document is not None:
+	    self.document.add_style_user(self)
     load_SetProperties = set_property_stack
 
     def properties_changed(self, undo):
 	if undo is not NullUndo:
+	    if self.document is not None:
+		# the stack may contain new dynamic styles
+		self.document.add_style_user(self)
 	    return (UndoAfter, undo, self._changed())
 	return undo
 
@@ -751,13 +779,21 @@ class Primitive(GraphicsObject):
     script_access['LineWidth'] = SCRIPT_GET
 
     def ObjectChanged(self, obj):
-	if self.properties.ObjectChanged(obj):
+	rect = self.StyleChanged(obj)
+	if rect is not None:
+	    self.document.AddClearRect(rect)
+	    return 1
+	return 0
+
+    def StyleChanged(self, style):
+	# Update self after a change of STYLE. If self uses STYLE return
+	# the area that has to be redrawn, otherwise None.
+	if self.properties.ObjectChanged(style):
 	    rect = self.bounding_rect
 	    self.del_lazy_attrs()
-	    self.document.AddClearRect(UnionRects(rect, self.bounding_rect))
 	    self.issue_changed()
-	    return 1
-	return 0
+	    return UnionRects(rect, self.bounding_rect)
+	return None
 
     def ObjectRemoved(self, obj):
 	return self.properties.ObjectRemoved(obj)
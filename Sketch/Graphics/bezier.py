@@ -86,12 +86,14 @@ class PolyBezier(Primitive):
 
 	Primitive.__init__(self, properties = properties, duplicate=duplicate)
 
-    def Hit(self, p, rect, device, clip = 0):
+    def Hit(self, p, rect, device, clip = 0, properties = None):
 	for path in self.paths:
 	    if path.hit_point(rect):
 		return 1
-	return device.MultiBezierHit(self.paths, p, self.properties,
-				     clip or self.Filled(),
+	if properties is None:
+	    properties = self.properties
+	return device.MultiBezierHit(self.paths, p, properties,
+				     clip or properties.HasFill(),
 				     ignore_outline_mode = clip)
 
     def do_undo(self, undo_list):
@@ -125,8 +127,8 @@ class PolyBezier(Primitive):
 	self._changed()
 	return self.Translate, -offset
 
-    def DrawShape(self, device, rect = None, clip = 0):
-	Primitive.DrawShape(self, device)
+    def DrawShape(self, device, rect = None, clip = 0, properties = None):
+	Primitive.DrawShape(self, device, properties)
 	device.MultiBezier(self.paths, rect, clip)
 
     def GetObjectHandle(self, multiple):
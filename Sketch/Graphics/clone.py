@@ -18,13 +18,24 @@
 #
 #	The Clone Object
 #
+# A clone shares the geometry of its original. It only stores a
+# transformation mapping the original onto the clone and, if properties
+# were set on the clone, its own property stack which overrides the
+# properties of the original. Changes of the original's geometry show
+# up in all of its clones.
+#
+# Clones are saved as ordinary objects (see Materialize).
+#
 
 #from traceback import print_stack
 
-from Sketch import Translation, NullPoint, Trafo
-from Sketch import PointType, Undo, NullUndo
+from Sketch import Translation, Identity, Rect, EmptyRect, InfinityRect, \
+     UnionRects
+from Sketch import PointType, NullUndo, CreateListUndo, UndoAfter
+from Sketch import SingularMatrix
 from Sketch.const import CHANGED
-from base import Bounded, HierarchyNode
+from base import Bounded, HierarchyNode, Protocols
+import properties
 
 
 
@@ -40,11 +51,42 @@ def _unregister_clone(original):
     if _clone_registry[original] == 0:
 	del _clone_registry[original]
 
+def has_clones(original):
+    # Return true if there are registered clones of ORIGINAL
+    return _clone_registry.has_key(id(original))
+
+def transform_rect(trafo, rect):
+    # Return the smallest axis aligned rectangle containing RECT
+    # transformed by TRAFO
+    if rect is EmptyRect or rect is InfinityRect:
+	return rect
+    points = map(trafo, (rect.left, rect.left, rect.right, rect.right),
+		 (rect.bottom, rect.top, rect.top, rect.bottom))
+    xs = map(lambda p: p.x, points)
+    ys = map(lambda p: p.y, points)
+    return Rect(min(xs), min(ys), max(xs), max(ys))
+
 class Clone(Bounded, HierarchyNode):
 
     is_Clone = 1
 
-    def __init__(self, original = None, duplicate = None):
+    # the geometry belongs to the original, so clones can't be edited
+    # or converted on their own. EditDocument.SetMode turns a clone into
+    # an ordinary object before it's edited.
+    has_edit_mode = 0
+    is_curve = 0
+
+    # The protocol flags a clone shares with its original. The others
+    # have the defaults of Protocols, a clone is not a bezier object or
+    # a group even if its original is.
+    shared_flags = {'is_GraphicsObject': 1, 'is_Primitive': 1,
+		    'has_fill': 1, 'has_line': 1, 'has_font': 1,
+		    'has_properties': 1}
+
+    registered = 0
+    _properties = None
+
+    def __init__(self, original = None, duplicate = None, trafo = None):
 	HierarchyNode.__init__(self, duplicate = duplicate)
 	if original is not None and original.is_Clone:
 	    duplicate = original
@@ -52,57 +94,94 @@ class Clone(Bounded, HierarchyNode):
 	if duplicate is not None:
 	    self._original = duplicate._original
 	    self._center = duplicate._center
-	    self._offset = duplicate._offset
+	    self._trafo = duplicate._trafo
+	    if duplicate._properties is not None:
+		self._properties = duplicate._properties.Duplicate()
 	else:
 	    self._original = original
 	    self._center = self._original.coord_rect.center()
-	    self._offset = NullPoint
+	    if trafo is None:
+		trafo = Identity
+	    self._trafo = trafo
 	self.register()
 
+    def __cmp__(self, other):
+	# compare by identity like GraphicsObject. Without this the
+	# comparison would be delegated to the original.
+	return cmp(id(self), id(other))
+
     def register(self):
-	_register_clone(self._original)
-	self._original.Subscribe(CHANGED, self.orig_changed)
+	if not self.registered:
+	    _register_clone(self._original)
+	    self._original.Subscribe(CHANGED, self.orig_changed)
+	    self.registered = 1
+	    # the original may have changed while we were not listening
+	    center = self._original.coord_rect.center()
+	    if center.x != self._center.x or center.y != self._center.y:
+		self.orig_changed()
 
     def unregister(self):
-	self._original.Unsubscribe(CHANGED, self.orig_changed)
-	_unregister_clone(self._original)
+	if self.registered:
+	    self._original.Unsubscribe(CHANGED, self.orig_changed)
+	    _unregister_clone(self._original)
+	    self.registered = 0
+
+    def Connect(self):
+	self.register()
+
+    def Disconnect(self):
+	# don't keep removed clones alive through the original's
+	# subscriptions
+	self.unregister()
+
+    def SetDocument(self, doc):
+	HierarchyNode.SetDocument(self, doc)
+	if doc is not None and self._properties is not None:
+	    doc.add_style_user(self)
 
     def __getattr__(self, attr):
 	if self._lazy_attrs.has_key(attr):
 	    return Bounded.__getattr__(self, attr)
+	if attr == 'properties':
+	    # the properties the clone is drawn with
+	    return self.Properties()
+	if Protocols.__dict__.has_key(attr) \
+	   and not self.shared_flags.has_key(attr):
+	    return getattr(Protocols, attr)
 	#print 'Clone.__getattr__: from original:', attr
 	#if attr in ('__nonzero__', 'document'):
 	#    print_stack()
 	return getattr(self._original, attr)
 
+    def Original(self):
+	return self._original
+
+    def Trafo(self):
+	return self._trafo
+
     def update_rects(self):
-	off = self._offset
-	self.bounding_rect = self._original.bounding_rect.translated(off)
-	self.coord_rect = self._original.coord_rect.translated(off)
+	trafo = self._trafo
+	self.bounding_rect = transform_rect(trafo,
+					    self._original.bounding_rect)
+	self.coord_rect = transform_rect(trafo, self._original.coord_rect)
 
-    def Translate(self, offset):
-	self._offset = self._offset + offset
+    def _changed(self):
 	self.del_lazy_attrs()
-	return self.Translate, -offset
+	self.issue_changed()
+	return (self._changed,)
 
-    def _set_offset(self, offset):
-	undo = (self._set_offset, self._offset)
-	self._offset = offset
-	self.del_lazy_attrs()
+    def set_trafo(self, trafo):
+	undo = (self.set_trafo, self._trafo)
+	self._trafo = trafo
+	self._changed()
 	return undo
 
-    def offset_center(self, offset):
-	undo = (self.offset_center, -offset)
-	self._center = self._center + offset
-	return undo
+    def Translate(self, offset):
+	return self.set_trafo(Translation(offset)(self._trafo))
 
-    def Transform(self, trafo):
-	center = self._center + self._offset
-	offset = trafo(center) - center
-	if self.document is not None:
-	    self.document.AddAfterHandler(_transform,
-					  (self._original, trafo.matrix()), -1)
-	return self.offset_center(offset)
+    def Transform(self, trafo, rects = None):
+	# only the clone is transformed, not the original
+	return self.set_trafo(trafo(self._trafo))
 
     def orig_changed(self, *args):
 	if self.document is not None:
@@ -110,21 +189,140 @@ class Clone(Bounded, HierarchyNode):
 	self.del_lazy_attrs()
 	center = self._center
 	self._center = self._original.coord_rect.center()
-	self._offset = self._offset + center - self._center
+	# the clone stays where it is when the original is moved
+	self._trafo = self._trafo(Translation(center - self._center))
 	if self.document is not None:
 	    self.document.AddClearRect(self.bounding_rect)
+	# the clone is saved with the geometry of the original
+	self.forget_saved_text()
+	if self.parent is not None:
+	    # our bounding rect may have changed
+	    self.parent.ChildChanged(self)
+
+    #
+    #	Properties
+    #
+    # Properties set on a clone are kept in a copy of the original's
+    # property stack that is created when they are first set. Until
+    # then the clone uses the properties of the original. The copy
+    # shares the original's dynamic styles, so a clone with its own
+    # stack is registered as a user of its styles like a primitive.
+
+    def set_property_override(self, stack):
+	undo = (self.set_property_override, self._properties)
+	self._properties = stack
+	if stack is not None and self.document is not None:
+	    self.document.add_style_user(self)
+	return undo
+
+    def Properties(self):
+	if self._properties is not None:
+	    return self._properties
+	return self._original.Properties()
+
+    def PinProperties(self):
+	# Give the clone its own copy of the original's properties, so
+	# that changing the original's properties doesn't change the
+	# clone. Return the undo info.
+	if self._properties is not None or not self._original.has_properties:
+	    return NullUndo
+	return self.set_property_override(self._original.properties.Duplicate())
+
+    def Filled(self):
+	return self.Properties().HasFill()
+
+    def SetProperties(self, if_type_present = 0, **kw):
+	if not self._original.has_properties:
+	    return NullUndo
+	if if_type_present:
+	    stack = self.Properties()
+	    present = {properties.LineProperty: stack.HasLine(),
+		       properties.FillProperty: stack.HasFill(),
+		       properties.FontProperty: stack.HasFont()}
+	    prop_types = properties.property_types
+	    for key in kw.keys():
+		if not present.get(prop_types[key], 1):
+		    del kw[key]
+	undo = []
+	if self._properties is None:
+	    stack = self._original.properties.Duplicate()
+	    undo.append(self.set_property_override(stack))
+	undo.append(apply(self._properties.SetProperty, (), kw))
+	undo = CreateListUndo(undo)
+	if undo is not NullUndo:
+	    return (UndoAfter, undo, self._changed())
+	return undo
+
+    def StyleChanged(self, style):
+	# Like Primitive.StyleChanged for the clone's own stack. Changes
+	# of the original's styles reach the clone through orig_changed.
+	if self._properties is not None \
+	   and self._properties.ObjectChanged(style):
+	    rect = self.bounding_rect
+	    self.del_lazy_attrs()
+	    self.issue_changed()
+	    return UnionRects(rect, self.bounding_rect)
+	return None
+
+    def ObjectChanged(self, obj):
+	rect = self.StyleChanged(obj)
+	if rect is not None:
+	    self.document.AddClearRect(rect)
+	    return 1
+	return 0
+
+    def ObjectRemoved(self, obj):
+	if self._properties is not None:
+	    return self._properties.ObjectRemoved(obj)
+	return NullUndo
+
+    def call_with_properties(self, method, args):
+	# call METHOD of the original with ARGS, drawing or hit testing
+	# with the properties of this clone. The original itself is left
+	# alone, its lazy attributes depend on its own properties.
+	if self._properties is None:
+	    return apply(method, args)
+	return apply(method, args, {'properties': self._properties})
+
+    def Materialize(self, original = None):
+	# Return an ordinary object that looks like this clone. ORIGINAL
+	# may be a copy of the original made before the original was
+	# changed, the object then looks like the clone did at that time.
+	if original is None:
+	    original = self._original
+	# undo the adjustment of orig_changed for moves of the original
+	offset = self._center - original.coord_rect.center()
+	obj = original.Duplicate()
+	obj.Transform(self._trafo(Translation(offset)))
+	if self._properties is not None:
+	    obj.set_property_stack(self._properties.Duplicate())
+	return obj
+
+    def SaveToFile(self, file):
+	self.Materialize().SaveToFile(file)
 
     def DrawShape(self, device, rect = None):
+	if rect is not None:
+	    try:
+		rect = transform_rect(self._trafo.inverse(), rect)
+	    except SingularMatrix:
+		rect = None
 	device.PushTrafo()
 	try:
-	    device.Translate(self._offset)
-	    self._original.DrawShape(device, rect)
+	    device.Concat(self._trafo)
+	    self.call_with_properties(self._original.DrawShape, (device, rect))
 	finally:
 	    device.PopTrafo()
 
     def Hit(self, p, rect, device):
-	off = -self._offset
-	return self._original.Hit(p + off, rect.translated(off), device)
+	try:
+	    inverse = self._trafo.inverse()
+	except SingularMatrix:
+	    return 0
+	return self.call_with_properties(self._original.Hit,
+					 (inverse(p),
+					  transform_rect(inverse, rect),
+					  device))
 
 
     def Info(self):
@@ -136,7 +334,7 @@ class Clone(Bounded, HierarchyNode):
 	return self
 
     def GetObjectHandle(self, multiple):
-	trafo = Translation(self._offset)
+	trafo = self._trafo
 	handle = self._original.GetObjectHandle(multiple)
 	if type(handle) == PointType:
 	    return trafo(handle)
@@ -145,25 +343,11 @@ class Clone(Bounded, HierarchyNode):
 
     # overwrite Bounded methods
     def LayoutPoint(self):
-	return self._original.LayoutPoint() + self._offset
+	return self._trafo(self._original.LayoutPoint())
 
     def GetSnapPoints(self):
-	return map(Translation(self._offset), self._original.GetSnapPoints())
-
-
-def _transform(original, matrix):
-    trafo = apply(Trafo, matrix)
-    undo = original.Transform(trafo)
-    doc = original.document
-    doc.AddUndo((_undo, doc, [undo]))
-
-def _after_handler(undo, list):
-    list[0] = Undo(undo)
+	return map(self._trafo, self._original.GetSnapPoints())
 
-def _undo(doc, undo):
-    list = [NullUndo]
-    doc.AddAfterHandler(_after_handler, (undo[0], list), -1)
-    return (_undo, doc, list)
 '''
 def CreateClone(object):
     clone = Clone(object)
@@ -0,0 +1,460 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307	USA
+
+#
+#	The Clone Graph
+#
+# EditDocument stores the clone relationships (doc.clones and
+# doc.tile_clones) as nested lists. The tree is a list of series. A
+# series (or branch) is a list whose entries are either holders, i.e.
+# one element lists [object], or sub-branches, i.e. lists of entries
+# themselves.
+#
+# A CloneGraph indexes such a tree by object identity so that the
+# branch and position of an object, the parent of a branch and the
+# series an object belongs to can be found without walking the whole
+# tree. The nested lists stay the actual data so that undo snapshots
+# (EditDocument.copy_tree) and scripts indexing doc.clones keep
+# working. Code that modifies the lists directly has to call the
+# graph's Invalidate method afterwards; the index is then rebuilt
+# lazily in one linear pass.
+#
+# The position a node stores for its entry is only a hint. Inserting
+# or removing an entry doesn't update the positions of the entries
+# after it, which would make every change linear in the length of the
+# branch. Instead the position is checked when it's needed and, if
+# the entry has moved, searched for starting at the old position, so
+# the cost depends on how far the entry moved, not on the size of the
+# branch.
+#
+# The undo information of changes to a tree holds a TreeSnapshot of
+# the old tree (see snapshot_tree). Snapshots are immutable and
+# branches with the same entries are shared between snapshots, so the
+# snapshots in the undo history only take up extra memory for the
+# branches that actually changed.
+#
+
+from types import ListType
+from struct import calcsize
+import weakref
+
+
+def is_holder(entry):
+    # Return true if ENTRY is a holder, i.e. a list [object]
+    return entry and type(entry[0]) != ListType
+
+
+def prune_empty_branches(branch, removed_list = None):
+    # Remove all empty lists from BRANCH, recursively. Branches that
+    # become empty because their children were removed are removed as
+    # well. BRANCH itself is never removed. Return the number of lists
+    # removed. If REMOVED_LIST is given the removed lists are appended
+    # to it.
+    removed = 0
+    idx = 0
+    while idx < len(branch):
+        entry = branch[idx]
+        if entry and type(entry[0]) == ListType:
+            removed = removed + prune_empty_branches(entry, removed_list)
+        if not entry:
+            del branch[idx]
+            removed = removed + 1
+            if removed_list is not None:
+                removed_list.append(entry)
+        else:
+            idx = idx + 1
+    return removed
+
+
+def tree_objects(branch):
+    # Return the objects in BRANCH (a tree, series or sub-branch) in
+    # depth first order, i.e. the order in which the clones were
+    # created.
+    result = []
+    stack = [iter(branch)]
+    while stack:
+        for entry in stack[-1]:
+            if is_holder(entry):
+                result.append(entry[0])
+            elif entry:
+                stack.append(iter(entry))
+                break
+        else:
+            stack.pop()
+    return result
+
+
+def encode_tree(tree, numbers):
+    # Flatten TREE for saving. Return two parallel lists OBJECTS and
+    # PARENTS with one item for every holder and branch in preorder.
+    # OBJECTS holds the number of the holder's object as given by the
+    # dictionary NUMBERS (mapping id(object) to an int) or -1 for a
+    # branch. PARENTS holds the position of the enclosing branch in
+    # these lists or -1 for the series themselves. Holders of objects
+    # not in NUMBERS are left out.
+    objects = []
+    parents = []
+    stack = [(iter(tree), -1)]
+    while stack:
+        entries, parent = stack[-1]
+        for entry in entries:
+            if is_holder(entry):
+                number = numbers.get(id(entry[0]))
+                if number is not None:
+                    objects.append(number)
+                    parents.append(parent)
+            else:
+                objects.append(-1)
+                parents.append(parent)
+                stack.append((iter(entry), len(objects) - 1))
+                break
+        else:
+            del stack[-1]
+    return objects, parents
+
+
+def decode_tree(objects, parents, table):
+    # The inverse of encode_tree. TABLE is the list of objects indexed
+    # by the numbers in OBJECTS. The tree is built in one pass.  Raise
+    # ValueError if the lists are inconsistent. Empty branches are
+    # removed.
+    if len(objects) != len(parents):
+        raise ValueError('clone tree: %d objects but %d parents'
+                         % (len(objects), len(parents)))
+    tree = []
+    entries = []
+    for idx in range(len(objects)):
+        number = objects[idx]
+        parent = parents[idx]
+        if number < 0:
+            entry = []
+        elif number < len(table):
+            entry = [table[number]]
+        else:
+            raise ValueError('clone tree: no object %d' % number)
+        if parent < 0:
+            tree.append(entry)
+        elif parent < idx and objects[parent] < 0:
+            entries[parent].append(entry)
+        else:
+            raise ValueError('clone tree: invalid parent %d of %d'
+                             % (parent, idx))
+        entries.append(entry)
+    prune_empty_branches(tree)
+    return tree
+
+
+class TreeSnapshot:
+
+    # An immutable copy of a branch. ENTRIES is a tuple with the object
+    # of every holder and a TreeSnapshot for every sub-branch.
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def Tree(self):
+        # Return the branch as new nested lists
+        tree = []
+        for entry in self.entries:
+            if isinstance(entry, TreeSnapshot):
+                tree.append(entry.Tree())
+            else:
+                tree.append([entry])
+        return tree
+
+    def UndoSize(self):
+        # The approximate size of the snapshot in bytes for
+        # undo.undo_size. Shared branches are counted in every snapshot
+        # that contains them, so this overestimates the memory used by
+        # several snapshots.
+        size = 0
+        stack = [self]
+        while stack:
+            snapshot = stack.pop()
+            size = size + snapshot_node_size \
+                   + calcsize('P') * len(snapshot.entries)
+            for entry in snapshot.entries:
+                if isinstance(entry, TreeSnapshot):
+                    stack.append(entry)
+        return size
+
+snapshot_node_size = 12 * calcsize('P')
+
+# The live snapshots by the ids of their entries. The key is unique as
+# long as the snapshot exists because it references its entries.
+_snapshots = weakref.WeakValueDictionary()
+
+def snapshot_tree(branch):
+    # Return a TreeSnapshot of BRANCH (a tree, series or sub-branch).
+    # Sub-branches whose entries are the same as those of an existing
+    # snapshot are represented by that snapshot. Empty branches are
+    # kept as empty snapshots, so that Tree() restores the branch
+    # exactly.
+    entries = []
+    for entry in branch:
+        if is_holder(entry):
+            entries.append(entry[0])
+        else:
+            # a sub-branch, possibly empty
+            entries.append(snapshot_tree(entry))
+    entries = tuple(entries)
+    key = tuple(map(id, entries))
+    snapshot = _snapshots.get(key)
+    if snapshot is None:
+        snapshot = _snapshots[key] = TreeSnapshot(entries)
+    return snapshot
+
+def restore_tree(tree):
+    # Return TREE as nested lists. TREE may be a TreeSnapshot or, in
+    # undo information created by older code, nested lists.
+    if isinstance(tree, TreeSnapshot):
+        return tree.Tree()
+    return tree
+
+
+class CloneNode:
+
+    # A node of the clone graph. ENTRY is the holder or sub-branch
+    # list, BRANCH is the list containing ENTRY and INDEX its last known
+    # position in BRANCH (see CloneGraph.position).
+
+    def __init__(self, entry, branch, index):
+        self.entry = entry
+        self.branch = branch
+        self.index = index
+
+    def Object(self):
+        # the object of a holder node, None for branch nodes
+        if is_holder(self.entry):
+            return self.entry[0]
+        return None
+
+
+class CloneGraph:
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.rebuild()
+
+    def rebuild(self):
+        # nodes maps id(entry) to the node of every holder and
+        # sub-branch, objects maps id(object) to the node of its holder
+        self.nodes = {}
+        self.objects = {}
+        self.dirty = 0
+        self.index_branch(self.tree)
+
+    def index_branch(self, branch):
+        # Register the entries of BRANCH and of its sub-branches. The
+        # walk uses an explicit stack because clone trees can be nested
+        # deeply.
+        nodes = self.nodes
+        objects = self.objects
+        stack = [branch]
+        while stack:
+            branch = stack.pop()
+            for idx in range(len(branch)):
+                entry = branch[idx]
+                node = nodes[id(entry)] = CloneNode(entry, branch, idx)
+                if is_holder(entry):
+                    objects[id(entry[0])] = node
+                elif entry:
+                    stack.append(entry)
+
+    def position(self, node):
+        # Return the current position of NODE's entry in its branch or
+        # None if it's not there anymore. The position stored in the
+        # node is checked first, then the branch is searched outwards
+        # from there, because entries are only moved by insertions and
+        # removals of entries before them.
+        branch = node.branch
+        entry = node.entry
+        index = node.index
+        length = len(branch)
+        if index < length and branch[index] is entry:
+            return index
+        low = high = min(index, length)
+        while low > 0 or high < length:
+            if high < length:
+                if branch[high] is entry:
+                    node.index = high
+                    return high
+                high = high + 1
+            if low > 0:
+                low = low - 1
+                if branch[low] is entry:
+                    node.index = low
+                    return low
+        return None
+
+    def unindex_entry(self, entry):
+        stack = [entry]
+        while stack:
+            entry = stack.pop()
+            try:
+                del self.nodes[id(entry)]
+            except KeyError:
+                pass
+            if is_holder(entry):
+                node = self.objects.get(id(entry[0]))
+                if node is not None and node.entry is entry:
+                    del self.objects[id(entry[0])]
+            else:
+                stack.extend(entry)
+
+    def Invalidate(self):
+        # Must be called after the tree has been changed in place
+        # without using the methods of this class.
+        self.dirty = 1
+
+    def node(self, entry):
+        # Return the node for ENTRY which may be a holder, a sub-branch
+        # or an object. Holders are looked up by their object, just
+        # like list comparison would find them.
+        if self.dirty:
+            self.rebuild()
+        if type(entry) == ListType:
+            if is_holder(entry):
+                node = self.objects.get(id(entry[0]))
+            else:
+                node = self.nodes.get(id(entry))
+        else:
+            node = self.objects.get(id(entry))
+        return node
+
+    def Locate(self, entry):
+        # Return the branch containing ENTRY and the position of ENTRY
+        # in that branch as a tuple. Return (None, None) if ENTRY is
+        # not in the tree.
+        node = self.node(entry)
+        if node is None:
+            return None, None
+        return node.branch, self.position(node)
+
+    def Contains(self, entry):
+        return self.node(entry) is not None
+
+    def ParentBranch(self, entry):
+        # Return the list containing ENTRY or None. The parent branch
+        # of a series is the tree itself.
+        node = self.node(entry)
+        if node is not None:
+            return node.branch
+        return None
+
+    def Series(self, entry):
+        # Return the series, i.e. the top-level element of the tree,
+        # that contains ENTRY or None.
+        node = self.node(entry)
+        if node is None:
+            return None
+        while node.branch is not self.tree:
+            node = self.nodes[id(node.branch)]
+        return node.entry
+
+    def Siblings(self, entry):
+        # Return the entries of the branch containing ENTRY, ENTRY
+        # itself included.
+        node = self.node(entry)
+        if node is None:
+            return []
+        return node.branch[:]
+
+    def Children(self, branch):
+        # Return the entries of BRANCH, BRANCH may be the tree itself
+        if branch is not self.tree and self.node(branch) is None:
+            return []
+        return branch[:]
+
+    def Objects(self, branch = None):
+        # Return the objects in BRANCH (default: the whole tree) in
+        # depth first order, i.e. the order in which the clones were
+        # created.
+        if branch is None:
+            branch = self.tree
+        return tree_objects(branch)
+
+    def Replace(self, object, new_object):
+        # Put NEW_OBJECT into the place of OBJECT. The holder of OBJECT
+        # is replaced by a new holder because the old one may be shared
+        # with copies of the tree kept for undo. Return the branch and
+        # the position of the new holder or (None, None).
+        node = self.node(object)
+        if node is None:
+            return None, None
+        holder = [new_object]
+        branch = node.branch
+        index = self.position(node)
+        branch[index] = holder
+        self.unindex_entry(node.entry)
+        self.nodes[id(holder)] = self.objects[id(new_object)] \
+                                 = CloneNode(holder, branch, index)
+        return branch, index
+
+    def Path(self, entry):
+        # Return the positions leading from the tree to ENTRY as a
+        # list, i.e. ENTRY is tree[path[0]][path[1]]... Return None if
+        # ENTRY is not in the tree. Unlike the lists themselves paths
+        # stay valid when the tree is restored from a TreeSnapshot.
+        node = self.node(entry)
+        if node is None:
+            return None
+        path = []
+        while 1:
+            path.append(self.position(node))
+            if node.branch is self.tree:
+                break
+            node = self.nodes[id(node.branch)]
+        path.reverse()
+        return path
+
+    def Insert(self, branch, index, entry):
+        # Insert ENTRY (a holder or a sub-branch) into BRANCH at
+        # position INDEX.
+        if self.dirty:
+            self.rebuild()
+        if index < 0:
+            index = max(0, len(branch) + index)
+        index = min(index, len(branch))
+        branch.insert(index, entry)
+        node = self.nodes[id(entry)] = CloneNode(entry, branch, index)
+        if is_holder(entry):
+            self.objects[id(entry[0])] = node
+        else:
+            self.index_branch(entry)
+
+    def Remove(self, entry):
+        # Remove ENTRY (an object, holder or sub-branch) from the
+        # tree. Return the branch and the position it was removed from
+        # or (None, None) if it wasn't found.
+        node = self.node(entry)
+        if node is None:
+            return None, None
+        branch = node.branch
+        index = self.position(node)
+        del branch[index]
+        self.unindex_entry(node.entry)
+        return branch, index
+
+    def Prune(self):
+        # Remove empty branches. Return the number of lists removed.
+        if self.dirty:
+            self.rebuild()
+        removed = []
+        prune_empty_branches(self.tree, removed)
+        for entry in removed:
+            self.unindex_entry(entry)
+        return len(removed)
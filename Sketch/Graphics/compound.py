@@ -31,6 +31,7 @@ from Sketch import NullUndo, CreateListUndo, Undo
 from base import GraphicsObject, Bounded, CHANGED
 from blend import Blend, MismatchError
 from properties import EmptyProperties
+from spatialindex import BuildIndex
 
 from selinfo import prepend_idx, select_range, build_info, list_to_tree2, \
      list_to_tree_sliced
@@ -264,10 +265,18 @@ class Compound(GraphicsObject):
 	undo = self.ForAllUndo(func)
 	return undo
 
+    def candidates(self, rect):
+	# Return the indices of the children whose bounding rects may
+	# overlap RECT in ascending order. Here these are simply all
+	# children. EditableCompound uses a spatial index.
+	return range(len(self.objects))
+
     def Hit(self, p, rect, device):
 	test = rect.overlaps
 	objects = self.objects
-	for obj_idx in range(len(objects) - 1, -1, -1):
+	idxs = self.candidates(rect)
+	idxs.reverse()
+	for obj_idx in idxs:
 	    obj = objects[obj_idx]
 	    if test(obj.bounding_rect):
 		if obj.Hit(p, rect, device):
@@ -286,15 +295,23 @@ class Compound(GraphicsObject):
     def DrawShape(self, device, rect = None):
 	if rect:
 	    test = rect.overlaps
-	    for o in self.objects:
-		if test(o.bounding_rect):
-		    o.DrawShape(device, rect)
+	    objects = self.objects
+	    # objects smaller than this are drawn with less detail
+	    small = device.lod_size
+	    for idx in self.candidates(rect):
+		o = objects[idx]
+		r = o.bounding_rect
+		if test(r):
+		    if r.right - r.left < small and r.top - r.bottom < small:
+			device.DrawSmallObject(o)
+		    else:
+			o.DrawShape(device, rect)
 	else:
 	    for obj in self.objects:
 		obj.DrawShape(device)
 
     def PickObject(self, point, rect, device):
-	objects = self.objects[:]
+	objects = map(self.objects.__getitem__, self.candidates(rect))
 	objects.reverse()
 	test = rect.overlaps
 	for obj in objects:
@@ -347,6 +364,65 @@ class EditableCompound(Compound):
 
     allow_traversal = 1
 
+    # Compounds with at least this many children keep a spatial index
+    # (see spatialindex.py) of their children for candidates(). The
+    # index and the positions of the children are built on demand and
+    # kept up to date by the methods that modify self.objects. They
+    # are rebuilt when self.objects is replaced by another list or its
+    # length changes behind our back.
+    index_threshold = 200
+    spatial_index = None
+    indexed_objects = None
+    child_positions = None
+
+    def get_spatial_index(self):
+	objects = self.objects
+	index = self.spatial_index
+	if index is None or self.indexed_objects is not objects \
+	   or len(index) != len(objects):
+	    index = self.spatial_index = BuildIndex(objects)
+	    self.indexed_objects = objects
+	    self.child_positions = None
+	return index
+
+    def get_child_positions(self):
+	positions = self.child_positions
+	if positions is None or len(positions) != len(self.objects):
+	    positions = {}
+	    objects = self.objects
+	    for idx in range(len(objects)):
+		positions[id(objects[idx])] = idx
+	    self.child_positions = positions
+	return positions
+
+    def indexing(self):
+	# true if the index is in use and up to date with self.objects
+	return self.spatial_index is not None \
+	       and self.indexed_objects is self.objects
+
+    def candidates(self, rect):
+	objects = self.objects
+	if len(objects) < self.index_threshold:
+	    if self.spatial_index is not None:
+		self.spatial_index = self.child_positions = None
+	    return range(len(objects))
+	found = self.get_spatial_index().Query(rect)
+	if found is None:
+	    return range(len(objects))
+	positions = self.get_child_positions()
+	idxs = map(positions.get, map(id, found))
+	if None in idxs:
+	    # self.objects was modified without updating the index
+	    self.spatial_index = self.child_positions = None
+	    return range(len(objects))
+	idxs.sort()
+	return idxs
+
+    def ChildChanged(self, child):
+	if self.indexing():
+	    self.spatial_index.Update(child)
+	Compound.ChildChanged(self, child)
+
     def SelectSubobject(self, p, rect, device, path = None, *rest):
 	test = rect.overlaps
 	if path is None:
@@ -358,7 +434,9 @@ class EditableCompound(Compound):
 	    path_idx = -1
 	    path = None
 	objects = self.objects
-	for obj_idx in range(len(objects) - 1, -1, -1):
+	idxs = self.candidates(rect)
+	idxs.reverse()
+	for obj_idx in idxs:
 	    obj = objects[obj_idx]
 	    if test(obj.bounding_rect) and obj.Hit(p, rect, device):
 		if obj_idx == path_idx:
@@ -408,6 +486,7 @@ class EditableCompound(Compound):
 		    return (sel_info, undo_info)
 	    if type(at) != IntType or at > len(self.objects):
 		at = len(self.objects)
+	    appended = at == len(self.objects)
 	    if type(obj) == InstanceType:
 		self.objects.insert(at, obj)
 		obj.SetDocument(self.document)
@@ -415,6 +494,7 @@ class EditableCompound(Compound):
 		obj.Connect()
 		sel_info = build_info(at, obj)
 		undo_info = (self.Remove, obj, at)
+		inserted = [obj]
 	    else:
 		self.objects[at:at] = obj
 		for o in obj:
@@ -424,6 +504,8 @@ class EditableCompound(Compound):
 		    o.Connect()
 		sel_info = select_range(at, obj)
 		undo_info = (self.RemoveSlice, at, at + len(obj))
+		inserted = obj
+	    self.index_inserted(inserted, at, appended)
 	    self._changed()
 	    return (sel_info, undo_info)
 	except:
@@ -435,9 +517,40 @@ class EditableCompound(Compound):
 	# The same as the Insert method but return only the undo info.
 	return self.Insert(obj, at)[1]
 
+    def index_inserted(self, objects, at, appended):
+	# update the index after OBJECTS were inserted at position AT
+	if self.indexing():
+	    for obj in objects:
+		self.spatial_index.Add(obj)
+	    if appended and self.child_positions is not None:
+		positions = self.child_positions
+		for obj in objects:
+		    positions[id(obj)] = at
+		    at = at + 1
+	    else:
+		self.child_positions = None
+
+    def index_removed(self, objects):
+	if self.indexing():
+	    for obj in objects:
+		self.spatial_index.Remove(obj)
+	    self.child_positions = None
+
+    def index_replaced(self, child, object, idx):
+	if self.indexing():
+	    self.spatial_index.Remove(child)
+	    self.spatial_index.Add(object)
+	    positions = self.child_positions
+	    if positions is not None and positions.has_key(id(child)):
+		del positions[id(child)]
+		positions[id(object)] = idx
+	    else:
+		self.child_positions = None
+
     def do_remove_child(self, idx):
 	obj = self.objects[idx]
 	del self.objects[idx]
+	self.index_removed([obj])
 	obj.Disconnect()
 	obj.SetParent(None)
 	self._changed()
@@ -458,6 +571,7 @@ class EditableCompound(Compound):
     def RemoveSlice(self, min, max):
 	objs = self.objects[min:max]
 	self.objects[min:max] = []
+	self.index_removed(objs)
 	for obj in objs:
 	    obj.Disconnect()
 	    obj.SetParent(None)
@@ -488,12 +602,36 @@ class EditableCompound(Compound):
 	# replace self's child child with object. Return undo info
 	idx = self.objects.index(child)
 	self.objects[idx] = object
+	self.index_replaced(child, object, idx)
 	object.SetParent(self)
 	object.SetDocument(self.document)
 	child.SetParent(None)
 	self._changed()
 	return (self.ReplaceChild, object, child)
 
+    def ReplaceChildren(self, replacements):
+	# Replace several children at once. REPLACEMENTS maps the ids of
+	# children to the objects that take their places. This is much
+	# cheaper than a Remove/Insert pair per child. Return undo info.
+	objects = self.objects
+	undo = {}
+	for idx in range(len(objects)):
+	    child = objects[idx]
+	    object = replacements.get(id(child))
+	    if object is not None:
+		objects[idx] = object
+		self.index_replaced(child, object, idx)
+		child.Disconnect()
+		child.SetParent(None)
+		object.SetDocument(self.document)
+		object.SetParent(self)
+		object.Connect()
+		undo[id(object)] = child
+	if not undo:
+	    return NullUndo
+	self._changed()
+	return (self.ReplaceChildren, undo)
+
     def permute_objects(self, permutation):
 	# permutation must be a list of ints and len(permutation) must be
 	# equal to len(self.objects). permutation[i] is the index of the
@@ -509,7 +647,12 @@ class EditableCompound(Compound):
 	result = map(operator.getitem, [objects] * length, permutation)
 	inverse = [0] * length
 	map(operator.setitem, [inverse] * length, permutation, identity)
+	indexing = self.indexing()
 	self.objects = result
+	if indexing:
+	    # same objects, only the order changed
+	    self.indexed_objects = result
+	    self.child_positions = None
 	self._changed()
 	return (self.permute_objects, inverse)
 
@@ -0,0 +1,69 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307	USA
+
+#
+#	Damaged Regions
+#
+# The document collects the areas that have to be redrawn in a list of
+# rectangles during a transaction (EditDocument.AddClearRect). Bulk
+# operations add one rectangle per object. coalesce_rects merges them
+# before they are sent to the views with the REDRAW message.
+#
+
+from types import TupleType
+
+from Sketch import UnionRects, EmptyRect, InfinityRect
+
+
+def coalesce_rects(rects, max_rects):
+    # Merge overlapping rectangles in RECTS. If more than MAX_RECTS
+    # rectangles are left, they are replaced by their union. Return
+    # the new list or None if the whole drawing has to be redrawn
+    # (RECTS contains InfinityRect).
+    #
+    # RECTS may also contain the tuples used for guide lines. They are
+    # passed through unchanged.
+    merged = []
+    others = []
+    collapsed = 0
+    for rect in rects:
+	if type(rect) == TupleType:
+	    others.append(rect)
+	    continue
+	if rect is EmptyRect:
+	    continue
+	if rect is InfinityRect:
+	    return None
+	if collapsed:
+	    merged[0] = UnionRects(merged[0], rect)
+	    continue
+	# merge rect with every rectangle it overlaps. The union may
+	# overlap rectangles it didn't overlap before, so start over
+	# until nothing changes
+	idx = 0
+	while idx < len(merged):
+	    if rect.overlaps(merged[idx]):
+		rect = UnionRects(rect, merged[idx])
+		del merged[idx]
+		idx = 0
+	    else:
+		idx = idx + 1
+	merged.append(rect)
+	if len(merged) > max_rects:
+	    # from now on merged[0] collects all rects
+	    merged = [reduce(UnionRects, merged)]
+	    collapsed = 1
+    return merged + others
@@ -46,7 +46,7 @@ from Sketch.connector import Issue, RemovePublisher, Connect, Disconnect, \
      QueueingPublisher, Connector
 from Sketch.undodict import UndoDict
 
-from Sketch import Rect, Point, UnionRects, InfinityRect, Trafo
+from Sketch import Rect, Point, UnionRects, InfinityRect, EmptyRect, Trafo
 from Sketch import UndoRedo, Undo, CreateListUndo, NullUndo, UndoAfter
 
 import color, selinfo, pagelayout
@@ -73,7 +73,11 @@ from text import CanCreatePathText, CreatePathText
 from Sketch.Graphics.ellipse import Ellipse
 from Sketch.Graphics.rectangle import Rectangle
 from Sketch.Graphics.bezier import PolyBezier
-from clone import Clone
+from clone import Clone, has_clones
+from clonegraph import CloneGraph, prune_empty_branches, encode_tree, \
+     decode_tree, tree_objects, snapshot_tree, restore_tree
+from damage import coalesce_rects
+import weakref
 from Sketch.Graphics.arrow import Arrow
 from Sketch import CreateRGBColor
 import os
@@ -271,8 +275,22 @@ class SketchDocument(Protocols):
 	self.write_styles(file)
 	for layer in self.layers:
 	    layer.SaveToFile(file)
+	self.save_clone_trees(file)
 	file.EndDocument()
 
+    def MaterializeLayers(self, filename = None):
+	# Read the objects of the layers that still keep them in the
+	# file the document was loaded from (see Layer.load_SetSource).
+	# If FILENAME is given, only those of the layers reading from
+	# that file.
+	for layer in self.layers:
+	    if filename is None or layer.ReadsFrom(filename):
+		layer.Materialize()
+
+    def save_clone_trees(self, file):
+	# Only EditDocument keeps track of clones
+	pass
+
     def load_AppendObject(self, layer):
 	self.layers.append(layer)
 
@@ -325,6 +343,9 @@ class EditDocument(SketchDocument, QueueingPublisher):
 			    # object
     script_access = SketchDocument.script_access.copy()
 
+    # there is only one guide layer, the receivers just reread it
+    latest_only = (GUIDE_LINES,)
+
     main_window = None #is set in main_window (added by shumon)
 
     
@@ -372,6 +393,7 @@ class EditDocument(SketchDocument, QueueingPublisher):
         self.init_styles()
         self.init_after_handler()
         self.init_layout()
+        self.clone_graphs = {}
 
                 
 
@@ -475,11 +497,17 @@ class EditDocument(SketchDocument, QueueingPublisher):
 	return (self.view_redraw_all,)
 
     def issue_redraw(self):
+	# the rects collected during the transaction are merged first. If
+	# that isn't possible everything is redrawn
 	try:
-	    if self.clear_all:
+	    rects = None
+	    if not self.clear_all:
+		rects = coalesce_rects(self.clear_rects,
+				       config.preferences.damage_max_rects)
+	    if rects is None:
 		Issue(self, REDRAW, 1)
 	    else:
-		Issue(self, REDRAW, 0, self.clear_rects)
+		Issue(self, REDRAW, 0, rects)
 	finally:
 	    self.clear_rects = []
 	    self.clear_all = 0
@@ -1010,6 +1038,7 @@ class EditDocument(SketchDocument, QueueingPublisher):
 		if mode == SelectionMode:
 		    self.selection = SizeSelection(self.selection)
 		else:
+		    self.materialize_selected_clone()
 		    self.selection = EditSelection(self.selection)
 	    except:
 		self.abort_transaction()
@@ -1848,6 +1877,7 @@ class EditDocument(SketchDocument, QueueingPublisher):
 	    try:
 		if (self.was_dragged and  not( state == self.state1 or state == self.state2)) or self.main_window.application.technique == 'e' :
                     #print "i came here"
+		    self.preserve_clone_originals()
 		    undo_text, undo_edit \
 			       = self.selection.ButtonUp(p, button, state)
 		    if undo_edit is not None and undo_edit != NullUndo:
@@ -1858,6 +1888,10 @@ class EditDocument(SketchDocument, QueueingPublisher):
 			self.add_undo(self.queue_edited())
                         #add condition here how to call this shit up                                                
                         self.EditClones()
+                        if self.transaction_name != _("Move Objects"):
+                            #clones stay where they are when their
+                            #original is moved
+                            self.detach_clones()
                         #duplication
                         self.__get_new_dupe_offset() #Added Nov 13 ,2009
                         self.dupe_x = self.dupe_y = None
@@ -1874,6 +1908,7 @@ class EditDocument(SketchDocument, QueueingPublisher):
 	    except:
 		self.abort_transaction()
 	finally:
+	    self.clone_originals = self.followed_clones = None
 	    self.end_transaction()
         if  self.is_drag_creating:#state == self.state1 or state == self.state2 or state == 256: 
             if self.last_clone_obj != 0:
@@ -2004,6 +2039,7 @@ class EditDocument(SketchDocument, QueueingPublisher):
             try:
                 #we can improve this by adding undo later                
                 coord_rect = Rect(sel_obj.coord_rect[0],sel_obj.coord_rect[1], sel_obj.coord_rect[2], sel_obj.coord_rect[3])
+                old_rect = sel_obj.bounding_rect
                 
                 #center = Point((coord_rect[2]-coord_rect[0])/2, (coord_rect[3]-coord_rect[1])/2)
                 
@@ -2024,7 +2060,8 @@ class EditDocument(SketchDocument, QueueingPublisher):
                 #sel_obj.Translate(Point(center.x,center.y))
                 
                 self.add_undo(self.queue_edited())                                                
-                self.add_undo(self.view_redraw_all())       #we can use this function probably to solve bugs with arrow drawing
+                #the arrows are taken care of by the caller
+                self.add_undo(self.AddClearRect(UnionRects(old_rect, sel_obj.bounding_rect)))
             except:
                 #self.abort_transaction()
                 "bla"
@@ -2141,48 +2178,30 @@ class EditDocument(SketchDocument, QueueingPublisher):
             
             #replace the object with selection before screwing with it
             self.TransformClone(seq[i], scale_to_sel_obj_x*scale_x,scale_to_sel_obj_y*scale_y)            
+        #the arrows between the resized clones
+        self.add_undo(self.add_clone_tree_clear_rect(map(lambda h: h[0], seq)))
 
     def getInterpolationSequence(self, object):
-        self.clear_parent_array_data()
-        self.FindParentArray(self.clones, object)        #self.clones
-        old_parent = None       
-        
-        if  self.parent_array == None or self.parent_array == []:
+        # return the holders preceding object on the way up to the
+        # series it belongs to, nearest first
+        graph = self.clone_graph()
+        branch, index = graph.Locate(object)
+        if branch is None:
             return None
-        index = self.parent_array.index(object)
-        
+
         out  = []
-        #out.append([self.selection.GetObjects()[0]]) #adding first object (we wont need this)
-        for i in range(index-1,-1, -1):
-            obj = self.parent_array[i]
-            if type(obj) == type([]) and type(obj[0]) != type([]):            
-                out.append(self.parent_array[i])
-        #-----------------
-        while self.parent_array != self.clones:
-            old_parent = self.parent_array
-            self.clear_parent_array_data()
-            self.FindParentArray(self.clones, old_parent)
-            index = self.parent_array.index(old_parent)
+        while branch is not None and branch is not self.clones:
             for i in range(index-1,-1, -1):
-                obj = self.parent_array[i]
-                if type(obj) == type([]) and type(obj[0]) != type([]):            
-                    out.append(self.parent_array[i])
+                obj = branch[i]
+                if type(obj) == type([]) and type(obj[0]) != type([]):
+                    out.append(obj)
+            branch, index = graph.Locate(branch)
         return out
     
     #modified this on dec 25,2008 to generalize it for use with unlink all clones
     def find_original_ancenstor_array(self, array, object):
-        #setup code
-        self.clear_parent_array_data()
-        self.FindParentArray(array, object)        
-        old_parent = None
-        #-----------------
-
-        while self.parent_array != array[0]:
-            old_parent = self.parent_array
-            self.clear_parent_array_data()
-            self.FindParentArray(array, old_parent)        
-        #edit
-        return old_parent
+        #array is a list containing the clone tree, e.g. [self.clones]
+        return self.clone_graph(array[0]).Series(object)
     
     
     def edit_all(self, object, func, arg):
@@ -2428,74 +2447,117 @@ class EditDocument(SketchDocument, QueueingPublisher):
         
         undo = self.replace_object_in_clone_tree, [new_object], object[0]
         self.clear_parent_array_data()
-        self.FindParentArray(self.clones, object)
-        #self.find_parent(self.clones, self.clones,  object)
-        if self.parent_array == None:
-            print "Could not replace object in clone tree!!!"
-            return NullUndo
-        
         #do the swapping
-        index = self.index_of_object_in_the_parent_array
-        self.parent_array[index] = [new_object]
+        branch, index = self.clone_graph().Replace(object[0], new_object)
+        if branch is None:
+            warn(INTERNAL, 'object %s not in the clone tree', object[0])
+            return NullUndo
+        self.parent_array = branch
+        self.index_of_object_in_the_parent_array = index
                 
         return undo
     
+    def replace_objects_in_clone_tree(self, replacements):
+        #batch version of replace_object_in_clone_tree. replacements is a
+        #list of (object, new_object) pairs. the objects may be in
+        #self.clones or in self.tile_clones
+        graphs = (self.clone_graph(), self.clone_graph(self.tile_clones))
+        done = []
+        for object, new_object in replacements:
+            for graph in graphs:
+                branch, index = graph.Replace(object, new_object)
+                if branch is not None:
+                    done.append((new_object, object))
+                    break
+        return (self.replace_objects_in_clone_tree, done)
+
+    pending_clone_edits = None
+
+    #the clones that follow the current edit of their original while
+    #detach_clones is pending (see preserve_clone_originals)
+    followed_clones = None
+
     def edit_object(self, pObj, selection):        
+        #compute the replacement for the clone in holder pObj. inside
+        #batch_clone_edits the replacements are only collected and
+        #swapped in all at once afterwards
         object = pObj[0]
+        if object is selection:
+            return
+        if object.is_Clone and object.Original() is selection:
+            #clones of the edited object share its geometry already
+            if self.followed_clones is not None:
+                self.followed_clones[id(object)] = 1
+            return
         offset = Point (object.coord_rect[0]-selection.coord_rect[0], object.coord_rect[1]-selection.coord_rect[1])
-        #self.SelectObject(object)
-       #the following few lines are a copy of SelectObject method, but without being wrapped into a transaction, since we are in the transaction already 
-        self.select_object(object)
-        #print "selected object = ",  object
-        #print "selected selection",  selection
-        self.add_undo(self.remove_selected())  
-        newobj = selection.Duplicate()
-        #update clones databse
-        #object = newobj
-        self.add_undo(self.replace_object_in_clone_tree(pObj, newobj))
-        pObj[0] = newobj
-        #print "pObj2 = ",  pObj
-        newobj.Translate(offset)                                  
-        select, undo_insert = self.insert(newobj)
-        self.add_undo(undo_insert)
-        #self.__set_selection(select, SelectSet)
-        self.__set_selection(None, SelectSet)
-        self.add_undo(self.queue_edited())                                                
-        self.add_undo(self.view_redraw_all())  
-        
-####### 
-        '''       
-        self.copy_tree(clone_tree_copy,self.clones)
-        self.clear_parent_array_data()
-        self.find_parent(clone_tree_copy, clone_tree_copy,  object)        
-        if self.parent_array == None:
-            print "Something bad happened! Search me to see!"
+        newobj = self.clone_instance(selection)
+        newobj.Translate(offset)
+        if newobj.is_Clone and self.followed_clones is not None:
+            self.followed_clones[id(newobj)] = 1
+        if self.pending_clone_edits is None:
+            self.apply_clone_edits([(object, newobj)])
+        else:
+            self.pending_clone_edits.append((object, newobj))
+
+    def batch_clone_edits(self, method, *args):
+        #run method (edit_all or edit_from) and apply the replacements
+        #computed by edit_object in one go
+        self.pending_clone_edits = []
+        try:
+            apply(method, args)
+            edits = self.pending_clone_edits
+        finally:
+            self.pending_clone_edits = None
+        self.apply_clone_edits(edits)
+
+    def apply_clone_edits(self, edits):
+        #swap the (object, new_object) pairs in edits into the layers,
+        #one ReplaceChildren call per parent, and into the clone tree.
+        #objects keep their stacking order and the selection stays
+        #valid. the damaged area is added as a single clear rect
+        by_parent = {}
+        applied = []
+        rects = []
+        for object, new_object in edits:
+            parent = object.parent
+            if parent is None:
+                continue
+            if not by_parent.has_key(id(parent)):
+                by_parent[id(parent)] = (parent, {})
+            by_parent[id(parent)][1][id(object)] = new_object
+            applied.append((object, new_object))
+            rects.append(object.bounding_rect)
+        if not applied:
             return
-        we are not going to remove shit here. it has to be replaced properly.
-        self.parent_array.remove(pObj)
-               #delete empty list
-        self.remove_empty_list(clone_tree_copy, clone_tree_copy)
-        self.add_undo(self.view_redraw_all())
-        self.add_undo(self.set_clone_tree([clone_tree_copy]))
-        '''
-        
-        
-        
-  
+        undo = []
+        try:
+            for parent, replacements in by_parent.values():
+                undo.append(parent.ReplaceChildren(replacements))
+            undo.append(self.replace_objects_in_clone_tree(applied))
+        except:
+            Undo(CreateListUndo(undo))
+            raise
+        for object, new_object in applied:
+            rects.append(new_object.bounding_rect)
+        self.add_undo(CreateListUndo(undo))
+        self.add_undo(self.AddClearRect(reduce(UnionRects, rects)))
+        self.add_undo(self.queue_edited())
     
     skip = 0
     current_edit = 0
     
     def edit_all_in_sublist(self, target,obj, func, arg):
         temp = self.current_edit
-        for item in target:
+        for position in range(len(target)):
+           item = target[position]
            if isinstance(item[0], list):    # is item a polygon?               
                #if func == "draw_errors":
                #add previous which is not a list (roll back if necessary)               
                object = item               
+               index = position
                while isinstance(object[0], list):
-                    index = target.index(object)
-                    object = target[index-1]
+                    index = index - 1
+                    object = target[index]
                 
                self.arrow_stack.append(object)     
                
@@ -2601,15 +2663,16 @@ class EditDocument(SketchDocument, QueueingPublisher):
         self.current_edit = temp
 
     def edit_from(self, start,array,obj, func, arg):        
-        if start >= len(array) or start < 0 :
+        #loops instead of recursing for every entry, a branch can hold
+        #more clones than the recursion limit allows
+        if start < 0:
             return
-        else:
+        for start in range(start, len(array)):
             if not (isinstance (array[start][0],list)):
                 #self.edit_object(array[start], obj)  
                 
                 #the following is just a cope of EDIT_OBJECT method
                 #i did not bother to make it work without code duplication.
-                print "func=", func
                 if func != None: #filling color
                         if self.skip != 0 and self.current_edit % self.skip == 0:
                             "do nothing here"
@@ -2623,36 +2686,10 @@ class EditDocument(SketchDocument, QueueingPublisher):
                         #we skip
                         "do nothing here"
                     else:
-                        
-                        #print "arraybefore=",array[start]
                         self.edit_object(array[start],obj)
-                        #print "arrayafter=",array[start]
-                        #print "obj2=",object
-                        
-                        '''
-                        object = array[start][0]
-                        selection = obj
-                        offset = Point (object.coord_rect[0]-selection.coord_rect[0], object.coord_rect[1]-selection.coord_rect[1])
-                        self.select_object(object)
-                        self.add_undo(self.remove_selected())  
-                        newobj = selection.Duplicate()
-                        #update clones databse
-                        #object = newobj
-                        array[start][0] = newobj                
-                        newobj.Translate(offset)                                  
-                        select, undo_insert = self.insert(newobj)
-                        self.add_undo(undo_insert)
-                        #self.__set_selection(select, SelectSet)
-                        self.__set_selection(None, SelectSet)
-                        self.add_undo(self.queue_edited())                                                
-                        self.add_undo(self.view_redraw_all()) 
-                        '''    
                     self.current_edit+=1
-                
-                self.edit_from(start+1,array,obj, func, arg)
             else:
                 self.edit_all_in_sublist(array[start],obj, func, arg)
-                self.edit_from(start+1,array,obj, func, arg)
     
     parent_array = None
     index_of_object_in_the_parent_array = None
@@ -2665,7 +2702,15 @@ class EditDocument(SketchDocument, QueueingPublisher):
     def EditClones(self, func = None, arg = None  ): #func can be fill_solid from canvas, and col is its argument
         #if it's MOVE OBJECTS... then we ignore this for now
         if self.transaction_name == _("Move Objects"):
-            self.add_undo(self.view_redraw_all()) #this is to prevent undo arrow screw ups, not the best place to put it but it works
+            #the arrows of the series follow the moved object. the
+            #transaction redraws the old position
+            rect = self.transaction_clear
+            if rect is None:
+                rect = EmptyRect
+            obj = self.selection.GetObjects()[0]
+            series = self.clone_graph().Series(obj)
+            if series is not None:
+                self.add_undo(self.add_clone_tree_clear_rect(tree_objects(series), rect))
             return        
         obj = self.selection.GetObjects()[0]       
         
@@ -2738,11 +2783,16 @@ class EditDocument(SketchDocument, QueueingPublisher):
             self.main_window.total_call_editing_cancel_presses+=1
             return
         
+        if func != None and func != self.unlink_clone:
+            #func changes properties. the original's properties are
+            #shared by its clones without properties of their own
+            self.pin_clone_properties(obj)
+        
         if result == self.AllTheObjects :           
            #self.edit_all_in_sublist(self.parent_array, obj) #not correct yet
            string = 'clone_editing_all_pressed'
            self.log(string)
-           self.edit_all(obj, func, arg)
+           self.batch_clone_edits(self.edit_all, obj, func, arg)
            self.main_window.total_clone_editing_all_presses+=1
         
         elif result == self.AllTheFollowing or result == self.AllTheFollowingSkippingOne:   
@@ -2759,7 +2809,7 @@ class EditDocument(SketchDocument, QueueingPublisher):
                 self.log(string)
                 self.main_window.total_clone_editing_all_following_presses +=1
             
-            self.edit_from(self.index_of_object_in_the_parent_array, self.parent_array, obj, func, arg)
+            self.batch_clone_edits(self.edit_from, self.index_of_object_in_the_parent_array, self.parent_array, obj, func, arg)
             
         else: #result is only this object
             #color single object i suppose
@@ -2777,70 +2827,105 @@ class EditDocument(SketchDocument, QueueingPublisher):
 
 
     
+    def clone_graph(self, tree = None):
+        #return the CloneGraph indexing tree (default: self.clones).
+        #graphs are cached per tree, graphs of trees that are neither
+        #self.clones nor self.tile_clones are dropped when a new one
+        #is built
+        if tree is None:
+            tree = self.clones
+        graph = self.clone_graphs.get(id(tree))
+        if graph is None or graph.tree is not tree:
+            keep = {}
+            for key in (id(self.clones), id(self.tile_clones)):
+                if self.clone_graphs.has_key(key):
+                    keep[key] = self.clone_graphs[key]
+            graph = keep[id(tree)] = CloneGraph(tree)
+            self.clone_graphs = keep
+        return graph
+
     def FindParentArray(self,  array, object):
-        for i in range (len(array)):
-            this = array[i]
-            if this == object:
-                self.parent_array = array
-                self.index_of_object_in_the_parent_array = array.index(object)
-                #print "parent =",array
-                #print "index =", array.index(object)	
-                return
-            elif isinstance(this, type([])):                
-                self.FindParentArray(this, object)    
+        #object may be a clone, its holder [clone] or a sub-branch
+        branch, index = self.clone_graph(array).Locate(object)
+        if branch is not None:
+            self.parent_array = branch
+            self.index_of_object_in_the_parent_array = index
     
     
     
     def find_parent(self, target,parent,obj):
-       for item in target:
-           if isinstance(item[0], list):                 # is item a polygon?
-               self.find_parent(item,item,obj)              # Recursive version
-           else:           
-               length = len(item)
-               for i in range(length):
-                if obj == item[i]:
-                    #print "found item =",item[i]
-                    #print "parent = ", parent        
-                    #print "index = ",parent.index([item[i]])
-                    self.parent_array = parent
-                    self.index_of_object_in_the_parent_array  = parent.index([item[i]])
+        branch, index = self.clone_graph(target).Locate(obj)
+        if branch is not None:
+            self.parent_array = branch
+            self.index_of_object_in_the_parent_array = index
 
     def DeleteClone(self, object):
-        #preserve clone tree copy for undo
-        clone_tree_copy = []
-        for i in self.clones:
-            clone_tree_copy.append(i[:])
-        
-        self.add_undo(self.set_clone_tree([clone_tree_copy]))
-        
-        print "clones before deletion", self.clones
-        self.delete_clone(self.clones, self.clones, object)
-        self.remove_empty_list(self.clones, self.clones)
-        
-        
-        print "clones after deletion=", self.clones
+        #remove the holder of object from self.clones and the branches
+        #that become empty by that. the undo info puts them back, so
+        #neither the tree nor its index are rebuilt
+        graph = self.clone_graph()
+        entry = object
+        while 1:
+            path = graph.Path(entry)
+            if path is None:
+                break
+            branch = graph.ParentBranch(entry)
+            self.add_undo(self.remove_clone_entry('clones', path))
+            if branch or branch is self.clones:
+                break
+            entry = branch
+
+    def clone_entry_at(self, which, path):
+        #return the branch and the entry at path (see CloneGraph.Path)
+        #in the clone tree self.<which>
+        branch = getattr(self, which)
+        for index in path[:-1]:
+            branch = branch[index]
+        return branch, branch[path[-1]]
+
+    def add_clone_entry_clear_rect(self, branch, index):
+        #redraw the objects of the entry at index in branch and the
+        #arrows between it and its neighbours
+        objects = tree_objects([branch[index]])
+        for idx in (index - 1, index + 1):
+            if 0 <= idx < len(branch):
+                entry = branch[idx]
+                while entry and type(entry[0]) == type([]):
+                    entry = entry[0]
+                if entry:
+                    objects.append(entry[0])
+        self.add_clone_tree_clear_rect(objects)
+
+    def insert_clone_entry(self, which, path, entry):
+        #insert entry (a holder or a branch) into the clone tree
+        #self.<which> (clones or tile_clones) at path. the tree is
+        #addressed by its name and the entries by their paths because
+        #set_clone_tree replaces the lists when it restores a snapshot.
+        #return the undo info
+        tree = getattr(self, which)
+        branch = tree
+        for index in path[:-1]:
+            branch = branch[index]
+        self.clone_graph(tree).Insert(branch, path[-1], entry)
+        self.add_clone_entry_clear_rect(branch, path[-1])
+        return (self.remove_clone_entry, which, path)
+
+    def remove_clone_entry(self, which, path):
+        #remove the entry at path from the clone tree self.<which>.
+        #return the undo info
+        branch, entry = self.clone_entry_at(which, path)
+        self.add_clone_entry_clear_rect(branch, path[-1])
+        self.clone_graph(getattr(self, which)).Remove(entry)
+        return (self.insert_clone_entry, which, path, entry)
     
-    def remove_empty_list(self,L,original):
-        for item in L:
-            if item == []:
-                L.remove(item)
-		self.remove_empty_list(original,original)
-		return
-            elif isinstance(item[0],list):
-                self.remove_empty_list(item,original)
+    def remove_empty_list(self,L,original = None):
+        if self.clone_graphs.has_key(id(L)):
+            self.clone_graph(L).Prune()
+        else:
+            prune_empty_branches(L)
     
     def delete_clone(self, target,parent,obj):       
-       for item in target:
-           if isinstance(item[0], list): 		        # is item a polygon?
-               self.delete_clone(item,item,obj)  	        # Recursive version
-           else:           
-               length = len(item)
-               for i in range(length):
-                if obj == item[i]:
-                    parent.remove([obj])
-
-    
-
+        self.clone_graph(target).Remove(obj)
 
     
     '''def find(self, L,parent,object):    
@@ -2862,6 +2947,49 @@ class EditDocument(SketchDocument, QueueingPublisher):
     
    
 
+    def numbered_objects(self):
+        #the top-level objects of all layers in the order they are saved.
+        #clone trees refer to objects by their index in this list
+        objects = []
+        for layer in self.layers:
+            objects = objects + layer.GetObjects()
+        return objects
+
+    def save_clone_trees(self, file):
+        #write self.clones and self.tile_clones with the saver's
+        #CloneTree method. savers for foreign formats don't have one
+        if not hasattr(file, 'CloneTree'):
+            return
+        if not self.clones and not self.tile_clones:
+            return
+        numbers = {}
+        objects = self.numbered_objects()
+        for idx in range(len(objects)):
+            numbers[id(objects[idx])] = idx
+        for which, tree in ((0, self.clones), (1, self.tile_clones)):
+            if tree:
+                objects, parents = encode_tree(tree, numbers)
+                file.CloneTree(which, objects, parents)
+
+    def load_SetCloneTree(self, which, objects, parents):
+        #called by the loader after load_Completed. rebuilds the clone
+        #tree in one pass instead of replaying the clone creation
+        tree = decode_tree(objects, parents, self.numbered_objects())
+        if which == 0:
+            self.clones = tree
+        else:
+            self.tile_clones = tree
+
+    def add_clone_tree_clear_rect(self, objects, rect = EmptyRect):
+        #add the area covered by objects, the arrows drawn between them
+        #(see draw_arrows) and rect to the damaged region. return the
+        #undo info of AddClearRect
+        rects = map(lambda o: o.bounding_rect, objects)
+        if rects:
+            margin = self.arrow_length + self.arrow_width
+            rect = UnionRects(rect, reduce(UnionRects, rects).grown(margin))
+        return self.AddClearRect(rect)
+
     def copy_tree(self,new,old):
         for i in old:
             temp = []
@@ -2875,6 +3003,87 @@ class EditDocument(SketchDocument, QueueingPublisher):
                     #print "temp not empty"
                     new.append(temp)    
     
+    def clone_instance(self, object):
+        #return a new clone of object for the cloning tools. primitives
+        #get a Clone that shares the geometry of object (or of its
+        #original if object is a Clone itself), other objects are
+        #duplicated
+        if object.is_Primitive:
+            return Clone(object)
+        return object.Duplicate()
+
+    def clone_dependents(self, object):
+        #return the clones in the clone tree that share the geometry of
+        #object
+        if not has_clones(object):
+            return []
+        result = []
+        for obj in tree_objects(self.clones):
+            if obj.is_Clone and obj.Original() is object:
+                result.append(obj)
+        return result
+
+    clone_originals = None
+
+    def preserve_clone_originals(self):
+        #keep copies of the selected objects that have clones before
+        #an edit changes them. the clones the user excludes from the
+        #edit in EditClones are turned into ordinary objects looking
+        #like these copies by detach_clones
+        originals = {}
+        for obj in self.selection.GetObjects():
+            if has_clones(obj):
+                originals[id(obj)] = (obj, obj.Duplicate())
+        self.clone_originals = originals
+        self.followed_clones = {}
+
+    def detach_clones(self):
+        #replace the clones of the objects kept by
+        #preserve_clone_originals that don't follow the edit by
+        #ordinary objects with the geometry from before the edit
+        originals = self.clone_originals
+        followed = self.followed_clones
+        self.clone_originals = self.followed_clones = None
+        if not originals:
+            return
+        edits = []
+        for object, copy in originals.values():
+            for clone in self.clone_dependents(object):
+                if not followed.has_key(id(clone)):
+                    edits.append((clone, clone.Materialize(copy)))
+        if edits:
+            self.apply_clone_edits(edits)
+
+    def pin_clone_properties(self, object):
+        #give the clones of object their own copy of its properties, so
+        #that property changes of object only reach the clones the
+        #user chooses in EditClones
+        clones = self.clone_dependents(object)
+        if not clones:
+            return
+        self.begin_transaction(_("Detach Clones"), clear_selection_rect = 0)
+        try:
+            try:
+                for clone in clones:
+                    self.add_undo(clone.PinProperties())
+            except:
+                self.abort_transaction()
+        finally:
+            self.end_transaction()
+
+    def materialize_selected_clone(self):
+        #a clone can't be edited on its own. turn the selected clone
+        #into an ordinary object that can
+        objects = self.selection.GetObjects()
+        if len(objects) != 1 or not objects[0].is_Clone:
+            return
+        clone = objects[0]
+        if not clone.Original().has_edit_mode:
+            return
+        newobj = clone.Materialize()
+        self.apply_clone_edits([(clone, newobj)])
+        self.select_object(newobj)
+
     def DragCreation(self):
      if True: #self.CanCreateClone() prevents from cloning groups... disabled for now 
         length = len(self.draglist)
@@ -2900,22 +3109,27 @@ class EditDocument(SketchDocument, QueueingPublisher):
                     #we need to merge with existing list of clones, if dragcreating from an exist clone
                     object = self.selection.GetObjects()[0]
                     new_array = []        
-                    #I am going through all this trouble with clone_tree_copy just for the undo to work
-                    clone_tree_copy = []
-                    self.copy_tree(clone_tree_copy,self.clones)
+                    #the new entries are put into self.clones through its
+                    #graph at the end. path is where new_array goes, None
+                    #if the entries are appended to the branch of object
+                    graph = self.clone_graph()
+                    path = None
                     self.clear_parent_array_data()
-                    self.find_parent(clone_tree_copy, clone_tree_copy,  object)   
+                    self.find_parent(self.clones, self.clones,  object)   
+                    branch = self.parent_array
                          
                     if self.parent_array == None:            
                         new_array.append([object]) #we need every object to be inside of array because of the way python is passing arguments into function
+                        path = [len(self.clones)]
                         print "appended to new"
                     else:
                         #if it already exists, we need to insert a new array after the object entry            
                         if self.index_of_object_in_the_parent_array == len(self.parent_array) - 1:
-                            new_array = self.parent_array
+                            new_array = branch[:]
                             print "appended to clones1"
                         else: 
-                            self.parent_array.insert(self.index_of_object_in_the_parent_array+1, new_array)    
+                            path = graph.Path(object)
+                            path[-1] = path[-1] + 1
                             print "appended to clones2"
 
                     off_rc = Point (0,0)
@@ -2935,7 +3149,7 @@ class EditDocument(SketchDocument, QueueingPublisher):
                         offset = self.draglist[i] - self.draglist[i-1]
                         obj = self.selection.GetObjects()[0]
                         
-                        newobj = obj.Duplicate()
+                        newobj = self.clone_instance(obj)
                         '''if i == 0 and j > 0:
                             offset=off_rc#+compound_offset)                
                         else:
@@ -2946,7 +3160,7 @@ class EditDocument(SketchDocument, QueueingPublisher):
                         self.add_undo(undo_insert)                
                         self.__set_selection(select, SelectSet)                        
                         new_array.append([newobj])       #new way
-                        self.add_undo(self.view_redraw_all())
+                        self.add_undo(self.AddClearRect(newobj.bounding_rect))
                     
                     
                     if len(self.grid_clones) > 1:
@@ -2965,15 +3179,15 @@ class EditDocument(SketchDocument, QueueingPublisher):
 
                                 obj = self.selection.GetObjects()[0]
                                 
-                                newobj = obj.Duplicate()
+                                newobj = self.clone_instance(obj)
                                 newobj.Translate(offset)
                                                      
                                 select, undo_insert = self.insert(newobj)
                                 self.add_undo(undo_insert)                
                                 self.__set_selection(select, SelectSet)                        
                                 line.append([newobj])       #new way
+                                self.add_undo(self.AddClearRect(newobj.bounding_rect))
                             list_of_lines.append(line)
-                            self.add_undo(self.view_redraw_all())                           
                         #now insert these things into the new_array
                         index = 1
                         size = len(list_of_lines)
@@ -2990,10 +3204,24 @@ class EditDocument(SketchDocument, QueueingPublisher):
                         for i in new_array: print i
                        
                     
-                    if self.parent_array == None:
-                        clone_tree_copy.append(new_array)                            
-                    self.drag_objects = new_array
-                    self.add_undo(self.set_clone_tree([clone_tree_copy]))  
+                    if path is not None:
+                        self.add_undo(self.insert_clone_entry('clones', path,
+                                                              new_array))
+                        self.drag_objects = new_array
+                    else:
+                        #new_array holds the entries of branch in the same
+                        #order with the new ones (and grid lines) between
+                        #them. insert each new one where it is in new_array
+                        if branch is self.clones:
+                            base = []
+                        else:
+                            base = graph.Path(branch)
+                        for idx in range(len(new_array)):
+                            if idx >= len(branch) \
+                               or branch[idx] is not new_array[idx]:
+                                self.add_undo(self.insert_clone_entry(
+                                    'clones', base + [idx], new_array[idx]))
+                        self.drag_objects = branch
             except:
                 self.abort_transaction()
         finally:
@@ -3005,17 +3233,18 @@ class EditDocument(SketchDocument, QueueingPublisher):
     def set_clone_tree(self, array):        
         #print "new_array:", old_array, "new_new_array", new_array
         
-        clone_tree_copy = []
-        #for i in self.clones:
-        #    clone_tree_copy.append(i[:])
-        self.copy_tree(clone_tree_copy, self.clones)        
-        
-        undo = self.set_clone_tree, [clone_tree_copy]
+        #the undo info holds a snapshot of the old tree which shares
+        #the unchanged branches with the other snapshots in the history
+        undo = self.set_clone_tree, [snapshot_tree(self.clones)]
         #print "BEFORE ARRAY=", self.clones
-        self.clones = array[0]
+        old_objects = tree_objects(self.clones)
+        self.clones = restore_tree(array[0])
+        #the new tree may have been modified since it was last looked at
+        self.clone_graph().Invalidate()
         
         #print "new_array:", old_array, "new_new_array", new_array        
-        self.view_redraw_all()
+        #redraw where the old and the new arrows are
+        self.add_clone_tree_clear_rect(old_objects + tree_objects(self.clones))
         
         #print "AFTER ARRAY=", self.clones
         return undo
@@ -3056,12 +3285,16 @@ class EditDocument(SketchDocument, QueueingPublisher):
         self.parent_array.remove([object])
                #delete empty list
         self.remove_empty_list(clone_tree_copy, clone_tree_copy)
-        self.add_undo(self.view_redraw_all())
           #  except:
            #     self.abort_transaction()
         #finally:
         self.add_undo(self.set_clone_tree([clone_tree_copy]))
          #   self.end_transaction()            
+        if object.is_Clone:
+            #an unlinked object must not share the geometry of the others
+            newobj = object.Materialize()
+            self.apply_clone_edits([(object, newobj)])
+            self.select_object(newobj)
         
         
     def CanUnlinkClone(self):
@@ -3087,7 +3320,6 @@ class EditDocument(SketchDocument, QueueingPublisher):
                 clone_tree_copy.remove(series)
                 #delete empty list (just in case)
                 self.remove_empty_list(clone_tree_copy, clone_tree_copy)
-                self.add_undo(self.view_redraw_all())
             except:
                 self.abort_transaction()
         finally:
@@ -3169,7 +3401,6 @@ class EditDocument(SketchDocument, QueueingPublisher):
                 self.remove_empty_list(clone_tree_copy, clone_tree_copy)
                 clone_tree_copy.append(new_series) 
                 self.add_undo(self.set_clone_tree([clone_tree_copy]))
-                self.add_undo(self.view_redraw_all())    
                 #print "self.clones after append:",self.clones
 
                         
@@ -3534,6 +3765,23 @@ class EditDocument(SketchDocument, QueueingPublisher):
 	    self.end_transaction(issue = UNDO)
     script_access['SetUndoLimit'] = SCRIPT_GET
 
+    def SetUndoMemoryLimit(self, limit):
+	# LIMIT is the approximate size of the undo history in MB
+	self.begin_transaction(clear_selection_rect = 0)
+	try:
+	    try:
+		self.undo.SetUndoMemoryLimit(limit)
+	    except:
+		self.abort_transaction()
+	finally:
+	    self.end_transaction(issue = UNDO)
+    script_access['SetUndoMemoryLimit'] = SCRIPT_GET
+
+    def UndoMemory(self):
+	# the approximate size of the undo history in bytes
+	return self.undo.UndoMemory()
+    script_access['UndoMemory'] = SCRIPT_GET
+
     def WasEdited(self):
 	# return true if document has changed since last save
 	return self.undo.UndoCount()
@@ -4472,6 +4720,13 @@ class EditDocument(SketchDocument, QueueingPublisher):
 	self.styles = UndoDict()
 	self.auto_assign_styles = 1
 	self.asked_about = {}
+	# Map the dynamic styles to the objects using them. The objects
+	# are kept in dictionaries mapping their ids to weak references.
+	# Entries are added by add_style_user whenever an object's
+	# property stack may have got a new dynamic style but never
+	# removed, so update_style_dependencies has to check whether
+	# the objects still use the style and are still in the document.
+	self.style_users = {}
 
     def destroy_styles(self):
 	for style in self.styles.values():
@@ -4504,10 +4759,54 @@ class EditDocument(SketchDocument, QueueingPublisher):
 	    self.add_undo(self.queue_style())
 	    return style
 
+    def add_style_user(self, object):
+	# Called by primitives when they're added to the document and
+	# when their properties change.
+	for style in object.properties.stack:
+	    if style.is_dynamic:
+		users = self.style_users.get(style)
+		if users is None:
+		    users = self.style_users[style] = {}
+		if users.get(id(object)) is None:
+		    users[id(object)] = weakref.ref(object)
+
+    def contains_object(self, object):
+	# Return true if OBJECT is part of one of the layers
+	while object.parent is not None:
+	    object = object.parent
+	return object.is_Layer and object in self.layers
+
     def update_style_dependencies(self, style):
-	def update(obj, style = style):
-	    obj.ObjectChanged(style)
-	self.WalkHierarchy(update)
+	# Update the objects using STYLE after it has changed. Their
+	# parents are only updated once and the damaged area is added
+	# as one rect.
+	users = self.style_users.get(style, {})
+	objects = []
+	parents = {}
+	for key, ref in users.items():
+	    object = ref()
+	    if object is None or id(object) != key:
+		del users[key]
+	    elif object.document is self and self.contains_object(object):
+		objects.append(object)
+		parents[id(object.parent)] = object.parent
+	parents = parents.values()
+	for parent in parents:
+	    parent.begin_change_children()
+	rect = None
+	try:
+	    for object in objects:
+		damaged = object.StyleChanged(style)
+		if damaged is not None:
+		    if rect is None:
+			rect = damaged
+		    else:
+			rect = UnionRects(rect, damaged)
+	finally:
+	    for parent in parents:
+		parent.end_change_children()
+	if rect is not None:
+	    self.AddClearRect(rect)
 	return (self.update_style_dependencies, style)
 
     def UpdateDynamicStyleSel(self):
@@ -5188,6 +5487,7 @@ class TiledClones:
         for i in range(0,l):
             self.document.parent_array.pop()
             #print "popka!",i  
+        self.document.clone_graph(clone_arr).Invalidate()
        
         self.document.remove_empty_list(clone_arr, clone_arr)
         print "clones after deletion", clone_arr
@@ -5205,6 +5505,111 @@ class TiledClones:
             buttons = _("OK")
             response = self.document.main_window.application.MessageBox(title = title,  message =message,  buttons = buttons)
                     
+    # the dialog entries given in percent, see read_settings
+    percent_settings = ('shift_x_row', 'shift_x_col', 'shift_y_row',
+                        'shift_y_col', 'scale_x_row', 'scale_x_col',
+                        'scale_y_row', 'scale_y_col', 'color_h_row',
+                        'color_h_col', 'color_s_row', 'color_s_col',
+                        'color_l_row', 'color_l_col')
+    # the alternation check buttons
+    flag_settings = ('shift_alt_row', 'shift_alt_col', 'scale_alt_row',
+                     'scale_alt_col', 'color_alt_row', 'color_alt_col')
+
+    def read_settings(self):
+        # Read all entries of the dialog at once. Return a dictionary
+        # mapping the names in percent_settings and flag_settings to
+        # their values and a flag that is true if one of the entries
+        # could not be read. Percentages are returned as fractions and
+        # invalid entries as 0.
+        settings = {}
+        exception = 0
+        for name in self.percent_settings:
+            try:
+                settings[name] = getattr(self, name).get()/100
+            except:
+                settings[name] = 0
+                exception = 1
+        for name in self.flag_settings:
+            settings[name] = getattr(self, name).get()
+        return settings, exception
+
+    def compute_tiles(self, rows, cols, width, height, origin, color,
+                      settings):
+        # Compute the placement of all tiles of a ROWS x COLS grid of
+        # copies of an object of size WIDTH x HEIGHT, whose coord_rect
+        # has its lower left corner at ORIGIN, and solid fill COLOR
+        # (None if the object has no solid fill).
+        #
+        # Shift, scale and colour shift of a tile are sums of a term
+        # that depends only on the row and one that depends only on
+        # the column, so both are computed once per row and per column
+        # and then combined. Return a list with a tuple (TRAFO, RGB)
+        # for every tile in row major order, the master tile at (0, 0)
+        # excluded. TRAFO maps the master onto the tile, RGB is the
+        # fill colour of the tile as an (r, g, b) tuple or None.
+        s = settings
+        x0, y0 = origin
+
+        def terms(count, shift_alt, scale_x, scale_y, scale_alt,
+                  h, sat, l, color_alt):
+            result = []
+            for i in range(count):
+                alt = 1
+                if shift_alt:
+                    alt = i % 2
+                alt_scale = i
+                if scale_alt and not i % 2:
+                    alt_scale = 0
+                alt_color = i
+                if color_alt and not i % 2:
+                    alt_color = 0
+                result.append((i, alt, scale_x * alt_scale,
+                               scale_y * alt_scale, h * alt_color,
+                               sat * alt_color, l * alt_color))
+            return result
+
+        row_terms = terms(rows, s['shift_alt_row'], s['scale_x_row'],
+                          s['scale_y_row'], s['scale_alt_row'],
+                          s['color_h_row'], s['color_s_row'],
+                          s['color_l_row'], s['color_alt_row'])
+        col_terms = terms(cols, s['shift_alt_col'], s['scale_x_col'],
+                          s['scale_y_col'], s['scale_alt_col'],
+                          s['color_h_col'], s['color_s_col'],
+                          s['color_l_col'], s['color_alt_col'])
+        row_offsets = []
+        for i, alt, sx, sy, dr, dg, db in row_terms:
+            row_offsets.append((width * i * s['shift_x_row'] * alt,
+                                -height * i
+                                - height * i * s['shift_y_row'] * alt))
+        col_offsets = []
+        for j, alt, sx, sy, dr, dg, db in col_terms:
+            col_offsets.append((width * j
+                                + width * j * s['shift_x_col'] * alt,
+                                -height * j * s['shift_y_col'] * alt))
+
+        tiles = []
+        for i, ralt, rsx, rsy, rdr, rdg, rdb in row_terms:
+            row_x, row_y = row_offsets[i]
+            for j, calt, csx, csy, cdr, cdg, cdb in col_terms:
+                if i == 0 and j == 0:
+                    continue
+                col_x, col_y = col_offsets[j]
+                scale_x = 1 + rsx + csx
+                scale_y = 1 + rsy + csy
+                # move by the offset and scale around the lower left
+                # corner of the moved object
+                trafo = Trafo(scale_x, 0, 0, scale_y,
+                              x0 + row_x + col_x - scale_x * x0,
+                              y0 + row_y + col_y - scale_y * y0)
+                rgb = None
+                if color is not None:
+                    # colour components are truncated to [0, 1]
+                    rgb = (max(0, min(1, color[0] + rdr + cdr)),
+                           max(0, min(1, color[1] + rdg + cdg)),
+                           max(0, min(1, color[2] + rdb + cdb)))
+                tiles.append((trafo, rgb))
+        return tiles
+
     def create(self):
         string = 'create_tiled_clones_button_pressed'
         self.document.log(string)
@@ -5261,225 +5666,46 @@ class TiledClones:
                         self.document.parent_array.insert(self.document.index_of_object_in_the_parent_array+1, new_array)    
                         print "appended to clones2"
     
-                width = abs(self.document.selection.bounding_rect[0]-self.document.selection.bounding_rect[2])        
-                height = abs(self.document.selection.bounding_rect[1]-self.document.selection.bounding_rect[3])  
-           
-    
-                
                 #get current color, before it's manipulated
                 sel_col = self.document.CurrentFillColor()
-    
-                #precalculating dialog values for speedup
-                scale_alt_row = self.scale_alt_row.get()
-                scale_alt_col = self.scale_alt_col.get()
-                
-                color_alt_row = self.color_alt_row.get()
-                color_alt_col = self.color_alt_col.get()
-                
-                shift_alt_row = self.shift_alt_row.get()
-                shift_alt_col = self.shift_alt_col.get()
-                
-                #but first we have to check whether the user inputted crap or not for entries
-                shift_x_row = 0
-                shift_x_col = 0
-                shift_y_row = 0
-                shift_y_col = 0
-                
-                scale_x_row = 0
-                scale_y_row = 0
-                scale_x_col = 0
-                scale_y_col = 0
-                
-                hh_row = 0
-                hh_col = 0
-                
-                ss_row = 0
-                ss_col = 0
-                
-                ll_row = 0
-                ll_col = 0
-                
 
-                
-                try:
-                    shift_x_row = self.shift_x_row.get()/100
-                except:
-                    shift_x_row = 0
-                    exception = 1
-                
-                try:
-                    shift_x_col = self.shift_x_col.get()/100
-                except:
-                    shift_x_col = 0
-                    exception = 1
-                
-                try:
-                    shift_y_row = self.shift_y_row.get()/100
-                except:
-                    shit_y_row = 0
-                    exception = 1
-                
-                try:
-                    shift_y_col = self.shift_y_col.get()/100
-                except:
-                    shift_y_col = 0
-                    exception = 1
-                
-                try:
-                    scale_x_row = self.scale_x_row.get()/100
-                except:
-                    scale_x_row = 0
-                    exception = 1
-                
-                try:
-                    scale_y_row = self.scale_y_row.get()/100
-                except:
-                    scale_y_row = 0
-                    exception = 1
-                    
-                try:
-                    scale_x_col = self.scale_x_col.get()/100
-                except:
-                    scale_x_col = 0
-                    exception = 1
-                    
-                try:
-                    scale_y_col = self.scale_y_col.get()/100
-                except:
-                    scale_y_col = 0
-                    exception = 1
-                
-                try:
-                    hh_row = self.color_h_row.get()/100
-                except:
-                    hh_row = 0
-                    exception = 1
-                
-                try:
-                    hh_col = self.color_h_col.get()/100
-                except:
-                    hh_col = 0
-                    exception = 1
-                
-                try:
-                    ss_row = self.color_s_row.get()/100
-                except:
-                    ss_row = 0
-                    exception = 1
-                
-                try:
-                    ss_col = self.color_s_col.get()/100
-                except:
-                    ss_col = 0
-                    exception = 1
-                
-                try:
-                    ll_row = self.color_l_row.get()/100
-                except:
-                    ll_row = 0
-                    exception = 1
-                
-                try:
-                    ll_col = self.color_l_col.get()/100
-                except:
-                    ll_col = 0
-                    exception = 1
-               
+                settings, exception = self.read_settings()
                 if exception:
                     self.display_check_your_entries()
-                 
-
-                for i in range (0,rows):
-                    for j in range(0,cols):
-                        if i != 0 or j != 0:
-                            #calculate modulo for alternation
-                            alt_row = 1
-                            alt_col = 1
-                            if shift_alt_row:
-                                alt_row = (i % 2)
-                                #print "altrow = ",alt_row
-                            if shift_alt_col:
-                                alt_col = (j % 2)
-                            #SHIFT    
-                            offset = Point(width*j + width*i*shift_x_row*alt_row + width*j*shift_x_col*alt_col ,-height*i - height*i*shift_y_row*alt_row - height*j*shift_y_col*alt_col)
-                            newobj = master.Duplicate()
-                            newobj.Translate(offset)
-                            
-                            #SCALE                                
-                            scale_x = 1
-                            scale_y = 1
-                            
-                            alti = i
-                            altj = j
-                            
-                            
-                            if scale_alt_row and not i % 2:
-                                    alti = 0
-                            if scale_alt_col and not j % 2:
-                                    altj = 0
-                                    
-                            #abs in case user screws up, scale cannot be negative
-                            
-                            if scale_x_row:
-                                scale_x = (scale_x_row)*alti+1
-                            
-                            if scale_y_row:
-                                scale_y = (scale_y_row)*alti+1
 
-                            if scale_x_col:
-                                scale_x = scale_x+(scale_x_col)*altj
-                            
-                            if scale_y_col:
-                                scale_y = scale_y+(scale_y_col)*altj
-                                
-                           
-                            self.document.TransformClone([newobj], scale_x, scale_y)
-                            
-                                   
-                            select, undo_insert = self.document.insert(newobj)
-                            self.document.add_undo(undo_insert)                
-                            #self.document.__set_selection(select, SelectSet)
-                            
-                            new_array.append([newobj])
-                            #clone_tree_copy.append([newobj]) 
-                            
-                            #COLOR 
-                            if sel_col != None: #the object is transparent
-                                alt_color_i = i
-                                alt_color_j = j
-                                if color_alt_row and not i % 2:
-                                        alt_color_i = 0
-                                if color_alt_col and not j % 2:
-                                        alt_color_j = 0
-                                #color entry cannot be negative, so incase user screws up
-                                h_row = hh_row*(alt_color_i)
-                                h_col = hh_col*(alt_color_j)
-                                
-                                s_row = ss_row*(alt_color_i)
-                                s_col = ss_col*(alt_color_j)
-                                
-                                l_row = ll_row*(alt_color_i)
-                                l_col = ll_col*(alt_color_j)
-                                
-                                ''' print"-----------------------------"
-                                print "h_row=",h_row,"h_col=",h_col
-                                print "s_row=",s_row,"s_col=",s_col
-                                print "l_row=",l_row,"l_col=",l_col
-                                
-                                print "orig h",sel_col[0]'''
-                                
-                                #color cannot be more than 1 an less than 0, thats why truncate it with max min
-                                r = max(0,min(1,sel_col[0] + h_row + h_col))
-                                g = max(0,min(1,sel_col[1] + s_row + s_col))
-                                b = max(0,min(1,sel_col[2] + l_row + l_col))
-                                
-                                #print "rgb",r,g,b
-                                col = CreateRGBColor(r, g, b) 
-                                
-                                self.document.select_object(newobj)
-                                self.document.canvas.fill_solid(col)
-     
-                                self.document.add_undo(self.document.view_redraw_all())
+                # compute the whole grid first, then create the tiles
+                # and insert them into the layer in one go with a
+                # single undo record and a single redraw.
+                rect = self.document.selection.bounding_rect
+                width = abs(rect[0] - rect[2])
+                height = abs(rect[1] - rect[3])
+                origin = (master.coord_rect[0], master.coord_rect[1])
+                tiles = self.compute_tiles(rows, cols, width, height,
+                                           origin, sel_col, settings)
+                objects = []
+                for trafo, rgb in tiles:
+                    #tiles share the geometry of the master and only keep
+                    #their trafo and colour. a tile that is edited on its
+                    #own becomes an ordinary object (see
+                    #EditDocument.materialize_selected_clone)
+                    if master.is_Primitive and not master.is_Clone:
+                        newobj = Clone(master, trafo = trafo)
+                    else:
+                        newobj = self.document.clone_instance(master)
+                        newobj.Transform(trafo)
+                    if rgb is not None:
+                        pattern = SolidPattern(apply(CreateRGBColor, rgb))
+                        newobj.SetProperties(fill_pattern = pattern)
+                    objects.append(newobj)
+
+                if objects:
+                    select, undo_insert = self.document.insert(objects)
+                    self.document.add_undo(undo_insert)
+                    for newobj in objects:
+                        new_array.append([newobj])
+                    rects = map(lambda o: o.bounding_rect, objects)
+                    self.document.add_undo(
+                        self.document.AddClearRect(reduce(UnionRects, rects)))
                                     
             except:
                 self.document.abort_transaction()
@@ -5498,14 +5724,14 @@ class TiledClones:
             self.document.main_window.total_tiled_clones_created = len(new_array)            
             
 
-            #print "clones after insertion=",self.document.tile_clones
-
     def set_tile_clone_tree(self, array):              
-        clone_tree_copy = []
-        self.document.copy_tree(clone_tree_copy, self.document.tile_clones)        
-        undo = self.set_tile_clone_tree, [clone_tree_copy]
-        self.document.tile_clones = array[0]
-        self.document.view_redraw_all()
+        undo = self.set_tile_clone_tree, \
+               [snapshot_tree(self.document.tile_clones)]
+        old_objects = tree_objects(self.document.tile_clones)
+        self.document.tile_clones = restore_tree(array[0])
+        self.document.clone_graph(self.document.tile_clones).Invalidate()
+        objects = old_objects + tree_objects(self.document.tile_clones)
+        self.document.add_clone_tree_clear_rect(objects)
         return undo               
         
     def remove(self):
@@ -5522,7 +5748,6 @@ class TiledClones:
             try:
                 self.document.copy_tree(clone_tree_copy,self.document.tile_clones)
                 self.delete_new_tile_clones(master,clone_tree_copy) #delete all except master first
-                self.document.add_undo(self.document.view_redraw_all())
             except:
                 print "bla"
         finally:
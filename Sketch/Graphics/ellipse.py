@@ -83,8 +83,8 @@ class Ellipse(RectangularPrimitive):
 				      duplicate = duplicate)
 	self.normalize()
 
-    def DrawShape(self, device, rect = None, clip = 0):
-	Primitive.DrawShape(self, device)
+    def DrawShape(self, device, rect = None, clip = 0, properties = None):
+	Primitive.DrawShape(self, device, properties)
 	device.SimpleEllipse(self.trafo, self.start_angle, self.end_angle,
 			     self.arc_type, rect, clip)
 
@@ -134,10 +134,12 @@ class Ellipse(RectangularPrimitive):
         return PolyBezier(paths = self.Paths(),
                           properties = self.properties.Duplicate())
 
-    def Hit(self, p, rect, device, clip = 0):
+    def Hit(self, p, rect, device, clip = 0, properties = None):
+	if properties is None:
+	    properties = self.properties
 	return device.SimpleEllipseHit(p, self.trafo, self.start_angle,
 				       self.end_angle, self.arc_type,
-				       self.properties, self.Filled() or clip,
+				       properties, properties.HasFill() or clip,
 				       ignore_outline_mode = clip)
 
     def Blend(self, other, p, q):
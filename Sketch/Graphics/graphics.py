@@ -44,7 +44,7 @@ from Sketch import _sketch
 
 
 from Sketch import Point, Polar, Rect, UnitRect, Identity, SingularMatrix, \
-     Trafo, Rotation, Scale, Translation, Undo, TransformRectangle
+     Trafo, Rotation, Scale, Translation, Undo, TransformRectangle, CreatePath
 
 from color import StandardColors
 import color
@@ -392,10 +392,54 @@ class SimpleGC(GCDevice):
 
 
 
+#
+#	Level of detail
+#
+#	When zoomed out, objects that cover only a few pixels are drawn as
+#	small rectangles in a representative color.
+#
+
+def properties_color(properties):
+    # Return the color of the fill or, if there is none, of the line
+    # of PROPERTIES. Return None if neither are set.
+    if properties.HasFill():
+	pattern = properties.fill_pattern
+    elif properties.HasLine():
+	pattern = properties.line_pattern
+    else:
+	return None
+    if pattern.is_Solid:
+	return pattern.Color()
+    if pattern.is_Gradient:
+	return pattern.Gradient().ColorAt(0.5)
+    return StandardColors.gray
+
+def lod_color(object):
+    # Return the color in which OBJECT is drawn when it is too small to
+    # be drawn in detail or None if it is invisible.
+    if object.is_Compound:
+	for child in object.GetObjects():
+	    color = lod_color(child)
+	    if color is not None:
+		return color
+	return None
+    if object.is_Image or object.is_Eps:
+	return StandardColors.gray
+    return properties_color(object.Properties())
+
+# paths with fewer segments than this are never simplified
+lod_min_segments = 16
+
+
 class CommonDevice:
 
     # some methods common to GraphicsDevice and PostScriptDevice
 
+    # Objects whose bounding rect is smaller than lod_size (in document
+    # coordinates) are drawn with DrawSmallObject instead of their
+    # DrawShape method. 0 means always draw in full detail.
+    lod_size = 0
+
     def draw_arrow(self, arrow, width, pos, dir, rect = None):
 	self.PushTrafo()
 	self.Translate(pos.x, pos.y)
@@ -476,6 +520,11 @@ class GraphicsDevice(SimpleGC, CommonDevice):
     draw_visible = 1
     draw_printable = 0
 
+    # if true, use a lower level of detail when zoomed out. lod_size
+    # and lod_tolerance are set by SetViewportTransform.
+    use_lod = 1
+    lod_tolerance = 0
+
     def __init__(self):
 	SimpleGC.__init__(self)
 	self.line = 0
@@ -490,6 +539,12 @@ class GraphicsDevice(SimpleGC, CommonDevice):
 	SimpleGC.InitClip(self)
 	self.images_drawn = 0
 
+    def SetViewportTransform(self, scale, doc_to_win, win_to_doc):
+	SimpleGC.SetViewportTransform(self, scale, doc_to_win, win_to_doc)
+	if self.use_lod:
+	    preferences = config.preferences
+	    self.lod_size = preferences.lod_object_size / scale
+	    self.lod_tolerance = preferences.lod_path_tolerance / scale
 
     proc_fill = proc_line = 0
     fill_rect = None
@@ -791,14 +846,70 @@ class GraphicsDevice(SimpleGC, CommonDevice):
 	else:
 	    fill = None
 
+	drawn = paths
+	if self.lod_tolerance and not clip:
+	    drawn = self.simplify_paths(paths)
 	_sketch.draw_multipath(self.gc, self.doc_to_win, line, fill,
 			       self.PushClip, self.PopClip, self.ClipRegion,
-			       rect, paths, CreateRegion(), self.proc_fill,
+			       rect, drawn, CreateRegion(), self.proc_fill,
 			       clip)
 
 	if self.line:
 	    self.draw_arrows(paths, rect)
 
+    def simplify_paths(self, paths):
+	# Return PATHS with the paths whose nodes are much closer to each
+	# other than lod_tolerance replaced by polygons through a subset
+	# of their nodes. The polygons leave out the nodes that are
+	# closer than lod_tolerance to the previous node. If nothing is
+	# to be simplified, return PATHS itself.
+	tolerance = self.lod_tolerance
+	result = None
+	for idx in range(len(paths)):
+	    path = paths[idx]
+	    length = path.len
+	    if length < lod_min_segments:
+		continue
+	    rect = path.accurate_rect()
+	    if 2 * (rect.right - rect.left + rect.top - rect.bottom) \
+	       > length * tolerance:
+		# there's enough room for the details
+		continue
+	    nodes = path.NodeList()
+	    last = nodes[0]
+	    polygon = CreatePath()
+	    polygon.AppendLine(last)
+	    for p in nodes[1:-1]:
+		if abs(p.x - last.x) + abs(p.y - last.y) >= tolerance:
+		    polygon.AppendLine(p)
+		    last = p
+	    polygon.AppendLine(nodes[-1])
+	    if path.closed:
+		polygon.ClosePath()
+	    if result is None:
+		result = list(paths)
+	    result[idx] = polygon
+	if result is None:
+	    return paths
+	return tuple(result)
+
+    def DrawSmallObject(self, object):
+	# Draw OBJECT, whose bounding rect is smaller than lod_size, as a
+	# rectangle of at least one pixel in the color returned by
+	# lod_color.
+	if self.outline_mode:
+	    color = properties_color(self.properties)
+	else:
+	    color = lod_color(object)
+	if color is None:
+	    return
+	rect = object.bounding_rect
+	x1, y1 = self.DocToWin(rect.left, rect.top)
+	x2, y2 = self.DocToWin(rect.right, rect.bottom)
+	self.SetFillColor(color)
+	self.gc.FillRectangle(min(x1, x2), min(y1, y2),
+			      abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+
     def draw_text_on_gc(self, gc, text, trafo, font, font_size, cache = None):
 	self.PushTrafo()
 	try:
@@ -837,26 +948,50 @@ class GraphicsDevice(SimpleGC, CommonDevice):
 		    x, y = pos[i]
 		    gc.DrawString(x, y, text[i])
 	    else:
-		# 'greek'. XXX is this really necessary. It avoids
-		# rendering fonts that are too small to read.
-		pos = font.TypesetText(text)
+		# 'greek'. Draw a bar for every word instead of rendering
+		# fonts that are too small to read. The extra space gives
+		# the position after the last character.
+		pos = font.TypesetText(text + ' ')
 		pos = map(self.DocToWin, pos)
 		ux, uy = up
 		lx = ux / 2; ly = uy / 2
-		uppercase = string.uppercase
-		draw = gc.DrawLine # we should draw rectangles...
-		for i in range(len(text)):
-		    x, y = pos[i]
-		    if text[i] in uppercase:
-			draw(x, y, int(round(x + ux)), int(round(y + uy)))
-		    else:
-			draw(x, y, int(round(x + lx)), int(round(y + ly)))
+		whitespace = string.whitespace
+		start = None
+		for i in range(len(text) + 1):
+		    if i < len(text) and text[i] not in whitespace:
+			if start is None:
+			    start = pos[i]
+		    elif start is not None:
+			x1, y1 = start
+			x2, y2 = pos[i]
+			gc.FillPolygon([(x1, y1), (x2, y2),
+					(int(round(x2 + lx)), int(round(y2 + ly))),
+					(int(round(x1 + lx)), int(round(y1 + ly)))],
+				       X.Convex, X.CoordModeOrigin)
+			# make sure that bars less than a pixel high are
+			# visible
+			gc.DrawLine(x1, y1, x2, y2)
+			start = None
 	finally:
 	    self.PopTrafo()
 
+    def text_greeked(self, trafo, font_size):
+	# Return true if text with font size FONT_SIZE transformed by
+	# TRAFO is too small to be rendered and is greeked instead.
+	up = self.doc_to_win(trafo).DTransform(0, font_size)
+	return abs(up) < config.preferences.greek_threshold
+
     def DrawText(self, text, trafo = None, clip = 0, cache = None):
 	if text and self.properties.font:
-	    if self.fill or clip:
+	    if self.proc_fill and not clip \
+	       and self.text_greeked(trafo, self.properties.font_size):
+		# the greek bars are too small to show the pattern, so
+		# avoid the clip bitmap
+		self.SetFillColor(properties_color(self.properties))
+		self.draw_text_on_gc(self.gc, text, trafo,
+				     self.properties.font,
+				     self.properties.font_size, cache)
+	    elif self.fill or clip:
 		if self.proc_fill or clip:
 		    bitmap, bitmapgc = self.create_clip_bitmap()
 		    self.draw_text_on_gc(bitmapgc, text, trafo,
@@ -1228,6 +1363,7 @@ dummyLineStyle = DummyAttr(SolidLine(color_0))
 
 class InvertingDevice(GraphicsDevice):
 
+    use_lod = 0
     normal_line_style = X.LineSolid
     handle_line_style = X.LineOnOffDash
     caret_line_style = X.LineSolid
@@ -1379,6 +1515,7 @@ hit_properties.AddStyle(SolidLine(color_1, width = 3))
 
 class HitTestDevice(GraphicsDevice):
 
+    use_lod = 0
     outline_style = hit_properties
 
     def __init__(self):
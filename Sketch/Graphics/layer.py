@@ -19,6 +19,7 @@
 #       The layer classes. 
 #
 
+import os
 from types import TupleType
 from Sketch.const import LAYER_STATE, LAYER_COLOR
 
@@ -27,6 +28,7 @@ from Sketch import _, NullUndo, EmptyRect, InfinityRect, Point, config, _sketch
 import color
 import selinfo
 
+from base import GraphicsObject
 from compound import EditableCompound
 
 class Layer(EditableCompound):
@@ -86,7 +88,7 @@ class Layer(EditableCompound):
 	build_info = selinfo.build_info
 	selected = []
 	objects = self.objects
-	for idx in range(len(objects)):
+	for idx in self.candidates(rect):
 	    obj = objects[idx]
 	    if test(obj.bounding_rect):
 		selected.append(build_info(idx, obj))
@@ -121,6 +123,8 @@ class Layer(EditableCompound):
 	return self.name
 
     def NumObjects(self):
+	if self.source is not None:
+	    return self.num_objects
 	return len(self.objects)
 
     def Visible(self):
@@ -204,10 +208,93 @@ class Layer(EditableCompound):
     def SaveToFile(self, file):
 	file.BeginLayer(self.name, self.visible, self.printable, self.locked,
 			self.outlined, self.outline_color)
-	for obj in self.objects:
-	    obj.SaveToFile(file)
+	self.save_objects(file)
 	file.EndLayer()
 
+    def save_objects(self, file):
+	# Savers that can reuse the text of unchanged objects from the
+	# previous save have a SaveObject method. They may also be able
+	# to write the objects that haven't been read yet.
+	if self.source is not None and hasattr(file, 'SaveLayerSource') \
+	   and file.SaveLayerSource(self.source, self.document):
+	    return
+	if hasattr(file, 'SaveObject'):
+	    for obj in self.objects:
+		file.SaveObject(obj)
+	else:
+	    for obj in self.objects:
+		obj.SaveToFile(file)
+
+    #
+    #	Lazy layers
+    #
+    # An import filter may leave the objects of a layer in the file:
+    # load_SetSource replaces self.objects with SOURCE, a callable that
+    # reads and returns the list of objects. It's called when
+    # self.objects is first accessed, i.e. when the layer is drawn,
+    # hit-tested, edited or saved. Until then the layer only knows the
+    # number of its objects and their bounding rects.
+
+    source = None
+
+    def load_SetSource(self, source, num_objects, coord_rect, bounding_rect):
+	del self.objects
+	self.source = source
+	self.num_objects = num_objects
+	self.coord_rect = coord_rect
+	self.bounding_rect = bounding_rect
+
+    def __getattr__(self, attr):
+	if attr == 'objects' and self.source is not None:
+	    self.Materialize()
+	    return self.objects
+	return EditableCompound.__getattr__(self, attr)
+
+    def Materialized(self):
+	return self.source is None
+
+    def ReadsFrom(self, filename):
+	# Return true if the objects are still to be read from the file
+	# FILENAME. Sources that don't know their file may read from any.
+	if self.source is None:
+	    return 0
+	source = getattr(self.source, 'filename', None)
+	return source is None \
+	       or os.path.realpath(source) == os.path.realpath(filename)
+
+    def Materialize(self):
+	# Read the objects if they're still in the file.
+	if self.source is None:
+	    return
+	objects = self.source()
+	self.source = None
+	del self.num_objects
+	self.objects = objects
+	EditableCompound.SetDocument(self, self.document)
+	self.del_lazy_attrs()
+
+    def SetDocument(self, doc):
+	if self.source is not None:
+	    GraphicsObject.SetDocument(self, doc)
+	else:
+	    EditableCompound.SetDocument(self, doc)
+
+    def set_parent(self):
+	if self.source is None:
+	    EditableCompound.set_parent(self)
+
+    def unset_parent(self):
+	if self.source is None:
+	    EditableCompound.unset_parent(self)
+
+    def destroy_objects(self):
+	if self.source is not None:
+	    self.source = None
+	    del self.num_objects
+	    self.objects = []
+	else:
+	    EditableCompound.destroy_objects(self)
+
 class SpecialLayer(Layer):
 
     is_SpecialLayer = 1
@@ -285,8 +372,7 @@ class GuideLayer(SpecialLayer):
     def SaveToFile(self, file):
 	file.BeginGuideLayer(self.name, self.visible, self.printable,
 			     self.locked, self.outlined, self.outline_color)
-	for obj in self.objects:
-	    obj.SaveToFile(file)
+	self.save_objects(file)
 	file.EndGuideLayer()
 
     def Snap(self, p):
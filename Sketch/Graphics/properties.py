@@ -15,6 +15,8 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307	USA
 
+from weakref import WeakKeyDictionary
+
 from Sketch import const
 CHANGED = const.CHANGED
 from Sketch.connector import Publisher
@@ -26,6 +28,18 @@ from color import StandardColors
 from blend import Blend
 
 
+# The generation of a style is incremented whenever one of its
+# properties changes. It's kept outside of the style because the
+# instance dictionary of a style holds exactly its properties.
+style_generations = WeakKeyDictionary()
+
+def style_generation(style):
+    return style_generations.get(style, 0)
+
+def style_changed(style):
+    style_generations[style] = style_generations.get(style, 0) + 1
+
+
 class Style(Publisher):
 
     is_dynamic = 0
@@ -53,12 +67,14 @@ class Style(Publisher):
         if prop == 'fill_pattern' or prop == 'line_pattern':
             value = value.Copy()
 	dict[prop] = value
+	style_changed(self)
 	self.issue(CHANGED, self)
 	return undo
 
     def DelProperty(self, prop):
 	undo = (self.SetProperty, prop, getattr(self, prop))
 	delattr(self, prop)
+	style_changed(self)
 	self.issue(CHANGED, self)
 	return undo
 
@@ -76,6 +92,7 @@ class Style(Publisher):
     def SetName(self, name):
 	undo = self.SetName, self.name
 	self.name = name
+	style_changed(self)
 	return undo
 
     def AsDynamicStyle(self):
@@ -112,6 +129,48 @@ def LineStyle(color = None, width = 0, cap  = const.CapButt,
 SolidLine = LineStyle
 EmptyLineStyle = Style(line_pattern = EmptyPattern)
 
+
+class ResolvedProperties:
+
+    # The merged properties of a sequence of dynamic styles. The
+    # property stacks of all objects that use the same dynamic styles
+    # share one instance (see resolved_properties), so the styles are
+    # merged only once and not for every object. An instance is valid
+    # as long as the generations of the styles haven't changed.
+
+    def __init__(self, layers):
+	self.layers = layers
+	self.generations = map(style_generation, layers)
+	values = {}
+	for i in range(len(layers) - 1, -1, -1):
+	    values.update(layers[i].__dict__)
+	self.values = values
+
+    def IsValid(self, layers):
+	if len(layers) != len(self.layers):
+	    return 0
+	for i in range(len(layers)):
+	    if layers[i] is not self.layers[i]:
+		return 0
+	return self.generations == map(style_generation, layers)
+
+# The interned ResolvedProperties, indexed by the ids of the styles. The
+# instances keep their styles alive so the ids stay unique. To limit the
+# memory used for styles that aren't used anymore the dictionary is
+# emptied when it has max_resolved entries.
+_resolved = {}
+max_resolved = 1000
+
+def resolved_properties(layers):
+    key = tuple(map(id, layers))
+    record = _resolved.get(key)
+    if record is None or not record.IsValid(layers):
+	if len(_resolved) >= max_resolved:
+	    _resolved.clear()
+	record = _resolved[key] = ResolvedProperties(layers)
+    return record
+
+
 class PropertyStack:
 
     update_cache = 1
@@ -129,10 +188,18 @@ class PropertyStack:
     def __getattr__(self, attr):
 	if self.update_cache:
 	    cache = self.__dict__
-	    stack = self.stack[:]
-	    stack.reverse()
-	    for layer in stack:
-		cache.update(layer.__dict__)
+	    stack = self.stack
+	    # The dynamic styles on top of the stack are shared with
+	    # other objects and merged once in the shared
+	    # ResolvedProperties. Only the rest is merged here, then the
+	    # shared values are copied over it with a single update.
+	    dynamic = 0
+	    while dynamic < len(stack) and stack[dynamic].is_dynamic:
+		dynamic = dynamic + 1
+	    for i in range(len(stack) - 1, dynamic - 1, -1):
+		cache.update(stack[i].__dict__)
+	    if dynamic:
+		cache.update(resolved_properties(stack[:dynamic]).values)
 	    self.update_cache = 0
 	try:
 	    return self.__dict__[attr]
@@ -341,6 +408,7 @@ class PropertyStack:
 		dict = style.__dict__.copy()
 		dict.update(last.__dict__)
 		last.__dict__ = dict
+		style_changed(last)
 	    last = style
 	length = len(stack)
 	self.delete_shadowed_layers()
@@ -0,0 +1,733 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307	USA
+
+#
+# RasterDevice:
+#
+# A graphics device that renders directly into a PIL image. It doesn't
+# need an X connection or ghostscript. Shapes are converted to polygons
+# in image coordinates and drawn as coverage masks with PIL.ImageDraw.
+# Gradients and tiled images are rendered with the same functions of
+# the _sketch module the canvas uses.
+#
+# Clipping works like in GraphicsDevice: PushClip saves the current clip
+# region, drawing methods called with clip = 1 intersect it with the
+# shape and PopClip restores it. A clip region is an 'L' image of the
+# size of the output image.
+#
+# Not supported yet: dashed lines, line caps and joins (lines have round
+# joins if they are wide), and EPS files which are drawn as a grey box.
+# The device records which of these a drawing uses (see Unsupported)
+# and render_document renders such drawings with ghostscript if the
+# raster_ghostscript_fallback preference is set.
+#
+
+import os, tempfile
+from math import hypot, sqrt, floor, ceil
+
+import PIL.Image, PIL.ImageDraw, PIL.ImageChops
+
+from Sketch import _, _sketch, config, Trafo, Translation, Rotation, Scale, \
+     SingularMatrix, SketchError
+from Sketch.const import CapRound, JoinRound
+from Sketch.warn import warn, USER
+from Sketch.Lib.util import Empty
+
+from graphics import CommonDevice, circle_path
+from color import StandardColors
+
+
+def flatten_path(path, trafo):
+    # Return the points of PATH transformed by TRAFO as a list of (x,
+    # y) tuples. Bezier segments are approximated by line segments
+    # about three pixels long.
+    items = path.get_save()
+    if not items:
+	return []
+    x, y = trafo(items[0][0], items[0][1])
+    points = [(x, y)]
+    for item in items[1:]:
+	if len(item) == 3:
+	    x, y = trafo(item[0], item[1])
+	    points.append((x, y))
+	else:
+	    x0, y0 = points[-1]
+	    x1, y1 = trafo(item[0], item[1])
+	    x2, y2 = trafo(item[2], item[3])
+	    x3, y3 = trafo(item[4], item[5])
+	    length = hypot(x1 - x0, y1 - y0) + hypot(x2 - x1, y2 - y1) \
+		     + hypot(x3 - x2, y3 - y2)
+	    steps = min(int(length / 3) + 1, 100)
+	    for i in range(1, steps):
+		t = float(i) / steps
+		s = 1.0 - t
+		a = s * s * s; b = 3 * s * s * t; c = 3 * s * t * t
+		d = t * t * t
+		points.append((a * x0 + b * x1 + c * x2 + d * x3,
+			       a * y0 + b * y1 + c * y2 + d * y3))
+	    points.append((x3, y3))
+    return points
+
+
+class RasterDevice(CommonDevice):
+
+    draw_visible = 0
+    draw_printable = 1
+
+    has_axial_gradient = 1
+    has_radial_gradient = 1
+    has_conical_gradient = 1
+
+    def __init__(self, size, trafo, mode = 'RGB', background = None):
+	# Render into a new image of mode MODE ('RGB' or 'RGBA') and size
+	# SIZE (width, height) filled with BACKGROUND. The default
+	# background is white, transparent for 'RGBA'. TRAFO maps
+	# document coordinates to pixel coordinates.
+	if background is None:
+	    if mode == 'RGBA':
+		background = (255, 255, 255, 0)
+	    else:
+		background = (255, 255, 255)
+	self.image = PIL.Image.new(mode, size, background)
+	self.size = size
+	self.doc_to_image = trafo
+	self.trafo_stack = ()
+	self.clip = None
+	self.clip_stack = ()
+	self.properties = None
+	self.fill = self.line = 0
+	self.proc_fill = self.proc_line = 0
+	self.pattern_rect = None
+	self.current_color = StandardColors.black
+	self.line_width = 0.0
+	self.gradient_steps = config.preferences.gradient_steps_print
+	self.unknown_fonts = {}
+	self.unsupported = {}
+
+    def Image(self):
+	return self.image
+
+    def Unsupported(self):
+	# Return the names of the features used in the drawing that the
+	# device can't render correctly
+	names = self.unsupported.keys()
+	names.sort()
+	return names
+
+    #
+    #	Transformations
+    #
+
+    def PushTrafo(self):
+	self.trafo_stack = (self.doc_to_image, self.trafo_stack)
+
+    def Concat(self, trafo):
+	self.doc_to_image = self.doc_to_image(trafo)
+
+    def Translate(self, x, y = None):
+	if y is None:
+	    x, y = x
+	self.Concat(Translation(x, y))
+
+    def Rotate(self, angle):
+	self.Concat(Rotation(angle))
+
+    def Scale(self, factor):
+	self.Concat(Scale(factor))
+
+    def PopTrafo(self):
+	self.doc_to_image, self.trafo_stack = self.trafo_stack
+
+    def trafo_scale(self):
+	# the factor by which lengths are scaled by doc_to_image on
+	# average
+	t = self.doc_to_image
+	return sqrt(abs(t.m11 * t.m22 - t.m12 * t.m21))
+
+    #
+    #	Masks and Clipping
+    #
+
+    def mask_box(self, polygons, grow = 1):
+	# Return the box (left, top, right, bottom) of the pixels covered
+	# by POLYGONS grown by GROW pixels and clipped to the image and
+	# the clip region, or None if it's empty.
+	xs = []; ys = []
+	for points in polygons:
+	    for x, y in points:
+		xs.append(x); ys.append(y)
+	if not xs:
+	    return None
+	width, height = self.size
+	left = max(int(floor(min(xs) - grow)), 0)
+	top = max(int(floor(min(ys) - grow)), 0)
+	right = min(int(ceil(max(xs) + grow)) + 1, width)
+	bottom = min(int(ceil(max(ys) + grow)) + 1, height)
+	if self.clip is not None:
+	    box = self.clip.getbbox()
+	    if box is None:
+		return None
+	    left = max(left, box[0]); top = max(top, box[1])
+	    right = min(right, box[2]); bottom = min(bottom, box[3])
+	if left >= right or top >= bottom:
+	    return None
+	return left, top, right, bottom
+
+    def polygon_mask(self, polygons):
+	# Return a tuple (box, mask) with the coverage of POLYGONS (lists
+	# of points in image coordinates) filled with the even-odd rule.
+	# MASK is an 'L' image of the size of BOX. Return (None, None) if
+	# nothing is visible.
+	box = self.mask_box(polygons)
+	if box is None:
+	    return None, None
+	left, top, right, bottom = box
+	mask = None
+	for points in polygons:
+	    if len(points) < 3:
+		continue
+	    layer = PIL.Image.new('L', (right - left, bottom - top), 0)
+	    PIL.ImageDraw.Draw(layer).polygon([(x - left, y - top)
+					       for x, y in points],
+					      fill = 255)
+	    if mask is None:
+		mask = layer
+	    else:
+		mask = PIL.ImageChops.difference(mask, layer)
+	if mask is None:
+	    return None, None
+	return box, mask
+
+    def stroke_mask(self, polygons, closed):
+	# Like polygon_mask but for the outlines of POLYGONS stroked with
+	# the current line width. CLOSED is a parallel list of flags
+	# telling whether the polygons are closed.
+	width = self.line_width * self.trafo_scale()
+	box = self.mask_box(polygons, grow = width / 2 + 1)
+	if box is None:
+	    return None, None
+	left, top, right, bottom = box
+	mask = PIL.Image.new('L', (right - left, bottom - top), 0)
+	draw = PIL.ImageDraw.Draw(mask)
+	pixels = max(int(round(width)), 1)
+	radius = width / 2
+	for idx in range(len(polygons)):
+	    points = [(x - left, y - top) for x, y in polygons[idx]]
+	    if closed[idx] and points:
+		points.append(points[0])
+	    if len(points) < 2:
+		continue
+	    draw.line(points, fill = 255, width = pixels)
+	    if pixels > 2:
+		# round joins
+		for x, y in points:
+		    draw.ellipse((x - radius, y - radius, x + radius,
+				  y + radius), fill = 255)
+	return box, mask
+
+    def paint(self, box, mask, source):
+	# Paint SOURCE, a pixel value or an image of the size of BOX,
+	# into BOX through MASK and the clip region
+	if self.clip is not None:
+	    mask = PIL.ImageChops.multiply(mask, self.clip.crop(box))
+	self.image.paste(source, box, mask)
+
+    def PushClip(self):
+	self.clip_stack = (self.clip, self.clip_stack)
+
+    def PopClip(self):
+	self.clip, self.clip_stack = self.clip_stack
+
+    def clip_to_mask(self, box, mask):
+	# Intersect the clip region with MASK at BOX. If BOX is None,
+	# the clip region becomes empty.
+	clip = PIL.Image.new('L', self.size, 0)
+	if box is not None:
+	    clip.paste(mask, box[:2])
+	if self.clip is not None:
+	    clip = PIL.ImageChops.multiply(clip, self.clip)
+	self.clip = clip
+
+    def clip_box(self):
+	# Return the bounding box of the clip region or None if it's
+	# empty.
+	if self.clip is None:
+	    return (0, 0) + self.size
+	return self.clip.getbbox()
+
+    def paint_clip_region(self, image, box):
+	# Paint IMAGE into the part BOX of the clip region
+	if self.clip is None:
+	    self.image.paste(image, box)
+	else:
+	    self.image.paste(image, box, self.clip.crop(box))
+
+    #
+    #	Properties
+    #
+
+    def SetProperties(self, properties, rect = None):
+	self.properties = properties
+	self.line = properties.HasLine()
+	self.fill = properties.HasFill()
+	self.pattern_rect = rect
+	self.proc_fill = properties.IsAlgorithmicFill()
+	self.proc_line = properties.IsAlgorithmicLine()
+
+    def pixel_value(self, color):
+	r, g, b = color
+	value = (int(round(r * 255)), int(round(g * 255)),
+		 int(round(b * 255)))
+	if self.image.mode == 'RGBA':
+	    value = value + (255,)
+	return value
+
+    def SetFillColor(self, color):
+	self.current_color = color
+
+    SetLineColor = SetFillColor
+
+    def SetLineAttributes(self, width, cap = 1, join = 0, dashes = ()):
+	self.line_width = width
+	if dashes:
+	    self.unsupported['dashes'] = 1
+	if (cap != CapRound or join != JoinRound) \
+	   and width * self.trafo_scale() > 2:
+	    # thin lines look the same with any cap and join
+	    self.unsupported['caps and joins'] = 1
+
+    def SetLineSolid(self):
+	pass
+
+    def fill_mask(self, box, mask):
+	# fill the area given by BOX and MASK with the fill pattern
+	if self.proc_fill:
+	    self.PushClip()
+	    self.clip_to_mask(box, mask)
+	    self.properties.ExecuteFill(self, self.pattern_rect)
+	    self.PopClip()
+	else:
+	    self.properties.ExecuteFill(self, self.pattern_rect)
+	    self.paint(box, mask, self.pixel_value(self.current_color))
+
+    def stroke_polygons(self, polygons, closed):
+	self.properties.ExecuteLine(self, self.pattern_rect)
+	box, mask = self.stroke_mask(polygons, closed)
+	if box is not None:
+	    self.paint(box, mask, self.pixel_value(self.current_color))
+
+    def fill_and_stroke(self, polygons, closed, clip = 0):
+	box = mask = None
+	if self.fill or clip:
+	    box, mask = self.polygon_mask(polygons)
+	    if self.fill and box is not None:
+		self.fill_mask(box, mask)
+	if self.line:
+	    self.stroke_polygons(polygons, closed)
+	if clip:
+	    self.clip_to_mask(box, mask)
+
+    #
+    #	Simple drawing methods used by patterns and arrows. They use
+    #	the current color.
+    #
+
+    def fill_polygons(self, polygons):
+	box, mask = self.polygon_mask(polygons)
+	if box is not None:
+	    self.paint(box, mask, self.pixel_value(self.current_color))
+
+    def draw_polylines(self, polygons, closed):
+	box, mask = self.stroke_mask(polygons, closed)
+	if box is not None:
+	    self.paint(box, mask, self.pixel_value(self.current_color))
+
+    def DrawLine(self, start, end):
+	trafo = self.doc_to_image
+	self.draw_polylines([[tuple(trafo(start)), tuple(trafo(end))]], [0])
+
+    def DrawLineXY(self, x1, y1, x2, y2):
+	trafo = self.doc_to_image
+	self.draw_polylines([[tuple(trafo(x1, y1)), tuple(trafo(x2, y2))]],
+			    [0])
+
+    def rect_polygon(self, left, bottom, right, top):
+	trafo = self.doc_to_image
+	return map(tuple, map(trafo, [(left, bottom), (right, bottom),
+				      (right, top), (left, top)]))
+
+    def DrawRectangle(self, start, end):
+	self.draw_polylines([self.rect_polygon(start.x, start.y,
+					       end.x, end.y)], [1])
+
+    def FillRectangle(self, left, bottom, right, top):
+	self.fill_polygons([self.rect_polygon(left, bottom, right, top)])
+
+    def FillPolygon(self, pts):
+	self.fill_polygons([map(tuple, map(self.doc_to_image, pts))])
+
+    def DrawCircle(self, center, radius):
+	trafo = self.doc_to_image(Trafo(radius, 0, 0, radius,
+					center.x, center.y))
+	self.draw_polylines([flatten_path(circle_path, trafo)], [1])
+
+    def FillCircle(self, center, radius):
+	trafo = self.doc_to_image(Trafo(radius, 0, 0, radius,
+					center.x, center.y))
+	self.fill_polygons([flatten_path(circle_path, trafo)])
+
+    def DrawBezierPath(self, path, rect = None):
+	self.draw_polylines([flatten_path(path, self.doc_to_image)],
+			    [path.closed])
+
+    def FillBezierPath(self, path, rect = None):
+	self.fill_polygons([flatten_path(path, self.doc_to_image)])
+
+    #
+    #	Primitives
+    #
+
+    def MultiBezier(self, paths, rect = None, clip = 0):
+	if self.fill or self.line or clip:
+	    trafo = self.doc_to_image
+	    polygons = []
+	    closed = []
+	    for path in paths:
+		polygons.append(flatten_path(path, trafo))
+		closed.append(path.closed)
+	    self.fill_and_stroke(polygons, closed, clip)
+	    if self.line:
+		self.draw_arrows(paths, rect)
+
+    def Rectangle(self, trafo, clip = 0):
+	if self.fill or self.line or clip:
+	    trafo = self.doc_to_image(trafo)
+	    polygon = map(tuple, map(trafo, [(0, 0), (1, 0), (1, 1), (0, 1)]))
+	    self.fill_and_stroke([polygon], [1], clip)
+
+    def RoundedRectangle(self, trafo, radius1, radius2, clip = 0):
+	path = _sketch.RoundedRectanglePath(trafo, radius1, radius2)
+	self.MultiBezier((path,), None, clip)
+
+    def SimpleEllipse(self, trafo, start_angle, end_angle, arc_type,
+		      rect = None, clip = 0):
+	if self.fill or self.line or clip:
+	    if start_angle != end_angle:
+		arc = _sketch.approx_arc(start_angle, end_angle, arc_type)
+	    else:
+		arc = circle_path
+	    polygon = flatten_path(arc, self.doc_to_image(trafo))
+	    self.fill_and_stroke([polygon], [arc.closed], clip)
+	    self.draw_ellipse_arrows(trafo, start_angle, end_angle, arc_type,
+				     rect)
+
+    #
+    #	Text
+    #
+    #	Text is drawn by filling the outlines of the characters, so the
+    #	Type1 files of the fonts have to be available.
+    #
+
+    def text_polygons(self, text, trafo, font, font_size):
+	trafo = self.doc_to_image(trafo(Scale(font_size)))
+	try:
+	    pos = font.TypesetText(text)
+	    polygons = []
+	    for i in range(len(text)):
+		char_trafo = trafo(Translation(pos[i]))
+		for path in font.GetOutline(text[i]):
+		    polygons.append(flatten_path(path, char_trafo))
+	except (SketchError, IOError), value:
+	    # report each font only once
+	    name = font.PostScriptName()
+	    if not self.unknown_fonts.has_key(name):
+		warn(USER, _("Cannot render %(font)s:\n%(text)s"),
+		     font = name, text = value)
+		self.unknown_fonts[name] = 1
+	    return []
+	return polygons
+
+    def fill_text(self, polygons, clip):
+	box = mask = None
+	if polygons:
+	    box, mask = self.polygon_mask(polygons)
+	    if self.fill and box is not None:
+		self.fill_mask(box, mask)
+	if clip:
+	    self.clip_to_mask(box, mask)
+
+    def DrawText(self, text, trafo, clip = 0, cache = None):
+	font = self.properties.font
+	if text and font and (self.fill or clip):
+	    polygons = self.text_polygons(text, trafo, font,
+					  self.properties.font_size)
+	    self.fill_text(polygons, clip)
+
+    complex_text = None
+    def BeginComplexText(self, clip = 0, cache = None):
+	self.complex_text = Empty(clip = clip, polygons = [])
+
+    def DrawComplexText(self, text, trafo, font, font_size):
+	self.complex_text.polygons.extend(self.text_polygons(text, trafo,
+							     font, font_size))
+
+    def EndComplexText(self):
+	complex_text = self.complex_text
+	self.complex_text = None
+	if self.fill or complex_text.clip:
+	    self.fill_text(complex_text.polygons, complex_text.clip)
+
+    #
+    #	Images
+    #
+
+    def DrawImage(self, image, trafo, clip = 0):
+	image = image.Image()
+	width, height = image.size
+	# trafo maps the image with its first row at the top
+	trafo = self.doc_to_image(trafo(Trafo(1, 0, 0, -1, 0, height)))
+	polygon = map(tuple, map(trafo, [(0, 0), (width, 0),
+					 (width, height), (0, height)]))
+	box, mask = self.polygon_mask([polygon])
+	if box is not None:
+	    left, top, right, bottom = box
+	    try:
+		inverse = trafo.inverse()(Translation(left, top))
+	    except SingularMatrix:
+		box = None
+	    else:
+		data = (inverse.m11, inverse.m12, inverse.v1,
+			inverse.m21, inverse.m22, inverse.v2)
+		self.paint(box, mask,
+			   image.transform((right - left, bottom - top),
+					   PIL.Image.AFFINE, data))
+	if clip:
+	    self.clip_to_mask(box, mask)
+
+    def DrawEps(self, data, trafo):
+	# EPS files can't be rendered without ghostscript. Draw their
+	# bounding box instead.
+	self.unsupported['EPS'] = 1
+	llx, lly = data.Start()
+	width, height = data.Size()
+	self.PushTrafo()
+	self.Concat(trafo)
+	self.SetFillColor(StandardColors.lightgray)
+	self.FillRectangle(llx, lly, llx + width, lly + height)
+	self.PopTrafo()
+
+    #
+    #	Patterns
+    #
+    #	The pattern methods fill the current clip region.
+    #
+
+    def pattern_image(self):
+	# Return a tuple (image, trafo, box) with an RGB image covering
+	# the box of the clip region and the transformation from document
+	# coordinates to the image's pixels. Return (None, None, None) if
+	# the clip region is empty.
+	box = self.clip_box()
+	if box is None:
+	    return None, None, None
+	left, top, right, bottom = box
+	image = PIL.Image.new('RGB', (right - left, bottom - top),
+			      (255, 255, 255))
+	return image, Translation(-left, -top)(self.doc_to_image), box
+
+    def AxialGradient(self, gradient, p0, p1):
+	image, trafo, box = self.pattern_image()
+	if image is None:
+	    return
+	x0, y0 = trafo(p0)
+	x1, y1 = trafo(p1)
+	_sketch.fill_axial_gradient(image.im, gradient.Colors(),
+				    x0, y0, x1, y1)
+	self.paint_clip_region(image, box)
+
+    def RadialGradient(self, gradient, p, r0, r1):
+	image, trafo, box = self.pattern_image()
+	if image is None:
+	    return
+	x, y = trafo.DocToWin(p)
+	r0 = int(round(abs(trafo.DTransform(r0, 0))))
+	r1 = int(round(abs(trafo.DTransform(r1, 0))))
+	_sketch.fill_radial_gradient(image.im, gradient.Colors(), x, y, r0, r1)
+	self.paint_clip_region(image, box)
+
+    def ConicalGradient(self, gradient, p, angle):
+	image, trafo, box = self.pattern_image()
+	if image is None:
+	    return
+	cx, cy = trafo.DocToWin(p)
+	_sketch.fill_conical_gradient(image.im, gradient.Colors(), cx, cy,
+				      -angle)
+	self.paint_clip_region(image, box)
+
+    def TileImage(self, tile, trafo):
+	image, temp_trafo, box = self.pattern_image()
+	if image is None:
+	    return
+	try:
+	    _sketch.fill_transformed_tile(image.im, tile.im,
+					  temp_trafo(trafo).inverse())
+	except SingularMatrix:
+	    return
+	self.paint_clip_region(image, box)
+
+    #
+    #	Layers
+    #
+
+    def DrawGrid(self, orig_x, orig_y, xwidth, ywidth, rect):
+	pass
+
+    def DrawGuideLine(self, *args):
+	pass
+
+    def StartOutlineMode(self, *rest):
+	pass
+
+    def EndOutlineMode(self, *rest):
+	pass
+
+    def IsOutlineActive(self, *rest):
+	return 0
+
+
+def document_area(document, use_bbox):
+    # Return the area of DOCUMENT covered by the rendered image
+    if use_bbox:
+	return tuple(document.BoundingRect())
+    width, height = document.PageSize()
+    return (0, 0, width, height)
+
+def render_document(document, resolution = 72.0, use_bbox = 0,
+		    antialias = None, mode = 'RGB'):
+    # Render DOCUMENT into a new image with RESOLUTION pixels per inch.
+    # The image covers the page or, if USE_BBOX is true, the bounding
+    # box of the drawing. If ANTIALIAS is given, the document is
+    # rendered at ANTIALIAS times the resolution and scaled down.
+    # Drawings the RasterDevice can't render correctly are rendered
+    # with ghostscript if the raster_ghostscript_fallback preference is
+    # set and it's available.
+    left, bottom, right, top = document_area(document, use_bbox)
+    factor = antialias or 1
+    scale = resolution * factor / 72.0
+    size = (int(round((right - left) * scale)),
+	    int(round((top - bottom) * scale)))
+    trafo = Trafo(scale, 0, 0, -scale, -left * scale, top * scale)
+    device = RasterDevice(size, trafo, mode = mode)
+    document.Draw(device)
+    unsupported = device.Unsupported()
+    if unsupported and config.preferences.raster_ghostscript_fallback:
+	try:
+	    return render_with_ghostscript(document, resolution, use_bbox,
+					   antialias, mode)
+	except IOError, value:
+	    warn(USER, _("Cannot render %(features)s without ghostscript:"
+			 " %(message)s"),
+		 features = ', '.join(unsupported), message = value)
+    image = device.Image()
+    if factor > 1:
+	image = image.resize((int(round((right - left) * resolution / 72.0)),
+			      int(round((top - bottom) * resolution / 72.0))),
+			     PIL.Image.ANTIALIAS)
+    return image
+
+
+#
+#	Rendering with ghostscript
+#
+#	The document is written to a temporary PostScript file which is
+#	rendered by gs. That's how the raster export worked before the
+#	RasterDevice existed.
+#
+
+# PostScript code making all colors black, for the alpha channel
+alpha_prolog = "/setrgbcolor {pop pop pop 0 0 0 setrgbcolor} bind def \
+/setgray { pop 0 setgray} bind def \
+/setcmykcolor { pop pop pop pop 0 0 0 1.0 setcmykcolor} bind def "
+
+def make_ps(document):
+    from psdevice import PostScriptDevice
+    fd, filename = tempfile.mkstemp('.ps')
+    os.close(fd)
+    device = PostScriptDevice(filename, as_eps = 0, document = document)
+    document.Draw(device)
+    device.Close()
+    return filename
+
+def render_ps(filename, resolution, width, height, orig_x = 0, orig_y = 0,
+	      prolog = '', antialias = '', gsdevice = 'ppmraw'):
+    # Render the PostScript file FILENAME with gs and return the image.
+    # Raise IOError if gs fails.
+    if prolog:
+	prolog = '-c ' + '"' + prolog + '"'
+    if antialias:
+	antialias = ("-dTextAlphaBits=%d -dGraphicsAlphaBits=%d"
+		     % (antialias, antialias))
+    else:
+	antialias = ""
+    orig_x = -orig_x
+    orig_y = -orig_y
+    fd, temp = tempfile.mkstemp()
+    os.close(fd)
+    try:
+	gs_cmd = ('gs -dNOPAUSE -g%(width)dx%(height)d -r%(resolution)d '
+		  '-sOutputFile=%(temp)s %(antialias)s '
+		  '-sDEVICE=%(gsdevice)s -q %(prolog)s '
+		  '-c %(orig_x)f %(orig_y)f translate '
+		  '-f%(filename)s -c quit')
+	gs_cmd = gs_cmd % locals()
+	retval = os.system(gs_cmd)
+	if retval:
+	    raise IOError(_("executing %(command)s failed with exit code"
+			    " %(code)x") % {'command': gs_cmd,
+					    'code': retval})
+	image = PIL.Image.open(temp)
+	image.load()
+	return image
+    finally:
+	try:
+	    os.unlink(temp)
+	except OSError:
+	    pass
+
+def render_with_ghostscript(document, resolution = 72.0, use_bbox = 0,
+			    antialias = None, mode = 'RGB'):
+    # Like render_document, but the image is rendered by ghostscript.
+    # ANTIALIAS is gs' number of alpha bits. Raise IOError if gs isn't
+    # available.
+    left, bottom, right, top = document_area(document, use_bbox)
+    width = round((right - left) * resolution / 72.0)
+    height = round((top - bottom) * resolution / 72.0)
+    ps = make_ps(document)
+    try:
+	if mode == 'RGBA':
+	    image = render_ps(ps, resolution, width, height, left, bottom,
+			      antialias = 2)
+	    alpha = render_ps(ps, resolution, width, height, left, bottom,
+			      antialias = 2, prolog = alpha_prolog,
+			      gsdevice = 'pgmraw')
+	    image = image.convert('RGBA')
+	    image.putalpha(PIL.ImageChops.invert(alpha))
+	else:
+	    image = render_ps(ps, resolution, width, height, left, bottom,
+			      antialias = antialias)
+    finally:
+	os.unlink(ps)
+    return image
@@ -80,8 +80,8 @@ class Rectangle(RectangularPrimitive):
         self._changed()
         return undo
 
-    def DrawShape(self, device, rect = None, clip = 0):
-	Primitive.DrawShape(self, device)
+    def DrawShape(self, device, rect = None, clip = 0, properties = None):
+	Primitive.DrawShape(self, device, properties)
         if self.radius1 == self.radius2 == 0:
             device.Rectangle(self.trafo, clip)
         else:
@@ -102,15 +102,17 @@ class Rectangle(RectangularPrimitive):
 	return PolyBezier(paths = self.rect_path,
                           properties = self.properties.Duplicate())
 
-    def Hit(self, p, rect, device, clip = 0):
+    def Hit(self, p, rect, device, clip = 0, properties = None):
+        if properties is None:
+            properties = self.properties
         if self.radius1 == self.radius2 == 0:
             return device.ParallelogramHit(p, self.trafo, 1, 1,
-                                           clip or self.Filled(),
-                                           self.properties,
+                                           clip or properties.HasFill(),
+                                           properties,
                                            ignore_outline_mode = clip)
         else:
-            return device.MultiBezierHit(self.rect_path, p, self.properties,
-                                         clip or self.Filled(),
+            return device.MultiBezierHit(self.rect_path, p, properties,
+                                         clip or properties.HasFill(),
                                          ignore_outline_mode = clip)
     def GetSnapPoints(self):
         return map(self.trafo, corners + [(0.5, 0.5)])
@@ -0,0 +1,156 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307	USA
+
+#
+#	Spatial Index
+#
+# A uniform grid over the bounding rects of the children of a compound
+# object. Every object is registered in the cells its bounding rect
+# overlaps. Objects that would cover too many cells (e.g. a background
+# rectangle or objects with an infinite bounding rect) are kept in a
+# separate list that is part of every result.
+#
+# The index only answers which objects may overlap a rectangle. The
+# caller still has to test the actual bounding rects and is
+# responsible for the stacking order. See EditableCompound.candidates.
+#
+
+from math import floor, sqrt
+
+from Sketch import EmptyRect
+
+
+# objects covering more cells than this are not put into cells
+MAX_OBJECT_CELLS = 64
+
+
+class GridIndex:
+
+    def __init__(self, cell_size):
+	self.cell_size = float(cell_size)
+	self.cells = {}		# (column, row) -> {id(obj) : obj}
+	self.keys = {}		# id(obj) -> list of cell keys or None
+	self.large = {}		# id(obj) -> obj for the uncelled objects
+
+    def __len__(self):
+	return len(self.keys)
+
+    def cell_range(self, rect):
+	# Return the column and row ranges of the cells overlapping
+	# RECT as a tuple (x0, y0, x1, y1) of ints (inclusive)
+	size = self.cell_size
+	return (int(floor(rect.left / size)), int(floor(rect.bottom / size)),
+		int(floor(rect.right / size)), int(floor(rect.top / size)))
+
+    def Add(self, obj):
+	rect = obj.bounding_rect
+	key = id(obj)
+	if rect is EmptyRect:
+	    # can't overlap anything
+	    self.keys[key] = []
+	    return
+	x0, y0, x1, y1 = self.cell_range(rect)
+	if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_OBJECT_CELLS:
+	    self.large[key] = obj
+	    self.keys[key] = None
+	    return
+	cells = self.cells
+	keys = []
+	for x in range(x0, x1 + 1):
+	    for y in range(y0, y1 + 1):
+		cell = cells.get((x, y))
+		if cell is None:
+		    cell = cells[(x, y)] = {}
+		cell[key] = obj
+		keys.append((x, y))
+	self.keys[key] = keys
+
+    def Remove(self, obj):
+	key = id(obj)
+	keys = self.keys.get(key, ())
+	if keys is None:
+	    del self.large[key]
+	else:
+	    cells = self.cells
+	    for cell_key in keys:
+		cell = cells[cell_key]
+		del cell[key]
+		if not cell:
+		    del cells[cell_key]
+	try:
+	    del self.keys[key]
+	except KeyError:
+	    pass
+
+    def Update(self, obj):
+	# OBJ's bounding rect has changed
+	if self.keys.has_key(id(obj)):
+	    self.Remove(obj)
+	self.Add(obj)
+
+    def Query(self, rect):
+	# Return a list of the objects whose bounding rects may overlap
+	# RECT in no particular order. Return None if RECT covers so
+	# many cells that testing all objects is cheaper.
+	x0, y0, x1, y1 = self.cell_range(rect)
+	if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.keys):
+	    return None
+	found = self.large.copy()
+	cells = self.cells
+	for x in range(x0, x1 + 1):
+	    for y in range(y0, y1 + 1):
+		cell = cells.get((x, y))
+		if cell:
+		    found.update(cell)
+	return found.values()
+
+
+def grid_cell_size(objects):
+    # Choose a cell size for OBJECTS: about twice the average object
+    # size but large enough that the grid over all objects has not
+    # much more cells than there are objects.
+    count = 0
+    extent = 0.0
+    left = bottom = 1e100
+    right = top = -1e100
+    for obj in objects:
+	rect = obj.bounding_rect
+	if rect is EmptyRect:
+	    continue
+	width = rect.right - rect.left
+	height = rect.top - rect.bottom
+	if width > 1e10 or height > 1e10:
+	    # the infinite rect
+	    continue
+	count = count + 1
+	extent = extent + max(width, height)
+	left = min(left, rect.left)
+	bottom = min(bottom, rect.bottom)
+	right = max(right, rect.right)
+	top = max(top, rect.top)
+    if not count:
+	return 1.0
+    size = 2 * extent / count
+    area = (right - left) * (top - bottom)
+    size = max(size, sqrt(area / (4 * count)))
+    return max(size, 1.0)
+
+
+def BuildIndex(objects):
+    index = GridIndex(grid_cell_size(objects))
+    for obj in objects:
+	index.Add(obj)
+    return index
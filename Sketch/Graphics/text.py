@@ -290,8 +290,10 @@ class SimpleText(CommonText, RectangularPrimitive):
 	self.cache = {}
 	RectangularPrimitive.Disconnect(self)
 
-    def Hit(self, p, rect, device, clip = 0):
-	a = self.properties
+    def Hit(self, p, rect, device, clip = 0, properties = None):
+	a = properties
+	if a is None:
+	    a = self.properties
 	llx, lly, urx, ury = a.font.TextBoundingBox(self.text, a.font_size)
 	trafo = self.trafo(self.atrafo)
 	trafo = trafo(Trafo(urx - llx, 0, 0, ury - lly, llx, lly))
@@ -346,12 +348,16 @@ class SimpleText(CommonText, RectangularPrimitive):
 	    return CreateMultiUndo(undostyle, undotrafo)
 	return NullUndo
 
-    def DrawShape(self, device, rect = None, clip = 0):
-	RectangularPrimitive.DrawShape(self, device)
+    def DrawShape(self, device, rect = None, clip = 0, properties = None):
+	RectangularPrimitive.DrawShape(self, device, properties)
         # Workaround for a bug in my Xserver.
         text = split(self.text, '\n')[0]
+	# the cache is only valid for the text's own font
+	cache = None
+	if properties is None:
+	    cache = self.cache
 	device.DrawText(self.text, self.trafo(self.atrafo), clip,
-			cache = self.cache)
+			cache = cache)
 
     def update_atrafo(self):
 	a = self.properties
@@ -669,12 +675,17 @@ class InternalPathText(CommonText, Primitive):
     def CharacterTransformations(self):
         return self.trafos
 
-    def DrawShape(self, device, rect = None, clip = 0):
+    def DrawShape(self, device, rect = None, clip = 0, properties = None):
+	# the cache is only valid for the text's own font
+	cache = None
+	if properties is None:
+	    properties = self.properties
+	    cache = self.cache
 	text = self.text; trafos = self.trafos
-	font = self.properties.font; font_size = self.properties.font_size
+	font = properties.font; font_size = properties.font_size
 
-	Primitive.DrawShape(self, device)
-	device.BeginComplexText(clip, self.cache)
+	Primitive.DrawShape(self, device, properties)
+	device.BeginComplexText(clip, cache)
 	for idx in range(len(trafos)):
             char = text[idx]
             if char not in '\r\n': # avoid control chars
@@ -685,9 +696,11 @@ class InternalPathText(CommonText, Primitive):
 	self.cache = {}
 	Primitive.Disconnect(self)
 
-    def Hit(self, p, rect, device, clip = 0):
-	bbox = self.properties.font.TextBoundingBox
-	font_size = self.properties.font_size
+    def Hit(self, p, rect, device, clip = 0, properties = None):
+	if properties is None:
+	    properties = self.properties
+	bbox = properties.font.TextBoundingBox
+	font_size = properties.font_size
 	text = self.text; trafos = self.trafos
 
 	for idx in range(len(trafos)):
@@ -145,6 +145,7 @@ class SketchCanvas(SketchView, CursorStack, WidgetWithModes):
 	self.current_info_text = None
 	self.expect_release_event = 0
 	self.ignore_key_press_events = 0
+	self.cancel_load = None	# called on Escape while loading
 	self.start_drag = 0
         self.start_pos = None
 	self.dragging = 0	# true if dragging with left button down
@@ -485,6 +486,9 @@ class SketchCanvas(SketchView, CursorStack, WidgetWithModes):
 
     def ButtonPressEvent(self, event):
 	# handle button press event    
+	if self.cancel_load is not None:
+	    # a drawing is being loaded
+	    return
         #----------------------------------------------------
         #added by shumon June 9, 2009 to handle scroll spacing
         button = event.num
@@ -522,6 +526,8 @@ class SketchCanvas(SketchView, CursorStack, WidgetWithModes):
 	# handle Motion events
 	#event.button = event.num
 	#event.x, event.y = self.tkwin.QueryPointer()[4:6]
+	if self.cancel_load is not None:
+	    return
 	self.last_event = event
 	p = self.WinToDoc(event.x, event.y)
 	self.set_current_pos(p, snap = 1)
@@ -535,6 +541,8 @@ class SketchCanvas(SketchView, CursorStack, WidgetWithModes):
         self.show_crosshairs()
 
     def ButtonReleaseEvent(self, event):
+        if self.cancel_load is not None:
+            return
         
         #----------------------------------------------------
         #added by shumon June 9, 2009 to handle scroll spacing
@@ -580,6 +588,11 @@ class SketchCanvas(SketchView, CursorStack, WidgetWithModes):
 	return self.main_window.MapKeystroke(stroke)
 
     def KeyPressEvent(self, event):
+	if self.cancel_load is not None:
+	    # only Escape works while a drawing is being loaded
+	    if event.keysym == 'Escape':
+		self.cancel_load()
+	    return
 	self.begin_transaction()
 	try:
 	    state = event.state
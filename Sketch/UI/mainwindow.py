@@ -21,6 +21,7 @@ from types import TupleType, ListType
 from Sketch.Lib import util
 from Sketch.warn import warn, warn_tb, INTERNAL, USER
 from Sketch import _, config, load, plugins, SketchVersion
+from Sketch.autosave import AutoSaver
 from Sketch import Publisher, Point, EmptyFillStyle, EmptyLineStyle, \
      EmptyPattern, Document, GuideLine, PostScriptDevice, SketchError
 import Sketch
@@ -388,6 +389,8 @@ class SketchMainWindow(Publisher):
     	self.canvas = None
     	self.document = None
     	self.commands = None
+    	self.autosaver = None
+    	self.autosave_error = None
     	self.NewDocument()
     	self.create_commands()
     	self.build_window()
@@ -398,6 +401,7 @@ class SketchMainWindow(Publisher):
         #added by shumon June 4, 2009
         self.setup_experiment_logging()
         self.set_experiment_save_filename()
+        self.root.after(1000, self.autosave)
 
 
     def issue_document(self):
@@ -439,9 +443,31 @@ class SketchMainWindow(Publisher):
     def Document(self):
 	return self.document
 
+    def autosave(self):
+	# Called once a second. Save the document to its recovery file
+	# if it's due, see Sketch/Base/autosave.py
+	try:
+	    autosaver = self.autosaver
+	    if autosaver is not None:
+		error = autosaver.Error()
+		if error and error != self.autosave_error:
+		    # report every problem only once
+		    self.autosave_error = error
+		    warn(USER, error)
+		if autosaver.Due():
+		    autosaver.Save()
+	except:
+	    warn_tb(INTERNAL, 'autosave')
+	self.root.after(1000, self.autosave)
+
     def SetDocument(self, document):
     	channels = (SELECTION, UNDO, MODE)
     	old_doc = self.document
+    	if self.autosaver is not None:
+    	    # the old document was saved or its changes were dropped
+    	    self.autosaver.Discard()
+    	    self.autosaver.Destroy()
+    	    self.autosaver = None
     	if old_doc is not None:
     	    for channel in channels:
     		old_doc.Unsubscribe(channel, self.issue, channel)
@@ -450,6 +476,7 @@ class SketchMainWindow(Publisher):
     	    self.document.Subscribe(channel, self.issue, channel)
     	if self.canvas is not None:
     	    self.canvas.SetDocument(document)
+    	self.autosaver = AutoSaver(document)
     	self.issue_document()
     	# issue_document has to be called before old_doc is destroyed,
     	# because destroying it causes all connections to be deleted and
@@ -492,8 +519,12 @@ class SketchMainWindow(Publisher):
     AddCmd('LoadMRU3', '', 'LoadFromFile', args = 3, key_stroke = 'M-4',
 	   name_cb = lambda: os.path.split(config.preferences.mru_files[3])[1])
     
+    loading = 0	# true while load_drawing processes events
+
     def LoadFromFile(self, filename = None, directory = None):
 	app = self.application
+	if self.loading:
+	    return
 	if self.save_doc_if_edited(_("Open Document")) == tkext.Cancel:
 	    return
 	if type(filename) == type(0):
@@ -513,7 +544,10 @@ class SketchMainWindow(Publisher):
 	try:
 	    if not os.path.isabs(filename):
 		filename = os.path.join(os.getcwd(), filename)
-	    doc = load.load_drawing(filename)
+	    doc = self.load_drawing(filename)
+	    if doc is None:
+		# cancelled
+		return
 	    self.SetDocument(doc)
 	    self.add_mru_file(filename)
             self.set_experiment_save_filename() #Added by shumon June 2009
@@ -540,6 +574,42 @@ class SketchMainWindow(Publisher):
 	    doc.meta.load_messages = ''
 
 
+    def load_drawing(self, filename):
+	# Load the drawing FILENAME. With the progressive_load preference
+	# the objects read so far are shown in the canvas while loading
+	# and events are processed in between, so the user can cancel
+	# with Escape. Return the document or None if cancelled.
+	#
+	# While loading the canvas grabs the input and ignores everything
+	# but Escape, so that the document can't be changed or closed and
+	# no other load can be started.
+	if not config.preferences.progressive_load or self.canvas is None:
+	    return load.load_drawing(filename)
+	canvas = self.canvas
+	loader = load.IncrementalLoad(filename)
+	cancelled = []
+	canvas.cancel_load = lambda cancelled = cancelled: cancelled.append(1)
+	interval = config.preferences.progressive_load_interval
+	next = time.time() + interval
+	self.loading = 1
+	canvas.grab_set()
+	canvas.focus_set()
+	try:
+	    while loader.Step():
+		if time.time() >= next:
+		    canvas.ShowPartialObjects(loader.PartialObjects())
+		    self.root.update()
+		    if cancelled:
+			loader.Cancel()
+			return None
+		    next = time.time() + interval
+	finally:
+	    canvas.grab_release()
+	    self.loading = 0
+	    canvas.cancel_load = None
+	    canvas.EndPartialDisplay()
+	return loader.Document()
+
     AddCmd('SaveToFile', _("Save"), 'SaveToFileInteractive',
 	   bitmap = pixmaps.Save, key_stroke = ('C-s', 'F2'))
     AddCmd('SaveToFileAs', _("Save As..."), 'SaveToFileInteractive', args = 1,
@@ -636,6 +706,7 @@ class SketchMainWindow(Publisher):
 	    self.document.meta.fullpathname = filename
 	    self.document.meta.file_type = plugins.NativeFormat
 	    self.document.meta.native_format = 1
+	    self.autosaver.Discard()
 	if not compressed_file:
 	    self.document.meta.compressed_file = ''
 	    self.document.meta.compressed = ''
@@ -900,8 +971,13 @@ class SketchMainWindow(Publisher):
                              
     
     def Exit(self):
-       
+        if self.loading:
+            # the window manager's close button still works while
+            # loading. Cancel the load instead
+            self.canvas.cancel_load()
+            return
     	if self.save_doc_if_edited(_("Exit")) != tkext.Cancel:
+    	    self.autosaver.Discard()
     	    self.commands = None
             self.document.DestroyTiledClonesDialog()    #added by Shumon June 1, 2009
             self.log_stats() #added by shumon June 5, 2009
@@ -71,6 +71,8 @@ def PythonPrompt(prompt = '>>>', prompt2 = '...'):
     # put all of Sketch.main and Sketch into the globals
     exec 'from Sketch.main import *' in globals
     exec 'from Sketch import *' in globals
+    for name in Sketch._lazy_names.keys():
+	globals[name] = getattr(Sketch, name)
     # put all sketch specific modules into the globals
     for module in get_sketch_modules():
 	globals[module.__name__] = module
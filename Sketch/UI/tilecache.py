@@ -0,0 +1,172 @@
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307	USA
+
+#
+#	Tile Cache
+#
+# The rendered drawing of a SketchView is kept in square off-screen
+# pixmaps (tiles). The tiles of one zoom level form a grid that is
+# anchored at the window position of the document's origin, so that
+# scrolling only shifts the grid by whole pixels and the tiles stay
+# valid. A zoom level is the scale together with the fractional part of
+# the origin's window position, because content rendered with a
+# different sub-pixel offset would not match the neighbouring tiles.
+#
+# Tiles are keyed by (zoom, column, row). Tiles of other zoom levels
+# are kept as well so that zooming back is cheap. When there are more
+# than max_tiles tiles the least recently used ones are discarded, but
+# never those used by the current redraw.
+#
+# The cache doesn't render anything itself. SketchView asks for the
+# missing tiles of an area, renders them and stores them with Put.
+#
+
+from math import floor
+
+from Sketch import RectType, InfinityRect
+
+
+class TileCache:
+
+    def __init__(self, size, max_tiles):
+	self.size = size
+	self.max_tiles = max_tiles
+	self.tiles = {}		# (zoom, column, row) -> [pixmap, stamp]
+	self.zoom = None
+	self.anchor_x = self.anchor_y = 0
+	self.stamp = 0
+
+    def __len__(self):
+	return len(self.tiles)
+
+    def Flush(self):
+	self.tiles = {}
+
+    def BeginRedraw(self, scale, origin_x, origin_y):
+	# Start a redraw. ORIGIN_X and ORIGIN_Y are the window
+	# coordinates of the document's origin at scale SCALE.
+	self.anchor_x = int(floor(origin_x))
+	self.anchor_y = int(floor(origin_y))
+	self.zoom = (scale, round(origin_x - self.anchor_x, 4),
+		     round(origin_y - self.anchor_y, 4))
+	self.stamp = self.stamp + 1
+
+    def tile_range(self, x, y, width, height):
+	# Return the columns and rows of the tiles of the current zoom
+	# level overlapping the window area X, Y, WIDTH, HEIGHT as a
+	# tuple (x0, y0, x1, y1) (inclusive)
+	size = self.size
+	x = x - self.anchor_x
+	y = y - self.anchor_y
+	return (int(floor(float(x) / size)), int(floor(float(y) / size)),
+		int(floor(float(x + width - 1) / size)),
+		int(floor(float(y + height - 1) / size)))
+
+    def TileOrigin(self, column, row):
+	# Return the window coordinates of the top left corner of the
+	# tile COLUMN, ROW of the current zoom level
+	return (self.anchor_x + column * self.size,
+		self.anchor_y + row * self.size)
+
+    def Missing(self, x, y, width, height):
+	# Return the (column, row) pairs of the tiles needed for the
+	# window area X, Y, WIDTH, HEIGHT that are not in the cache.
+	x0, y0, x1, y1 = self.tile_range(x, y, width, height)
+	zoom = self.zoom
+	tiles = self.tiles
+	missing = []
+	for row in range(y0, y1 + 1):
+	    for column in range(x0, x1 + 1):
+		if not tiles.has_key((zoom, column, row)):
+		    missing.append((column, row))
+	return missing
+
+    def Tiles(self, x, y, width, height):
+	# Return a list of (column, row, pixmap) for the cached tiles
+	# overlapping the window area X, Y, WIDTH, HEIGHT
+	x0, y0, x1, y1 = self.tile_range(x, y, width, height)
+	zoom = self.zoom
+	stamp = self.stamp
+	result = []
+	for row in range(y0, y1 + 1):
+	    for column in range(x0, x1 + 1):
+		tile = self.tiles.get((zoom, column, row))
+		if tile is not None:
+		    tile[1] = stamp
+		    result.append((column, row, tile[0]))
+	return result
+
+    def Put(self, column, row, pixmap):
+	self.tiles[(self.zoom, column, row)] = [pixmap, self.stamp]
+	if len(self.tiles) > self.max_tiles:
+	    self.evict()
+
+    def evict(self):
+	stamp = self.stamp
+	items = []
+	for key, (pixmap, used) in self.tiles.items():
+	    if used < stamp:
+		items.append((used, key))
+	items.sort()
+	count = len(self.tiles) - self.max_tiles
+	for used, key in items[:count]:
+	    del self.tiles[key]
+
+    #
+    #	Invalidation
+    #
+    #	The damaged areas are given in document coordinates so that the
+    #	tiles of all zoom levels can be invalidated. In the tile grid of
+    #	zoom level (scale, fx, fy) the document point (x, y) is at pixel
+    #	(fx + scale * x, fy - scale * y).
+    #
+
+    def InvalidateRect(self, rect):
+	# Discard the tiles overlapping RECT. RECT is a rect or a guide
+	# line given as a tuple (point, horizontal) as passed to
+	# SketchView.clear_area_doc
+	if not self.tiles:
+	    return
+	if rect is InfinityRect:
+	    self.Flush()
+	    return
+	if type(rect) == RectType:
+	    left = rect.left; bottom = rect.bottom
+	    right = rect.right; top = rect.top
+	    horizontal = vertical = 1
+	else:
+	    point, horizontal = rect
+	    left = right = point.x
+	    bottom = top = point.y
+	    vertical = not horizontal
+	size = float(self.size)
+	ranges = {}
+	tiles = self.tiles
+	for key in tiles.keys():
+	    zoom, column, row = key
+	    bounds = ranges.get(zoom)
+	    if bounds is None:
+		scale, fx, fy = zoom
+		# grow by two pixels for rounding and antialiasing
+		bounds = ranges[zoom] \
+		       = (floor((fx + scale * left - 2) / size),
+			  floor((fy - scale * top - 2) / size),
+			  floor((fx + scale * right + 2) / size),
+			  floor((fy - scale * bottom + 2) / size))
+	    x0, y0, x1, y1 = bounds
+	    if ((not vertical or x0 <= column <= x1)
+		and (not horizontal or y0 <= row <= y1)):
+		del tiles[key]
@@ -18,13 +18,15 @@
 from Sketch.warn import pdebug
 
 from Sketch import Rect, EmptyRect, IntersectRects, Document, GraphicsDevice,\
-     SketchInternalError, QueueingPublisher, StandardColors
+     SketchInternalError, QueueingPublisher, StandardColors, RectType, \
+     Translation, config
 
 from Sketch.const import STATE, VIEW, DOCUMENT, LAYOUT, REDRAW
 from Sketch.const import LAYER, LAYER_STATE, LAYER_ORDER, LAYER_COLOR
 
 from tkext import PyWidget
 from viewport import Viewport
+from tilecache import TileCache
 
 
 class SketchView(PyWidget, Viewport, QueueingPublisher):
@@ -45,6 +47,8 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 	self.show_printable = show_printable
 	self.gcs_initialized = 0
 	self.gc = GraphicsDevice()
+	self.tile_cache = None
+	self.partial_objects = None
 
 	self.init_transactions()
 	if document is not None:
@@ -73,6 +77,7 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 	# which is not freed if the gc is not destroyed leaving unused shared
 	# memory segments in the system even after the process has finished.
 	self.gc = None
+	self.tile_cache = None
 	PyWidget.DestroyMethod(self)
 
     def init_gcs(self):
@@ -80,6 +85,10 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 	self.gc.draw_visible = self.show_visible
 	self.gc.draw_printable = self.show_printable
 	self.gc.allow_outline = 0
+	preferences = config.preferences
+	if preferences.use_tile_cache:
+	    self.tile_cache = TileCache(preferences.tile_cache_size,
+					preferences.tile_cache_max_tiles)
 	self.gcs_initialized = 1
 	self.default_view()
 	self.set_gc_transforms()
@@ -135,16 +144,43 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 
     def redraw_doc(self, all, rects = None):
 	if all:
+	    self.flush_tiles()
+	    self.clear_window()
+	elif self.mostly_damaged(rects):
+	    if self.tile_cache is not None:
+		map(self.tile_cache.InvalidateRect, rects)
 	    self.clear_window()
 	else:
 	    map(self.clear_area_doc, rects)
 
+    def mostly_damaged(self, rects):
+	# Return true if RECTS cover so much of the visible part of the
+	# document that redrawing the whole window is cheaper than
+	# redrawing the rects one by one.
+	x1, y1 = self.WinToDoc(0, 0)
+	x2, y2 = self.WinToDoc(self.tkwin.width, self.tkwin.height)
+	visible = Rect(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+	area = (visible.right - visible.left) * (visible.top - visible.bottom)
+	if area <= 0:
+	    return 0
+	damaged = 0
+	for rect in rects:
+	    if type(rect) != RectType:
+		# guide lines
+		continue
+	    rect = IntersectRects(rect, visible)
+	    if rect is not EmptyRect:
+		damaged = damaged + (rect.right - rect.left) \
+			  * (rect.top - rect.bottom)
+	return damaged > area * config.preferences.damage_redraw_all_fraction
+
     def layout_changed(self):
         self.SetPageSize(self.document.Layout().Size())
         self.set_gc_transforms()
         self.update_scrollbars()
         self.update_rulers()
 	if self.show_page_outline:
+	    self.flush_tiles()
 	    self.clear_window()
 
     def layer_changed(self, *args):
@@ -199,13 +235,6 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 
 	region = self.do_clear(region)
 
-	# draw document
-	self.gc.InitClip()
-	self.gc.ResetFontCache()
-	if region:
-	    self.gc.PushClip()
-	    self.gc.ClipRegion(region)
-
         tkwin = self.tkwin
 	if region:
 	    x, y, w, h = region.ClipBox()
@@ -221,20 +250,24 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 	    x = y = 0
 	    w = tkwin.width
 	    h = tkwin.height
-	p1 = self.WinToDoc(x - 1, y - 1)
-	p2 = self.WinToDoc(x + w + 1, y + h + 1)
-	rect = Rect(p1, p2)
-
-        self.gc.SetFillColor(StandardColors.white)
-        self.gc.gc.FillRectangle(x, y, w, h) # XXX ugly to access gc.gc
 
-	#	draw paper
-	if self.show_page_outline:
-	    w, h = self.document.PageSize()
-	    self.gc.DrawPageOutline(w, h)
+	# draw document
+	self.gc.ResetFontCache()
+	use_tiles = self.use_tiles()
+	if use_tiles:
+	    self.render_tiles(x, y, w, h)
+	self.gc.InitClip()
+	if region:
+	    self.gc.PushClip()
+	    self.gc.ClipRegion(region)
 
+	if use_tiles:
+	    self.copy_tiles(x, y, w, h)
+	else:
+	    p1 = self.WinToDoc(x - 1, y - 1)
+	    p2 = self.WinToDoc(x + w + 1, y + h + 1)
+	    self.draw_document(x, y, w, h, Rect(p1, p2))
 
-	self.document.Draw(self.gc, rect)
 	if region:
 	    self.gc.PopClip()
 
@@ -244,6 +277,121 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 
 	return region
 
+    def draw_document(self, x, y, width, height, rect):
+	# Draw the paper and the part of the document in RECT (in doc
+	# coords) into the area X, Y, WIDTH, HEIGHT of the current
+	# drawable of self.gc
+        self.gc.SetFillColor(StandardColors.white)
+        self.gc.gc.FillRectangle(x, y, width, height) # XXX ugly to access gc.gc
+
+	if self.partial_objects is not None:
+	    self.draw_partial_objects(rect)
+	    return
+
+	#	draw paper
+	if self.show_page_outline:
+	    w, h = self.document.PageSize()
+	    self.gc.DrawPageOutline(w, h)
+
+	self.document.Draw(self.gc, rect)
+
+    #
+    #	Progressive Display
+    #
+    #	While a drawing is being loaded the objects read so far can be
+    #	shown instead of the current document (see
+    #	load.IncrementalLoad). The objects are complete layers and
+    #	objects of the layer being read. The page outline isn't drawn
+    #	because the page layout of the new drawing isn't known yet.
+    #
+
+    def ShowPartialObjects(self, objects):
+	self.partial_objects = objects
+	self.clear_window()
+
+    def EndPartialDisplay(self):
+	if self.partial_objects is not None:
+	    self.partial_objects = None
+	    self.clear_window()
+
+    def draw_partial_objects(self, rect):
+	gc = self.gc
+	test = rect.overlaps
+	for object in self.partial_objects:
+	    if object.is_Layer:
+		object.Draw(gc, rect)
+	    elif test(object.bounding_rect):
+		object.DrawShape(gc)
+
+    #
+    #	Tile Cache
+    #
+    #	If enabled, the document is rendered into the off-screen tiles
+    #	of self.tile_cache (see tilecache.py) which are then copied to
+    #	the window. Only tiles that were invalidated by changes to the
+    #	document have to be rendered again, so exposing and scrolling
+    #	the window is cheap.
+    #
+
+    def use_tiles(self):
+	# Some parts of the GraphicsDevice assume that they draw into
+	# the window (e.g. guide lines and patterns are clipped to the
+	# window size), so tiles must not be larger than the window.
+	cache = self.tile_cache
+	return (cache is not None and self.partial_objects is None
+		and self.tkwin.width >= cache.size
+		and self.tkwin.height >= cache.size)
+
+    def flush_tiles(self):
+	if self.tile_cache is not None:
+	    self.tile_cache.Flush()
+
+    def render_tiles(self, x, y, width, height):
+	# Render the tiles needed for the window area X, Y, WIDTH,
+	# HEIGHT that are not cached yet.
+	cache = self.tile_cache
+	origin_x, origin_y = self.doc_to_win.offset()
+	cache.BeginRedraw(self.scale, origin_x, origin_y)
+	missing = cache.Missing(x, y, width, height)
+	if not missing:
+	    return
+	size = cache.size
+	gc = self.gc
+	try:
+	    for column, row in missing:
+		pixmap = self.tkwin.CreatePixmap(size, size)
+		left, top = cache.TileOrigin(column, row)
+		win_to_doc = self.win_to_doc(Translation(left, top))
+		gc.SetViewportTransform(self.scale,
+					Translation(-left, -top)(self.doc_to_win),
+					win_to_doc)
+		gc.gc.SetDrawable(pixmap)
+		gc.InitClip()
+		rect = Rect(win_to_doc(-1, -1), win_to_doc(size + 1, size + 1))
+		self.draw_document(0, 0, size, size, rect)
+		cache.Put(column, row, pixmap)
+	finally:
+	    gc.gc.SetDrawable(self.tkwin)
+	    self.set_gc_transforms()
+
+    def copy_tiles(self, x, y, width, height):
+	# Copy the cached tiles overlapping the window area X, Y, WIDTH,
+	# HEIGHT to the window. The copy is clipped by the clip region of
+	# self.gc.
+	cache = self.tile_cache
+	size = cache.size
+	tkwin = self.tkwin
+	gc = self.gc.gc
+	for column, row, pixmap in cache.Tiles(x, y, width, height):
+	    left, top = cache.TileOrigin(column, row)
+	    pixmap.CopyArea(tkwin, gc, 0, 0, size, size, left, top)
+
+    def clear_area_doc(self, rect):
+	# extend the Viewport method to discard the tiles showing RECT
+	if self.tile_cache is not None:
+	    self.tile_cache.InvalidateRect(rect)
+	Viewport.clear_area_doc(self, rect)
+
     def ResizedMethod(self, width, height):
 	Viewport.ResizedMethod(self, width, height)
 	self.gc.WindowResized(width, height)
@@ -258,6 +406,7 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 
     def ForceRedraw(self):
 	# Force a redraw of the whole window
+	self.flush_tiles()
 	self.clear_window()
 	if __debug__:
 	    #self.time_redraw = 1
@@ -351,6 +500,7 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 		    self.hitgc.EndOutlineMode()
 		else:
 		    return
+	    self.flush_tiles()
 	    self.issue_view()
 	    self.clear_window()
 	finally:
@@ -370,6 +520,7 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
 	self.begin_transaction()
 	try:
 	    self.show_page_outline = on
+	    self.flush_tiles()
 	    self.issue_view()
 	    self.clear_window()
 	finally:
@@ -402,6 +553,7 @@ class SketchView(PyWidget, Viewport, QueueingPublisher):
             self.unsubscribe_doc()
 	    self.document = doc
             self.subscribe_doc()
+	    self.flush_tiles()
 	    self.clear_window()
 	    self.SetPageSize(self.document.Layout().Size())
 	    self.FitPageToWindow(save_viewport = 0)
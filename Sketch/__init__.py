@@ -15,7 +15,36 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307	USA
 
-import os, sys, string
+import os, sys, string, time
+from types import ModuleType
+
+#
+#	Startup timing
+#
+# The time it takes to import and initialize the parts of Sketch is
+# recorded with startup_timing and printed by report_startup_timing on
+# the 'timing' debug channel (see warn.pdebug).
+#
+
+_startup_start = time.time()
+_startup_times = []
+_startup_last = [_startup_start]
+
+def startup_timing(what):
+    # Record that WHAT has been done
+    _startup_times.append((what, time.time()))
+
+def report_startup_timing():
+    # Print the times recorded since the last report
+    from warn import pdebug
+    last = _startup_last[0]
+    for what, when in _startup_times:
+	pdebug('timing', 'startup: %s: %.3f s (%.3f s total)', what,
+	       when - last, when - _startup_start)
+	last = when
+    del _startup_times[:]
+    _startup_last[0] = last
+
 
 _pkgdir = __path__[0]
 _parentdir = os.path.join(_pkgdir, '..')
@@ -82,6 +111,8 @@ from undo import Undo, UndoList, CreateListUndo, CreateMultiUndo, UndoAfter,\
 from connector import Connect, Disconnect, Issue, RemovePublisher, Subscribe,\
      Publisher, QueueingPublisher
 
+startup_timing('core modules')
+
 #
 
 def _import_PIL():
@@ -110,6 +141,7 @@ def _import_PIL():
         sys.modules['PIL.ImageChops'] = ImageChops
 
 _import_PIL()
+startup_timing('PIL')
 
 
 
@@ -130,9 +162,6 @@ from Graphics.properties import Style, FillStyle, EmptyFillStyle, \
      LineStyle, EmptyLineStyle, PropertyStack, EmptyProperties
 
 from Graphics.blend import MismatchError, Blend, BlendTrafo
-from Graphics.blendgroup import BlendGroup, CreateBlendGroup, \
-     BlendInterpolation
-
 from Graphics.color import CreateRGBColor, XRGBColor, CreateCMYKColor, \
      StandardColors
 from Graphics.compound import Compound, EditableCompound
@@ -142,37 +171,72 @@ from Graphics.document import EditDocument, SelectionMode, EditMode
 Document = EditDocument
 
 from Graphics.font import GetFont
-from Graphics.gradient import MultiGradient, CreateSimpleGradient
 from Graphics.graphics import SimpleGC, GraphicsDevice, InvertingDevice, \
      HitTestDevice
 
 from Graphics.group import Group
 from Graphics.guide import GuideLine
-from Graphics.image import Image, load_image, ImageData
 from Graphics.layer import Layer, GuideLayer, GridLayer
 
-from Graphics.maskgroup import MaskGroup
-
 from Graphics.pattern import EmptyPattern, SolidPattern, HatchingPattern, \
      LinearGradient, RadialGradient, ConicalGradient, ImageTilePattern
 
-from Graphics.plugobj import PluginCompound, TrafoPlugin
-
 from Graphics.rectangle import Rectangle, RectangleCreator
 from Graphics.ellipse import Ellipse, EllipseCreator
 from Graphics.bezier import PolyBezier, PolyBezierCreator, PolyLineCreator, \
      CombineBeziers, CreatePath, ContAngle, ContSmooth, ContSymmetrical
 
-from Graphics.psdevice import PostScriptDevice
+from Graphics.text import SimpleText, SimpleTextCreator, PathText
 
+startup_timing('graphics classes')
 
-from Graphics.text import SimpleText, SimpleTextCreator, PathText
+
+#
+#	Lazy imports
+#
+# The classes and functions that are only needed for some documents or
+# tasks are imported when they're first accessed as attributes of the
+# Sketch package, e.g. by 'from Sketch import MaskGroup'. This is done
+# by the __getattr__ method of _SketchPackage, which replaces this
+# module in sys.modules at the end of this file.
+#
+
+_lazy_names = {}
+for _module, _names in (('Graphics.blendgroup', ('BlendGroup',
+						 'CreateBlendGroup',
+						 'BlendInterpolation')),
+			('Graphics.gradient', ('MultiGradient',
+					       'CreateSimpleGradient')),
+			('Graphics.image', ('Image', 'load_image', 'ImageData')),
+			('Graphics.maskgroup', ('MaskGroup',)),
+			('Graphics.plugobj', ('PluginCompound', 'TrafoPlugin')),
+			('Graphics.psdevice', ('PostScriptDevice',)),
+			('Graphics.rasterdevice', ('RasterDevice',
+						   'render_document'))):
+    for _name in _names:
+	_lazy_names[_name] = _module
+del _module, _names, _name
+
+class _SketchPackage(ModuleType):
+
+    def __getattr__(self, attr):
+	module = _lazy_names.get(attr)
+	if module is None:
+	    raise AttributeError(attr)
+	module = self.__name__ + '.' + module
+	__import__(module)
+	value = getattr(sys.modules[module], attr)
+	setattr(self, attr, value)
+	return value
 
 
 def init_lib():
     import plugins
     config.load_user_preferences()
+    startup_timing('preferences')
     Issue(None, const.INITIALIZE)
+    startup_timing('plugins and fonts')
+    report_startup_timing()
 
 def init_ui():
     # workaround for a threaded _tkinter in Python 1.5.2
@@ -182,9 +246,14 @@ def init_ui():
 
     init_lib()
 
+    # the canvas needs the commands of all object classes. The other
+    # lazily imported modules are imported when they're used.
+    import Graphics.image, Graphics.maskgroup
+
     # import the standard scripts
     for name in config.preferences.standard_scripts:
         __import__(name)
+    startup_timing('standard scripts')
 
 def init_modules_from_widget(root):
     import pax
@@ -199,3 +268,11 @@ def init_modules_from_widget(root):
     Graphics.graphics.InitFromWidget(tkwin)
     UI.skpixmaps.InitFromWidget(tkwin)
 
+
+# Replace this module by a _SketchPackage with the same contents. The
+# functions defined here still use the dictionary of the original
+# module, so it has to be kept alive.
+_package = _SketchPackage(__name__, __doc__)
+_package.__dict__.update(globals())
+_package._original_module = sys.modules[__name__]
+sys.modules[__name__] = _package
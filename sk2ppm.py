@@ -31,7 +31,7 @@ sk2ppm accepts these options:
   -r --resolution=N      Resolution of the raster image in pixels per inch
                          Default: 72
   -s --gradient-steps=N  Number of interpolated colors used in a gradient
-  -A --alpha-bits=N      Alpha bits for anti-aliasing (1, 2, or 4)
+  -A --alpha-bits=N      Supersampling factor for anti-aliasing (1, 2, or 4)
 
 """
 
@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+
+# Sketch - A Python-based interactive drawing program
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+#
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""usage: skbatch [Options] source...
+
+Convert many drawings at once, using several processes. The library is
+initialized only once instead of once per file as with skconvert, sk2ps
+and sk2ppm. A source is either a directory, which is searched
+recursively for SK-files, a manifest file given as @FILENAME or an
+input file. Every line of a manifest names an input file, optionally
+followed by the output file.
+
+A line is printed for every file as soon as it has been converted:
+
+  ok      SECONDS  infile -> outfile
+  FAILED  SECONDS  infile: error message
+
+Generic options:
+
+  -h --help              Print this help message and exit
+  -j --jobs=N            Number of worker processes. Default: one per CPU
+  -m --mode=MODE         The converter to use:
+                           convert  like skconvert (default)
+                           ps       like sk2ps
+                           ppm      like sk2ppm
+  -t --type=EXT          Extension of the output files, e.g. .svg. The
+                         export filter used by the convert mode depends
+                         on it. Default: .eps for ps, .ppm for ppm
+  -o --output-dir=DIR    Write the output files to DIR instead of next to
+                         the input files
+  -i --input-ext=EXT     Extension of the files searched for in directories.
+                         May be given more than once. Default: .sk
+
+Options for ps mode:
+
+  -v --visible           Print all layers marked as visible
+  -p --noprintable       Choose layers only according to their visible flag
+  -e --embed-fonts       Embed fonts in the eps files
+
+Options for ppm mode:
+
+  -b --bbox              Use the document's bounding box to determine the
+                         size of the raster image
+  -r --resolution=N      Resolution of the raster image in pixels per inch
+                         Default: 72
+  -A --alpha-bits=N      Supersampling factor for anti-aliasing (1, 2, or 4)
+"""
+
+import sys, time
+
+from Sketch import batch
+from Sketch.Lib import util
+
+
+def print_usage():
+    print __doc__
+
+def report(infile, outfile, seconds, error):
+    if error is None:
+        print 'ok      %7.3f  %s -> %s' % (seconds, infile, outfile)
+    else:
+        print 'FAILED  %7.3f  %s: %s' % (seconds, infile, error)
+    sys.stdout.flush()
+
+def main():
+    processes = None
+    mode = batch.CONVERT
+    extension = None
+    outdir = None
+    input_extensions = []
+    options = {}
+
+    import getopt
+    opts, args = getopt.getopt(sys.argv[1:], 'hj:m:t:o:i:vpebr:A:',
+                               ['help', 'jobs=', 'mode=', 'type=',
+                                'output-dir=', 'input-ext=', 'visible',
+                                'noprintable', 'embed-fonts', 'bbox',
+                                'resolution=', 'alpha-bits='])
+
+    for optchar, value in opts:
+        if optchar == '-h' or optchar == '--help':
+            print_usage()
+            return -1
+        elif optchar == '-j' or optchar == '--jobs':
+            processes = int(value)
+        elif optchar == '-m' or optchar == '--mode':
+            if value not in (batch.CONVERT, batch.POSTSCRIPT, batch.RASTER):
+                sys.stderr.write("skbatch: unknown mode %s\n" % value)
+                return -1
+            mode = value
+        elif optchar == '-t' or optchar == '--type':
+            if value[:1] != '.':
+                value = '.' + value
+            extension = value
+        elif optchar == '-o' or optchar == '--output-dir':
+            outdir = value
+        elif optchar == '-i' or optchar == '--input-ext':
+            if value[:1] != '.':
+                value = '.' + value
+            input_extensions.append(value)
+        elif optchar == '-v' or optchar == '--visible':
+            options['visible'] = 1
+        elif optchar == '-p' or optchar == '--noprintable':
+            options['printable'] = 0
+        elif optchar == '-e' or optchar == '--embed-fonts':
+            options['embed_fonts'] = 1
+        elif optchar == '-b' or optchar == '--bbox':
+            options['use_bbox'] = 1
+        elif optchar == '-r' or optchar == '--resolution':
+            options['resolution'] = float(value)
+        elif optchar == '-A' or optchar == '--alpha-bits':
+            options['antialias'] = int(value)
+            if options['antialias'] not in (1, 2, 4):
+                sys.stderr.write("skbatch: alpha-bits value must be one of"
+                                 " 1, 2 or 4\n")
+                return -1
+
+    if not args:
+        print_usage()
+        return -1
+
+    if extension is None:
+        extension = batch.default_extensions[mode]
+        if extension is None:
+            sys.stderr.write("skbatch: the convert mode needs the output"
+                             " type (-t)\n")
+            return -1
+    if not input_extensions:
+        input_extensions = ['.sk']
+
+    if mode == batch.POSTSCRIPT:
+        options['For'] = util.get_real_username()
+        options['CreationDate'] = util.current_date()
+
+    jobs = batch.make_jobs(args, extension, outdir, tuple(input_extensions))
+    start = time.time()
+    failed = batch.convert_files(jobs, report, mode, options, processes)
+    sys.stderr.write("skbatch: %d files, %d failed, %.1f seconds\n"
+                     % (len(jobs), failed, time.time() - start))
+    if failed:
+        return 1
+
+if __name__ == '__main__':
+    result = main()
+
+    if result:
+        sys.exit(result)